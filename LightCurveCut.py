@@ -5,50 +5,131 @@ Reads the given file and cuts all light curves in cwd down to the size specified
 File should have the format:
 <StartTime>, <EndTime>
 
+with one line per window to cut each light curve into several windows, or be a GTI FITS file.
+Each light curve is read once and cut into every window.
+
 Usage
 ---------
 python LightCurveCut.py <FileName>
 
-FileName: - Name of text file with start and end times
+FileName: - Name of text file with start and end times, or a GTI FITS file
+
+Suffix: - Suffix of cut light curves (optional), with several windows the window number is appended
 
-Suffix: - Suffix of cut light curves (optional)
+Options
+---------
+-w --workers - Number of threads used to write the cut light curves, defaults to 4
 
 ---------
 
 Author: Thomas Hodd
 
-Date - 6th August 2025
+Date - 17th October 2026
 
-Version - 1.0
+Version - 1.1
 """
 import os
 import argparse
+from concurrent.futures import ThreadPoolExecutor
+import numpy as np
+from astropy.io import fits
 from pylag import LightCurve as LC
 
-# Input args
-parser = argparse.ArgumentParser(description="Cut light curve down to size")
-parser.add_argument("filename", type=str, help="Name of text file with start and end times")
-parser.add_argument("suffix", type=str, nargs="?", default="_cut", help="Suffix of cut light curves (optional)")
-
-# Parse args
-pargs = parser.parse_args()
-filename = pargs.filename
-suffix = pargs.suffix
-
-# Get start and end times
-with open(filename, "r") as f:
-    start, stop = f.read().split(",")
-
-# Create light curves between start and end times
-for file in os.listdir():
-    if file.endswith(".fits"):
-        lc = LC(file)
-        print(f"\nFound LC: {file}\n{round(lc.time[0])} - {round(lc.time[-1])}")
-        mask = (float(start) < lc.time) & (lc.time < float(stop))
-
-        lc.time = lc.time[mask]
-        lc.rate = lc.rate[mask]
-        lc.error = lc.error[mask]
-
-        lc.write_fits(f"{file[:-5]}{suffix}.fits")
-        print(f"Written LC: {file[:-5]}{suffix}.fits\n{round(lc.time[0])} - {round(lc.time[-1])}")
\ No newline at end of file
+
+def read_windows(filename: str) -> np.ndarray:
+    """
+    Read the windows to cut from a text file of start, end lines or from the first GTI table of a FITS file.
+    :param filename: Text or GTI FITS file
+    :return: Array of (start, stop) rows
+    """
+    try:
+        with fits.open(filename) as hdul:
+            for hdu in hdul[1:]:
+                if hdu.columns is not None and {"START", "STOP"} <= set(hdu.columns.names):
+                    return np.column_stack([hdu.data["START"], hdu.data["STOP"]]).astype(float)
+        raise ValueError(f"No GTI table in {filename}")
+    except OSError:
+        pass
+
+    windows = []
+    with open(filename, "r") as f:
+        for line in f:
+            line = line.split("#")[0].replace(",", " ").split()
+            if line:
+                windows.append([float(line[0]), float(line[1])])
+    return np.array(windows, dtype=float).reshape(-1, 2)
+
+
+def is_light_curve(filename: str) -> bool:
+    """
+    Check a FITS file has a RATE extension, so GTI and other FITS files in cwd are skipped.
+    :param filename: FITS file
+    :return: True if the file is a light curve
+    """
+    try:
+        with fits.open(filename) as hdul:
+            return "RATE" in hdul
+    except OSError:
+        return False
+
+
+def cut_windows(time: np.ndarray, windows: np.ndarray) -> list[slice]:
+    """
+    Slices of a sorted time axis strictly inside each window.
+    :param time: Sorted time
+    :param windows: Array of (start, stop) rows
+    :return: Slice for each window
+    """
+    starts = np.searchsorted(time, windows[:, 0], side="right")
+    stops = np.searchsorted(time, windows[:, 1], side="left")
+    return [slice(a, max(a, b)) for a, b in zip(starts, stops)]
+
+
+def write_cut(lc: LC, cut: slice, out_file: str) -> str:
+    """
+    Write part of a light curve to a new file.
+    :param lc: Light curve
+    :param cut: Slice of the light curve to write
+    :param out_file: Output file
+    :return: Description of the written light curve
+    """
+    LC(t=lc.time[cut], r=lc.rate[cut], e=lc.error[cut]).write_fits(out_file)
+    return f"Written LC: {out_file}\n{round(lc.time[cut][0])} - {round(lc.time[cut][-1])}"
+
+
+if __name__ == "__main__":
+    # Input args
+    parser = argparse.ArgumentParser(description="Cut light curve down to size")
+    parser.add_argument("filename", type=str, help="Name of text file with start and end times, or a GTI FITS file")
+    parser.add_argument("suffix", type=str, nargs="?", default="_cut", help="Suffix of cut light curves (optional)")
+    parser.add_argument("-w", "--workers", type=int, default=4, help="Number of threads used to write cut light curves")
+
+    # Parse args
+    pargs = parser.parse_args()
+    filename = pargs.filename
+    suffix = pargs.suffix
+
+    # Get start and end times
+    windows = read_windows(filename)
+    print(f"Cutting into {len(windows)} windows")
+
+    # Create light curves between start and end times, reading each light curve once
+    with ThreadPoolExecutor(max_workers=pargs.workers) as pool:
+        jobs = []
+        for file in os.listdir():
+            if file.endswith(".fits") and is_light_curve(file):
+                lc = LC(file)
+                if np.any(np.diff(lc.time) < 0):
+                    order = np.argsort(lc.time, kind="stable")
+                    lc.time, lc.rate, lc.error = lc.time[order], lc.rate[order], lc.error[order]
+                print(f"\nFound LC: {file}\n{round(lc.time[0])} - {round(lc.time[-1])}")
+
+                for i, cut in enumerate(cut_windows(lc.time, windows)):
+                    out_file = f"{file[:-5]}{suffix}.fits" if len(windows) == 1 else f"{file[:-5]}{suffix}_{i + 1}.fits"
+                    if cut.stop == cut.start:
+                        print(f"Skipped {out_file}, no bins in window {i + 1}")
+                        continue
+                    jobs.append(pool.submit(write_cut, lc, cut, out_file))
+
+        for job in jobs:
+            print(job.result())
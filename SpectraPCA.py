@@ -2,22 +2,264 @@
 Spectrum and Spectral PCA Classes.
 These classes can be used to perform PCA on a set of spectra.
 Create a SpectralPCA object with a list of Spectra objects and call `do_pca()` to do the PCA.
+Spectra sharing an RMF and binning should share one ChannelMap, `load_spectra()` does this and loads in parallel.
+Binned spectra can be written to a SpectralCube so later PCA sessions skip the PHA files.
+Use IncrementalSpectralPCA and `partial_fit()` to add spectra one at a time.
+Pass a ResultCache to Spectrum and SpectralPCA to reuse results when the inputs have not changed.
 
 Author: Thomas Hodd
 
-Date - 14th May 2026
+Date - 17th October 2026
 
-Version - 1.2
+Version - 1.4
 """
+import json
+import os
+from collections.abc import Iterable
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor, wait, FIRST_COMPLETED
 import numpy as np
 import astropy.io.fits as pyfits
 from matplotlib import pyplot as plt
 from matplotlib.ticker import *
+from resultCache import ResultCache
 
+PERTURBATIONS = ["gaussian", "poisson"]
+PERTURB_BLOCK = 2 ** 22  # Maximum number of channels x realisations drawn at once
+BOOTSTRAP_BLOCK = 2 ** 22  # Maximum number of bins x spectra x realisations decomposed at once
+SVD_METHODS = ["full", "gram", "randomized"]
+INCREMENTAL_COMPONENTS = 10  # Components kept by IncrementalSpectralPCA by default
 COLOURS = ["dodgerblue", "orangered", "forestgreen", "deeppink", "darkturquoise", "orange",
            "darkorchid", "lawngreen", "mediumblue", "violet", "black", "grey", "peru"]
 
 
+def read_pha(pha_file: str) -> tuple[np.ndarray, np.ndarray, float, float]:
+    """
+    Read the SPECTRUM table of a PHA file as whole columns.
+
+    :param pha_file: PHA FITS file
+    :return: Channels, counts, exposure time and BACKSCAL
+    """
+    with pyfits.open(pha_file) as hdul:
+        data = hdul['SPECTRUM'].data
+        hdr = hdul['SPECTRUM'].header
+        channels = np.array(data['CHANNEL'], dtype=int)
+        counts = np.array(data['COUNTS'], dtype=float)
+        return channels, counts, hdr['EXPOSURE'], hdr['BACKSCAL']
+
+
+def read_ebounds(rmf_file: str) -> tuple[np.ndarray, np.ndarray, np.ndarray]:
+    """
+    Read the EBOUNDS table of an RMF file as whole columns.
+
+    :param rmf_file: RMF FITS file
+    :return: Channels, lower channel energies and upper channel energies
+    """
+    with pyfits.open(rmf_file) as hdul:
+        ebounds = hdul['EBOUNDS'].data
+        channels = np.array(ebounds['CHANNEL'], dtype=int)
+        emins = np.array(ebounds['E_MIN'], dtype=float)
+        emaxs = np.array(ebounds['E_MAX'], dtype=float)
+        return channels, emins, emaxs
+
+
+def truncated_svd(matrix: np.ndarray, n_components: int = None, method: str = "full", oversample: int = 10,
+                  n_iter: int = 4, seed: int | np.random.Generator = None) -> tuple[np.ndarray, np.ndarray]:
+    """
+    Leading left singular vectors and singular values of a matrix.
+
+    "full" uses np.linalg.svd, "gram" diagonalises the small Gram matrix (fast when columns << rows)
+    and "randomized" uses a randomized range finder with power iterations (Halko et al. 2011).
+
+    :param matrix: Matrix to decompose, shape (rows, columns)
+    :param n_components: Number of components to return, all if None
+    :param method: "full", "gram" or "randomized"
+    :param oversample: Extra random vectors used by the randomized method
+    :param n_iter: Number of power iterations used by the randomized method
+    :param seed: Seed or generator for the randomized method
+    :return: Left singular vectors, shape (rows, components), and singular values
+    """
+    if method not in SVD_METHODS:
+        raise ValueError(f"Unknown SVD method '{method}', must be one of {SVD_METHODS}")
+    rank = min(matrix.shape)
+    if n_components is None:
+        n_components = rank
+    n_components = min(n_components, rank)
+
+    if method == "full":
+        u, s, _ = np.linalg.svd(matrix, full_matrices=False)
+
+    elif method == "gram":
+        eigenvals, v = np.linalg.eigh(matrix.T @ matrix)
+        eigenvals, v = eigenvals[::-1], v[:, ::-1]
+        s = np.sqrt(np.clip(eigenvals, 0, None))
+
+        # Components with no variance have no defined direction
+        n_components = min(n_components, np.count_nonzero(s > s[0] * np.finfo(float).eps * max(matrix.shape)))
+        s, v = s[:n_components], v[:, :n_components]
+        u = (matrix @ v) / s
+
+    else:
+        rng = np.random.default_rng(seed)
+        q = matrix @ rng.standard_normal((matrix.shape[1], min(n_components + oversample, rank)))
+        for _ in range(n_iter):
+            q, _ = np.linalg.qr(q)
+            q, _ = np.linalg.qr(matrix.T @ q)
+            q = matrix @ q
+        q, _ = np.linalg.qr(q)
+        u_small, s, _ = np.linalg.svd(q.T @ matrix, full_matrices=False)
+        u = q @ u_small
+
+    return u[:, :n_components], s[:n_components]
+
+
+def _incremental_svd(components: np.ndarray, singular_values: np.ndarray, mean: np.ndarray, n: int,
+                     batch: np.ndarray, n_components: int = None) -> tuple[np.ndarray, np.ndarray, np.ndarray]:
+    """
+    Updates the SVD of mean-centred data with a new batch of rows (Ross et al. 2008).
+    Leading axes are treated as independent stacked problems.
+
+    :param components: Array of right singular vectors, shape (..., k, bins)
+    :param singular_values: Array of singular values, shape (..., k)
+    :param mean: Array of the running mean, shape (..., bins)
+    :param n: Number of rows seen so far
+    :param batch: Array of new rows, shape (..., rows, bins)
+    :param n_components: Number of components to keep, all if None
+    :return: Updated components, singular values and mean
+    """
+    n_batch = batch.shape[-2]
+    batch_mean = batch.mean(axis=-2)
+    stack = [batch - batch_mean[..., np.newaxis, :]]
+    if n > 0:
+        # Previous components, and a row accounting for the shift in the mean
+        mean_shift = np.sqrt(n * n_batch / (n + n_batch)) * (mean - batch_mean)
+        stack = [singular_values[..., np.newaxis] * components] + stack + [mean_shift[..., np.newaxis, :]]
+    _, s, vt = np.linalg.svd(np.concatenate(stack, axis=-2), full_matrices=False)
+
+    keep = min(n + n_batch, batch.shape[-1]) if n_components is None else n_components
+    return vt[..., :keep, :], s[..., :keep], mean + (batch_mean - mean) * n_batch / (n + n_batch)
+
+
+def _stacked_svd(arrays: np.ndarray, n_components: int = None, method: str = "full",
+                 seed: int | np.random.Generator = None) -> tuple[np.ndarray, np.ndarray]:
+    """
+    Leading left singular vectors and singular values of a stack of matrices.
+
+    "full" uses one stacked np.linalg.svd, "gram" one stacked eigendecomposition of the Gram matrices and
+    "randomized" calls `truncated_svd` on each matrix. Components with no variance are returned as zeros,
+    so every matrix gives the same number of components.
+
+    :param arrays: Array of matrices, shape (n, rows, columns)
+    :param n_components: Number of components to return, all if None
+    :param method: "full", "gram" or "randomized"
+    :param seed: Seed or generator for the randomized method
+    :return: Left singular vectors, shape (n, rows, components), and singular values, shape (n, components)
+    """
+    if method not in SVD_METHODS:
+        raise ValueError(f"Unknown SVD method '{method}', must be one of {SVD_METHODS}")
+    rank = min(arrays.shape[1:])
+    n_components = rank if n_components is None else min(n_components, rank)
+
+    if method == "full":
+        u, s, _ = np.linalg.svd(arrays, full_matrices=False)
+        return u[..., :n_components], s[..., :n_components]
+
+    if method == "gram":
+        eigenvals, v = np.linalg.eigh(np.swapaxes(arrays, 1, 2) @ arrays)
+        s = np.sqrt(np.clip(eigenvals[:, ::-1][:, :n_components], 0, None))
+        u = arrays @ v[:, :, ::-1][:, :, :n_components]
+        tol = s[:, :1] * np.finfo(float).eps * max(arrays.shape[1:])
+        return np.divide(u, s[:, np.newaxis, :], out=np.zeros_like(u), where=(s > tol)[:, np.newaxis, :]), s
+
+    rng = np.random.default_rng(seed)
+    u = np.zeros((len(arrays), arrays.shape[1], n_components))
+    s = np.zeros((len(arrays), n_components))
+    for i, matrix in enumerate(arrays):
+        u_i, s_i = truncated_svd(matrix, n_components, method, seed=rng)
+        u[i, :, :len(s_i)], s[i, :len(s_i)] = u_i, s_i
+    return u, s
+
+
+def _bootstrap_svd(error_arrays: np.ndarray, u0: np.ndarray, n_components: int = None, method: str = "full",
+                   seed: int | np.random.Generator = None) -> tuple[np.ndarray, ...]:
+    """
+    Stacked SVD of a block of perturbed PCA realisations, with signs aligned to a reference.
+
+    :param error_arrays: Array of normalised perturbed spectra, shape (realisations, bins, spectra)
+    :param u0: Reference principal components to align signs with, shape (bins, components)
+    :param n_components: Number of leading components to decompose, all if None
+    :param method: SVD method, see `_stacked_svd`
+    :param seed: Seed or generator for the randomized method
+    :return: Sums and sums of squares of the aligned components and of the normalised eigenvalues
+    """
+    u, s = _stacked_svd(error_arrays, n_components, method, seed)
+
+    # Flip components pointing away from the reference
+    signs = np.where(np.einsum("nbk,bk->nk", u, u0) < 0, -1., 1.)
+    u *= signs[:, np.newaxis, :]
+
+    # Normalise eigenvalues by the total variance, which is known without the trailing components
+    eigenvals = s ** 2 / np.sum(error_arrays ** 2, axis=(1, 2))[:, np.newaxis]
+
+    return u.sum(axis=0), (u ** 2).sum(axis=0), eigenvals.sum(axis=0), (eigenvals ** 2).sum(axis=0)
+
+
+class ChannelMap:
+    """
+    Maps energy bin edges onto RMF channels.
+    Build once per RMF and set of bin edges, then pass to every Spectrum that shares them.
+
+    Parameters
+    ==========
+    rmf_file: str
+        Spectrum RMF file
+    energy_bin_edges: np.ndarray
+        Array of energy bin edges to use for binning
+
+    Attributes
+    ==========
+    rmf_file: str
+        Spectrum RMF file name
+    energy_bin_edges: np.ndarray
+        Array of energy bin edges to use for binning
+    channels: np.ndarray
+        Array of RMF channels, in order of increasing energy
+    emins: np.ndarray
+        Array of lower channel energies, in order of increasing energy
+    channel_bins: np.ndarray
+        Array containing the channel edges of each energy bin
+    """
+
+    def __init__(self, rmf_file: str, energy_bin_edges: np.ndarray) -> None:
+        self.rmf_file = rmf_file
+        self.energy_bin_edges = np.asarray(energy_bin_edges)
+
+        # Read RMF
+        channels, emins, emaxs = read_ebounds(rmf_file)
+        if emaxs[-1] < emaxs[0]:
+            channels = np.flipud(channels)
+            emins = np.flipud(emins)
+        self.channels = channels
+        self.emins = emins
+
+        # Find the channel containing each energy edge, edges outside the RMF range are dropped
+        idx = np.searchsorted(emins, self.energy_bin_edges, side="right") - 1
+        idx = idx[(idx >= 1) & (idx <= len(channels) - 2)]
+        self.channel_bins = channels[idx]
+
+    def __str__(self):
+        return f"ChannelMap of {self.rmf_file} with {len(self.channel_bins) - 1} bins"
+
+    def bin_counts(self, counts: np.ndarray) -> np.ndarray:
+        """
+        Average counts over the channels in each energy bin.
+
+        :param counts: Array of counts per channel, the last axis must be channel
+        :return: Array of mean counts per energy bin
+        """
+        bins = self.channel_bins
+        return np.add.reduceat(counts[..., :bins[-1]], bins[:-1], axis=-1) / np.diff(bins)
+
+
 class Spectrum:
     """
     X-ray Spectrum object.
@@ -34,6 +276,14 @@ class Spectrum:
         Apply background correction, requires corresponding bkg file (*_bkg.pha or similar)
     n_errs: int
         Number of perturbed spectra to use for error estimation
+    channel_map: ChannelMap
+        Precomputed channel map for this RMF and bin edges, built from the RMF if not given
+    perturbation: str
+        Perturbation used for error estimation, "gaussian" (approximation) or "poisson"
+    seed: int | np.random.Generator
+        Seed or generator for the perturbed spectra
+    cache: ResultCache
+        Cache for the binned and perturbed spectra, only used when seed is an int
 
     Attributes
     ==========
@@ -49,93 +299,85 @@ class Spectrum:
         Array containing the channel edges of each bin
     energies: np.ndarray
         Array of energy bin midpoints
+    channel_map: ChannelMap
+        Channel map used for binning
     exptime: float
         Spectrum exposure time
-    perturbed_spectra: list
-        Array of perturbed spectra counts for error estimation
+    perturbed_spectra: np.ndarray
+        Array of perturbed spectra counts for error estimation, shape (n_errs, bins)
     """
 
-    def __init__(self, spec_file: str, rmf_file: str, energy_bin_edges: np.ndarray, bkg_corr: bool = True, n_errs: int = 20) -> None:
+    def __init__(self, spec_file: str, rmf_file: str, energy_bin_edges: np.ndarray, bkg_corr: bool = True, n_errs: int = 20,
+                 channel_map: ChannelMap = None, perturbation: str = "gaussian",
+                 seed: int | np.random.Generator = None, cache: ResultCache = None) -> None:
+        if perturbation not in PERTURBATIONS:
+            raise ValueError(f"Unknown perturbation '{perturbation}', must be one of {PERTURBATIONS}")
+
         self.spec_file = spec_file
         self.rmf_file = rmf_file
         self.energy_bin_edges = energy_bin_edges
         self.energies = energy_bin_edges[:-1]  # (self.energy_bin_edges[:-1] + self.energy_bin_edges[1:]) / 2
         self.__n_errs = n_errs
-
-        # Initialise arrays
-        self.counts = np.empty(0, dtype=int)
-        self.channels = np.empty(0, dtype=int)
-        self.perturbed_spectra = []
-        self.__fluxes = np.empty(0)
-        self.__channel_bins = np.empty(0, dtype=int)
+        self.channel_map = ChannelMap(rmf_file, energy_bin_edges) if channel_map is None else channel_map
+        self.__channel_bins = self.channel_map.channel_bins
+
+        # Reuse cached results, an unseeded spectrum is never cached
+        key = None
+        if cache is not None and isinstance(seed, (int, np.integer)):
+            bkg_key = cache.file_key(spec_file.replace("src", "bkg")) if bkg_corr else None
+            key = cache.key("Spectrum", cache.file_key(spec_file), bkg_key, cache.file_key(rmf_file),
+                            np.asarray(energy_bin_edges, dtype=float), bkg_corr, n_errs, perturbation, int(seed))
+            cached = cache.load(key)
+            if cached is not None:
+                self.channels = cached["channels"]
+                self.__fluxes = cached["fluxes"]
+                self.counts = cached["counts"]
+                self.perturbed_spectra = cached["perturbed_spectra"]
+                self.exptime = float(cached["exptime"])
+                return
 
         # Read source spectrum FITS
-        src = pyfits.open(spec_file)
-        src_data = src['SPECTRUM'].data
-        src_hdr = src['SPECTRUM'].header
-        self.exptime = src_hdr['EXPOSURE']
+        self.channels, self.__fluxes, self.exptime, src_backscal = read_pha(spec_file)
+        self.counts = self.__fluxes.copy()
 
-        # Read background spectrum FITS
+        # Apply background correction
         if bkg_corr:
             bkg_file = self.spec_file.replace("src", "bkg")
-            bkg = pyfits.open(bkg_file)
-            bkg_data = bkg['SPECTRUM'].data
-            bkg_hdr = bkg['SPECTRUM'].header
-            src_backscal = src_hdr['BACKSCAL']
-            backscal = bkg_hdr['BACKSCAL']
-            bkg_exptime = bkg_hdr['EXPOSURE']
-
-        # Extract data from FITS
-        for i in range(0, len(src_data)):
-            row = src_data[i]
-            self.channels = np.append(self.channels, row[0])
-            self.__fluxes = np.append(self.__fluxes, row[1])
-
-            # Apply background correction
-            if bkg_corr:
-                backrow = bkg_data[i]
-                counts = row[1] - backrow[1] * (self.exptime / bkg_exptime) * (src_backscal / backscal)
-            # Or don't
-            else:
-                counts = row[1]
+            _, bkg_counts, bkg_exptime, backscal = read_pha(bkg_file)
+            self.counts -= bkg_counts * (self.exptime / bkg_exptime) * (src_backscal / backscal)
 
-            # Add counts (/s) to array
-            self.counts = np.append(self.counts, counts / self.exptime)
-
-        # Read RMF
-        rmf_file = pyfits.open(self.rmf_file)
-        ebounds = rmf_file["EBOUNDS"].data
-        emins = np.empty(0, dtype=float)
-        emaxs = np.empty(0, dtype=float)
-        channels = np.empty(0, dtype=int)
-
-        # Get channels edges for each energy bin
-        for row in ebounds:
-            channels = np.append(channels, row[0])
-            emins = np.append(emins, row[1])
-            emaxs = np.append(emaxs, row[2])
-        if emaxs[-1] < emaxs[0]:
-            channels = np.flipud(np.array(channels))
-            emins = np.flipud(np.array(emins))
-        for e in self.energy_bin_edges:
-            for i in range(1, len(channels) - 1):
-                if emins[i] <= e < emins[i + 1]:
-                    self.__channel_bins = np.append(self.__channel_bins, channels[i])
+        # Convert to counts (/s)
+        self.counts /= self.exptime
 
         # Apply binning
-        binned_counts = np.empty(0)
-        for bmin, bmax in zip(self.__channel_bins[:-1], self.__channel_bins[1:]):
-            binned_counts = np.append(binned_counts, sum(self.counts[bmin:bmax]) / len(self.counts[bmin:bmax]))
-        self.counts = binned_counts
+        self.counts = self.channel_map.bin_counts(self.counts)
 
         # Generate random perturbed spectra for PCA error estimation
-        for i in range(0, self.__n_errs):
-            spec_i = [max([c, 0]) + np.random.randn() * max([c, 0]) ** 0.5 for c in self.__fluxes]
-            spec_i = [i / self.exptime for i in spec_i]
-            binned_counts = np.empty(0)
-            for bmin, bmax in zip(self.__channel_bins[:-1], self.__channel_bins[1:]):
-                binned_counts = np.append(binned_counts, sum(spec_i[bmin:bmax]) / len(spec_i[bmin:bmax]))
-            self.perturbed_spectra.append(binned_counts)
+        self.perturbed_spectra = self.__perturb(perturbation, np.random.default_rng(seed))
+
+        if key is not None:
+            cache.save(key, channels=self.channels, fluxes=self.__fluxes, counts=self.counts,
+                       perturbed_spectra=self.perturbed_spectra, exptime=self.exptime)
+
+    def __perturb(self, perturbation: str, rng: np.random.Generator) -> np.ndarray:
+        """
+        Draws the perturbed spectra in blocks of realisations and bins them.
+
+        :param perturbation: "gaussian" or "poisson"
+        :param rng: Random number generator
+        :return: Array of binned perturbed spectra, shape (n_errs, bins)
+        """
+        expected = np.clip(self.__fluxes, 0, None)
+        perturbed = np.empty((self.__n_errs, len(self.__channel_bins) - 1))
+        block = max(1, PERTURB_BLOCK // len(expected))
+        for i in range(0, self.__n_errs, block):
+            n = min(block, self.__n_errs - i)
+            if perturbation == "poisson":
+                spec = rng.poisson(expected, size=(n, len(expected))).astype(float)
+            else:
+                spec = expected + rng.standard_normal((n, len(expected))) * np.sqrt(expected)
+            perturbed[i:i + n] = self.channel_map.bin_counts(spec / self.exptime)
+        return perturbed
 
     def __str__(self):
         return f"Spectrum object of {self.spec_file} | {self.rmf_file}"
@@ -163,18 +405,161 @@ class Spectrum:
         plt.show()
 
 
+def _load_spectrum(spec_file: str, seed: int | None, kwargs: dict) -> "Spectrum":
+    return Spectrum(spec_file, seed=seed, **kwargs)
+
+
+def load_spectra(spec_files: list[str], rmf_file: str, energy_bin_edges: np.ndarray, workers: int = 1,
+                 processes: bool = False, bkg_corr: bool = True, n_errs: int = 20, perturbation: str = "gaussian",
+                 seed: int = None, cache: ResultCache = None) -> list["Spectrum"]:
+    """
+    Loads and bins many spectra sharing one RMF, concurrently.
+    The RMF is read once and its ChannelMap is shared by every spectrum.
+
+    :param spec_files: Spectrum FITS files (Should be *_src.pha or similar)
+    :param rmf_file: Spectrum RMF file shared by all spectra
+    :param energy_bin_edges: Array of energy bin edges to use for binning
+    :param workers: Number of threads (or processes) to load with
+    :param processes: If True use a process pool rather than a thread pool
+    :param bkg_corr: Apply background correction, requires corresponding bkg files
+    :param n_errs: Number of perturbed spectra to use for error estimation
+    :param perturbation: Perturbation used for error estimation, "gaussian" or "poisson"
+    :param seed: Seed for the perturbed spectra, spectrum i uses seed + i
+    :param cache: Cache for the binned and perturbed spectra
+    :return: List of spectra, in the same order as spec_files
+    """
+    kwargs = {"rmf_file": rmf_file, "energy_bin_edges": energy_bin_edges, "bkg_corr": bkg_corr, "n_errs": n_errs,
+              "channel_map": ChannelMap(rmf_file, energy_bin_edges), "perturbation": perturbation, "cache": cache}
+    seeds = [None if seed is None else seed + i for i in range(len(spec_files))]
+
+    if workers <= 1:
+        return [_load_spectrum(f, s, kwargs) for f, s in zip(spec_files, seeds)]
+    pool = ProcessPoolExecutor if processes else ThreadPoolExecutor
+    with pool(max_workers=workers) as executor:
+        return list(executor.map(_load_spectrum, spec_files, seeds, [kwargs] * len(spec_files)))
+
+
+class SpectralCube:
+    """
+    Memory-mapped on-disk store of binned spectra.
+    Write once from Spectrum objects with `SpectralCube.write()`, then open by path to use with SpectralPCA.
+    The cube is a directory of .npy arrays and a meta.json file.
+
+    Parameters
+    ==========
+    path: str
+        Cube directory
+    mode: str
+        Memory-map mode for the arrays, "r" (read-only) or "r+" (read/write)
+
+    Attributes
+    ==========
+    path: str
+        Cube directory
+    counts: np.ndarray
+        Array containing the binned counts of each spectrum, shape (n_spectra, bins)
+    perturbed_spectra: np.ndarray
+        Array containing the perturbed spectra of each spectrum, shape (n_spectra, n_errs, bins)
+    exptimes: np.ndarray
+        Array containing the exposure time of each spectrum
+    channels: np.ndarray
+        Array containing the channels of the first spectrum
+    energy_bin_edges: np.ndarray
+        Array of energy bin edges used for binning
+    energies: np.ndarray
+        Array of energy bin midpoints
+    spec_files: list[str]
+        Spectrum FITS file names
+    rmf_files: list[str]
+        Spectrum RMF file names
+    """
+    ARRAYS = ["counts", "perturbed_spectra", "exptimes", "channels"]
+
+    def __init__(self, path: str, mode: str = "r") -> None:
+        self.path = path
+        for name in self.ARRAYS:
+            setattr(self, name, np.load(f"{path}/{name}.npy", mmap_mode=mode))
+
+        with open(f"{path}/meta.json", "r") as f:
+            meta = json.load(f)
+        self.energy_bin_edges = np.array(meta["energy_bin_edges"])
+        self.energies = self.energy_bin_edges[:-1]
+        self.spec_files = meta["spec_files"]
+        self.rmf_files = meta["rmf_files"]
+
+    def __str__(self):
+        return f"SpectralCube at {self.path} with {len(self)} spectra, {self.perturbed_spectra.shape[1]} perturbed spectra each"
+
+    def __len__(self):
+        return len(self.counts)
+
+    @classmethod
+    def write(cls, path: str, spectra: Iterable[Spectrum], n_spectra: int = None) -> "SpectralCube":
+        """
+        Write spectra to a new cube, one spectrum at a time.
+        Spectra may be a generator so that only one Spectrum is held in memory.
+
+        :param path: Cube directory, created if it does not exist
+        :param spectra: Spectrum objects, all with the same binning and number of perturbed spectra
+        :param n_spectra: Number of spectra, required if spectra has no length
+        :return: The new cube, opened read-only
+        :raises ValueError: If there are no spectra, or a different number to n_spectra
+        """
+        if n_spectra is None:
+            n_spectra = len(spectra)
+        os.makedirs(path, exist_ok=True)
+
+        arrays = {}
+        spec_files = []
+        rmf_files = []
+        for i, spectrum in enumerate(spectra):
+            if i >= n_spectra:
+                raise ValueError(f"Expected {n_spectra} spectra, got more")
+            if i == 0:
+                n_errs, bins = spectrum.perturbed_spectra.shape
+                shapes = {"counts": (n_spectra, bins), "perturbed_spectra": (n_spectra, n_errs, bins), "exptimes": (n_spectra,)}
+                arrays = {name: np.lib.format.open_memmap(f"{path}/{name}.npy", mode="w+", dtype=float, shape=shape)
+                          for name, shape in shapes.items()}
+                np.save(f"{path}/channels.npy", spectrum.channels)
+                energy_bin_edges = spectrum.energy_bin_edges
+            elif not np.array_equal(spectrum.energy_bin_edges, energy_bin_edges):
+                raise ValueError(f"{spectrum.spec_file} does not share the binning of {spec_files[0]}")
+
+            arrays["counts"][i] = spectrum.counts
+            arrays["perturbed_spectra"][i] = spectrum.perturbed_spectra
+            arrays["exptimes"][i] = spectrum.exptime
+            spec_files.append(spectrum.spec_file)
+            rmf_files.append(spectrum.rmf_file)
+
+        if not spec_files:
+            raise ValueError("No spectra to write")
+        if len(spec_files) != n_spectra:
+            raise ValueError(f"Expected {n_spectra} spectra, got {len(spec_files)}")
+        for array in arrays.values():
+            array.flush()
+
+        with open(f"{path}/meta.json", "w") as f:
+            json.dump({"energy_bin_edges": np.asarray(energy_bin_edges).tolist(),
+                       "spec_files": spec_files,
+                       "rmf_files": rmf_files}, f, indent=1)
+
+        return cls(path)
+
+
 class SpectralPCA:
     """
     Class for computing the PCA of a given set of spectra.
 
     Parameters
     ==========
-    spectra: list[Spectrum]
-        List of spectra to perform PCA with, must be Spectrum objects
+    spectra: list[Spectrum] | SpectralCube
+        List of spectra to perform PCA with, must be Spectrum objects, or a SpectralCube
+    cache: ResultCache
+        Cache for the PCA results, keyed on the spectra and PCA options
 
     Attributes
     ==========
-    spectra: list[Spectrum]
+    spectra: list[Spectrum] | SpectralCube
         List of spectra used in PCA
     channels: np.ndarray
         Array containing the channel edges of each bin
@@ -189,17 +574,26 @@ class SpectralPCA:
     eigenvals: np.ndarray
         Array containing eigenvalues for each eigenspectrum
     err_spectra: np.ndarray
-        Array containing estimated errors for each eigenspectrum
+        Array containing estimated errors for each eigenspectrum, shape (components, bins)
     err_eigenval: np.ndarray
         Array containing estimated errors on each eigenvalue
     """
-    def __init__(self, spectra: list[Spectrum]) -> None:
+    RESULTS = ["mean_spectrum", "norm_spectra", "principal_comps", "eigenvals", "err_spectra", "err_eigenval"]
+
+    def __init__(self, spectra: list[Spectrum] | SpectralCube, cache: ResultCache = None) -> None:
         self.spectra = spectra
-        self.channels = spectra[0].channels
-        self.energies = spectra[0].energies
-        self._n_errs = len(spectra[0].perturbed_spectra)
-        self._n_spectra = len(spectra)
-        self.__perturbed_spectra = [s.perturbed_spectra for s in spectra]
+        self.__cache = cache
+        if isinstance(spectra, SpectralCube):
+            self.channels = spectra.channels
+            self.energies = spectra.energies
+            self.__counts = spectra.counts
+            self.__perturbed_spectra = spectra.perturbed_spectra
+        else:
+            self.channels = spectra[0].channels
+            self.energies = spectra[0].energies
+            self.__counts = np.array([s.counts for s in spectra])
+            self.__perturbed_spectra = np.array([s.perturbed_spectra for s in spectra])
+        self._n_spectra, self._n_errs = self.__perturbed_spectra.shape[:2]
 
         self.mean_spectrum = []
         self.norm_spectra = []
@@ -221,7 +615,7 @@ class SpectralPCA:
         :return: None
         """
         # Create array of counts
-        spectra_counts_array = np.array([s.counts for s in self.spectra])
+        spectra_counts_array = np.asarray(self.__counts)
 
         # Calculate the mean spectrum
         self.mean_spectrum = np.mean(spectra_counts_array, axis=0)
@@ -233,68 +627,122 @@ class SpectralPCA:
             normalised = spectra_counts_array / self.mean_spectrum
         self.norm_spectra = np.transpose(normalised)
 
-    def __get_pca_errors(self) -> None:
+    def __get_pca_errors(self, workers: int = 1, n_components: int = None, method: str = "full",
+                         seed: int = None) -> None:
         """
         Estimates the errors in the PCA using the perturbed spectra.
-
+        Realisations are decomposed in stacked blocks, optionally spread across a process pool, with the same
+        number of components and SVD method as the PCA. At most two blocks per worker are built at once, so
+        memory stays bounded however many realisations there are.
+
+        :param workers: Number of processes to use for the SVDs
+        :param n_components: Number of leading components to decompose, all if None
+        :param method: SVD method, see `_stacked_svd`
+        :param seed: Seed for the randomized method
         :return: None
         """
-        # Get perturbed spectra
-        random_spectra = [[[(c - m) / m for c, m in zip(spectrum, self.mean_spectrum)] for spectrum in rand_spec]for rand_spec in self.__perturbed_spectra]
-
-        perturbed_pcs = []
-        perturbed_eigenvals = []
-
-        # Do PCA on each set
-        for i in range(self._n_errs):
-            error_array = np.transpose([spec_set[i] for spec_set in random_spectra])
-            u, s, _ = np.linalg.svd(error_array)
-            u = u.T
-
-            if i == 0:
-                u0 = u.copy()
+        n_bins = len(self.mean_spectrum)
+        block = max(1, BOOTSTRAP_BLOCK // (n_bins * self._n_spectra))
+        starts = range(0, self._n_errs, block)
+
+        def error_arrays(i: int) -> np.ndarray:
+            # Normalise a block of realisations to the mean, shape (realisations, bins, spectra)
+            perturbed = np.asarray(self.__perturbed_spectra[:, i:i + block])
+            return np.transpose((perturbed - self.mean_spectrum) / self.mean_spectrum, (1, 2, 0))
+
+        def block_seed(i: int) -> np.random.Generator | None:
+            # Independent, reproducible random streams for each block of the randomized method
+            return None if seed is None else np.random.default_rng([seed, i + 1])
+
+        # The first realisation sets the reference signs
+        u0 = _stacked_svd(error_arrays(0)[:1], n_components, method, block_seed(-1))[0][0]
+
+        # Do PCA on each set, summing the results as blocks finish
+        totals = [0., 0., 0., 0.]
+
+        def add(result: tuple[np.ndarray, ...]) -> None:
+            for j, r in enumerate(result):
+                totals[j] = totals[j] + r
+
+        if workers > 1:
+            with ProcessPoolExecutor(max_workers=workers) as pool:
+                pending = set()
+                for i in starts:
+                    if len(pending) >= 2 * workers:
+                        done, pending = wait(pending, return_when=FIRST_COMPLETED)
+                        for future in done:
+                            add(future.result())
+                    pending.add(pool.submit(_bootstrap_svd, error_arrays(i), u0, n_components, method, block_seed(i)))
+                for future in pending:
+                    add(future.result())
+        else:
+            for i in starts:
+                add(_bootstrap_svd(error_arrays(i), u0, n_components, method, block_seed(i)))
+        pc_sum, pc_sq, eig_sum, eig_sq = totals
 
-            # Normalise eigenvalues
-            eigenvals_sq = s ** 2
-            perturbed_eigenvals.append(eigenvals_sq / eigenvals_sq.sum())
-            for j in range(len(u)):
-                if np.dot(u0[j], u[j]) < 0:
-                    u[j] *= -1
+        # Calculate errors
+        self.err_eigenval = np.sqrt(np.clip(eig_sq / self._n_errs - (eig_sum / self._n_errs) ** 2, 0, None))
+        self.err_spectra = np.sqrt(np.clip(pc_sq / self._n_errs - (pc_sum / self._n_errs) ** 2, 0, None)).T
 
-            perturbed_pcs.append(u)
+        self.__print_eigenvals()
 
-        # Calculate errors
-        perturbed_eigenvals = np.array(perturbed_eigenvals)
-        self.err_eigenval = np.std(perturbed_eigenvals, axis=0)
-        self.err_spectra = np.std(np.array(perturbed_pcs), axis=0)
+    def __print_eigenvals(self) -> None:
+        """
+        Prints the eigenvalues with uncertainties.
 
-        # Print eigenvalues with uncertainties
-        for i in range(0, self._n_spectra - 1):
-            print(f"Eigenvector {i + 1}: {str(self.eigenvals[i] * 100)[0:6]} +/- {str(self.eigenvals[i + 1] * 100)[0:6]} %")
+        :return: None
+        """
+        for i in range(0, min(self._n_spectra - 1, len(self.err_eigenval), len(self.eigenvals))):
+            print(f"Eigenvector {i + 1}: {str(self.eigenvals[i] * 100)[0:6]} +/- {str(self.err_eigenval[i] * 100)[0:6]} %")
         print(f"Remaining: {str(sum(self.eigenvals[self._n_spectra:]) * 100)[0:6]}%")
 
-    def do_pca(self, errors: bool = True) -> None:
+    def do_pca(self, errors: bool = True, workers: int = 1, n_components: int = None, method: str = "full",
+               seed: int | np.random.Generator = None) -> None:
         """
         Does the PCA for the spectra.
         Once called `principal_comps` and `eigenvals` will be calculated.
 
         :param errors: If True errors will be estimated for the PCA
+        :param workers: Number of processes to use for error estimation
+        :param n_components: Number of leading components to compute, all if None
+        :param method: SVD method, "full", "gram" (few spectra, many bins) or "randomized" (see `truncated_svd`)
+        :param seed: Seed or generator for the randomized method
         :return: None
         """
+        # Reuse cached results, an unseeded randomized PCA is never cached
+        key = None
+        if self.__cache is not None and (method != "randomized" or isinstance(seed, (int, np.integer))):
+            seed = int(seed) if method == "randomized" else None
+            key = self.__cache.key("SpectralPCA", np.asarray(self.__counts), np.asarray(self.__perturbed_spectra),
+                                   errors, n_components, method, seed)
+            cached = self.__cache.load(key)
+            if cached is not None:
+                for name in self.RESULTS:
+                    setattr(self, name, cached[name])
+                if errors:
+                    self.__print_eigenvals()
+                return
+
         # Normalise the spectra and subtract the mean
         self.__normalise_spectra()
 
         # Do PCA (Using singular value decomposition)
-        u, s, _ = np.linalg.svd(self.norm_spectra)
+        if method == "full" and n_components is None:
+            u, s, _ = np.linalg.svd(self.norm_spectra)
+        else:
+            u, s = truncated_svd(self.norm_spectra, n_components, method, seed=seed)
         self.principal_comps = np.transpose(u)
 
-        # Get Eigenvalues
-        eigenvals = [i ** 2 for i in s]
-        self.eigenvals = [i / sum(eigenvals) for i in eigenvals]
+        # Get Eigenvalues, the total variance is known without the trailing components
+        self.eigenvals = s ** 2 / np.sum(self.norm_spectra ** 2)
 
         # Get errors
         if errors:
-            self.__get_pca_errors()
+            self.__get_pca_errors(workers, None if method == "full" and n_components is None else len(s), method,
+                                  None if seed is None else int(np.random.default_rng(seed).integers(2 ** 32)))
+
+        if key is not None:
+            self.__cache.save(key, **{name: np.asarray(getattr(self, name)) for name in self.RESULTS})
 
     def plot_pca_result(self, max_spec: int = 6, flip: bool = False) -> None:
         """
@@ -305,7 +753,7 @@ class SpectralPCA:
         :return: None
         """
         # Eigenspectra plot
-        n_spec = min(self._n_spectra, max_spec)
+        n_spec = min(self._n_spectra, max_spec, len(self.principal_comps))
         _, ax = plt.subplots(n_spec, 1, sharex=True, gridspec_kw={'hspace': 0}, figsize=(8, n_spec * 2))
         for i in range(0, n_spec):
             rate = -self.principal_comps[i] if flip else self.principal_comps[i]
@@ -330,3 +778,159 @@ class SpectralPCA:
         plt.yscale("log")
 
         plt.show()
+
+
+class IncrementalSpectralPCA(SpectralPCA):
+    """
+    Class for computing the PCA of spectra added one at a time with `partial_fit()`.
+    Keeps an incremental SVD of the mean-centred spectra truncated to n_components, so memory and the cost of
+    each call do not grow with the number of spectra. The results are updated by `partial_fit()` unless
+    update=False, and match SpectralPCA when all components are kept.
+
+    With n_components=None every component is kept and the result is exact, but memory grows as O(N) and each
+    call costs O(N^2) for N spectra added so far, so this is only suitable for small sets of spectra.
+
+    Parameters
+    ==========
+    n_components: int
+        Number of components to keep, all if None (exact, see above)
+    errors: bool
+        If True errors will be estimated for the PCA using the perturbed spectra
+
+    Attributes
+    ==========
+    n_spectra: int
+        Number of spectra added so far
+    channels: np.ndarray
+        Array containing the channel edges of each bin
+    energies: np.ndarray
+        Array of energy bin midpoints
+    mean_spectrum: np.ndarray
+        Mean spectrum counts array of all spectra
+    principal_comps: np.ndarray
+        Array containing the principal components
+    eigenvals: np.ndarray
+        Array containing eigenvalues for each eigenspectrum
+    err_spectra: np.ndarray
+        Array containing estimated errors for each eigenspectrum
+    err_eigenval: np.ndarray
+        Array containing estimated errors on each eigenvalue
+    """
+    def __init__(self, n_components: int | None = INCREMENTAL_COMPONENTS, errors: bool = True) -> None:
+        self.spectra = []
+        self.channels = None
+        self.energies = None
+        self._n_errs = 0
+        self._n_spectra = 0
+        self.__n_components = n_components
+        self.__errors = errors
+
+        # Incremental SVD states of the spectra and of each set of perturbed spectra
+        self.__components = None
+        self.__singular_values = None
+        self.__sum_sq = None
+        self.__pert_components = None
+        self.__pert_singular_values = None
+        self.__pert_mean = None
+
+        self.mean_spectrum = []
+        self.principal_comps = []
+        self.eigenvals = []
+
+        self.err_spectra = []
+        self.err_eigenval = []
+
+    def __str__(self):
+        if self.energies is None:
+            return "IncrementalSpectralPCA with 0 spectra"
+        return f"IncrementalSpectralPCA with {self._n_spectra} spectra, {len(self.channels)} channels, {len(self.energies)} energies ({self.energies[0]}-{self.energies[-1]})"
+
+    @property
+    def n_spectra(self) -> int:
+        return self._n_spectra
+
+    def partial_fit(self, spectra: Spectrum | list[Spectrum], update: bool = True) -> None:
+        """
+        Adds one or more spectra to the PCA and optionally updates the results.
+
+        :param spectra: Spectrum, or list of spectra, with the same binning as previous spectra
+        :param update: If True recompute the results, including errors, otherwise call `do_pca()` when needed
+        :return: None
+        """
+        if isinstance(spectra, Spectrum):
+            spectra = [spectra]
+        if len(spectra) == 0:
+            return
+        counts = np.array([s.counts for s in spectra])
+        n = self._n_spectra
+
+        if n == 0:
+            self.channels = spectra[0].channels
+            self.energies = spectra[0].energies
+            self._n_errs = len(spectra[0].perturbed_spectra) if self.__errors else 0
+            self.mean_spectrum = np.zeros(counts.shape[1])
+            self.__sum_sq = np.zeros(counts.shape[1])
+        elif counts.shape[1] != len(self.mean_spectrum):
+            raise ValueError(f"Expected spectra with {len(self.mean_spectrum)} bins, got {counts.shape[1]}")
+        if self._n_errs and any(len(s.perturbed_spectra) != self._n_errs for s in spectra):
+            raise ValueError(f"Expected spectra with {self._n_errs} perturbed spectra, got "
+                             f"{sorted({len(s.perturbed_spectra) for s in spectra})}")
+
+        self.__components, self.__singular_values, self.mean_spectrum = _incremental_svd(
+            self.__components, self.__singular_values, self.mean_spectrum, n, counts, self.__n_components)
+        self.__sum_sq += np.sum(counts ** 2, axis=0)
+
+        if self._n_errs:
+            # Shape (n_errs, spectra, bins)
+            perturbed = np.transpose([s.perturbed_spectra for s in spectra], (1, 0, 2))
+            if n == 0:
+                self.__pert_mean = np.zeros(perturbed[:, 0].shape)
+            self.__pert_components, self.__pert_singular_values, self.__pert_mean = _incremental_svd(
+                self.__pert_components, self.__pert_singular_values, self.__pert_mean, n, perturbed, self.__n_components)
+
+        self._n_spectra += len(spectra)
+        if update:
+            self.do_pca(errors=bool(self._n_errs))
+
+    def do_pca(self, errors: bool = True) -> None:
+        """
+        Computes the PCA results from the current incremental state.
+        Called by `partial_fit()` unless update=False.
+
+        :param errors: If True errors will be estimated for the PCA
+        :return: None
+        """
+        if self._n_spectra == 0:
+            raise ValueError("No spectra have been added, call partial_fit() first")
+
+        # Normalise the centred spectra to the mean, (x - m) / m
+        basis = np.transpose(self.__singular_values[:, np.newaxis] * self.__components) / self.mean_spectrum[:, np.newaxis]
+        u, s, _ = np.linalg.svd(basis, full_matrices=False)
+        self.principal_comps = np.transpose(u)
+
+        # Get Eigenvalues, normalised by the total variance of all spectra
+        total = np.sum((self.__sum_sq - self._n_spectra * self.mean_spectrum ** 2) / self.mean_spectrum ** 2)
+        self.eigenvals = s ** 2 / total if total > 0 else np.zeros_like(s)
+
+        # Get errors
+        if errors and self._n_errs:
+            self.__get_incremental_errors()
+
+    def __get_incremental_errors(self) -> None:
+        """
+        Estimates the errors in the PCA using the incremental states of the perturbed spectra.
+
+        :return: None
+        """
+        # Perturbed spectra relative to the mean spectrum, split into their centred part and mean offset
+        centred = np.swapaxes(self.__pert_singular_values[..., np.newaxis] * self.__pert_components, 1, 2)
+        offset = np.sqrt(self._n_spectra) * (self.__pert_mean - self.mean_spectrum)
+        error_arrays = np.concatenate([centred, offset[..., np.newaxis]], axis=-1) / self.mean_spectrum[:, np.newaxis]
+
+        u0 = np.linalg.svd(error_arrays[0], full_matrices=False)[0]
+        pc_sum, pc_sq, eig_sum, eig_sq = _bootstrap_svd(error_arrays, u0)
+
+        # Calculate errors, keeping the components that can carry signal
+        n_comps = min(self._n_spectra, len(self.mean_spectrum), len(self.eigenvals))
+        self.err_eigenval = np.sqrt(np.clip(eig_sq / self._n_errs - (eig_sum / self._n_errs) ** 2, 0, None))[:n_comps]
+        self.err_spectra = np.sqrt(np.clip(pc_sq / self._n_errs - (pc_sum / self._n_errs) ** 2, 0, None)).T[:n_comps]
@@ -0,0 +1,162 @@
+"""
+Benchmarks for fluxResolve.py using a synthetic light curve.
+
+Generates a light curve of blocks of constant rate with Gaussian noise and
+times the requested phase detection method against the previous per-bin loop.
+
+Usage
+---------
+python benchmarks/bench_flux_resolve.py <Benchmark>
+
+Benchmark - Benchmark to run (threshold, stream, blocks)
+
+Options
+---------
+-n --bins - Number of light curve bins, defaults to 1000000
+
+-t --dt - Bin size in seconds, defaults to 10 (Xtend)
+
+-k --blocks - Number of blocks of constant rate, defaults to 50
+
+-r --repeats - Number of timing repeats, defaults to 3
+
+-c --chunk - Number of bins per chunk for the stream benchmark, defaults to 100000
+
+---------
+
+Author - Thomas Hodd
+
+Date - 17th October 2026
+
+Version - 1.0
+"""
+import argparse
+import os
+import sys
+import tempfile
+import time
+import numpy as np
+import astropy.io.fits as pyfits
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from fluxResolve import find_flux_gtis, find_block_gtis, stream_flux_gtis, read_chunks, change_points
+
+
+def synthetic_lc(n_bins: int, dt: float, n_blocks: int, seed: int = 0) -> tuple[np.ndarray, np.ndarray, np.ndarray]:
+    """
+    Light curve of blocks of constant rate with Gaussian noise.
+
+    :param n_bins: Number of bins
+    :param dt: Bin size in seconds
+    :param n_blocks: Number of blocks
+    :param seed: Random seed
+    :return: Time, rate and error
+    """
+    rng = np.random.default_rng(seed)
+    times = 7E8 + dt * np.arange(n_bins)
+    truth = rng.uniform(2, 8, n_blocks)[np.arange(n_bins) * n_blocks // n_bins]
+    errors = np.ones(n_bins)
+    return times, rng.normal(truth, errors), errors
+
+
+def timed(func, repeats: int) -> float:
+    """
+    Best wall time of several calls to a function.
+
+    :param func: Function to time (no arguments)
+    :param repeats: Number of calls
+    :return: Best time in seconds
+    """
+    best = np.inf
+    for _ in range(repeats):
+        t0 = time.perf_counter()
+        func()
+        best = min(best, time.perf_counter() - t0)
+    return best
+
+
+def loop_gtis(times: np.ndarray, rates: np.ndarray, mean: float, sig: float, min_length: float = 3000) -> list:
+    """
+    Previous per-bin loop and list.pop pruning, kept for comparison.
+    """
+    prior_rate = rates[0]
+    gti_points = [[times[0], "High"]]
+    for rate, time_ in zip(rates[1:], times[1:]):
+        if rate > mean + sig >= prior_rate and gti_points[-1][1] != "High":
+            gti_points.append([time_, "High"])
+        if rate < mean - sig <= prior_rate and gti_points[-1][1] != "Low":
+            gti_points.append([time_, "Low"])
+        prior_rate = rate
+
+    for i, point in enumerate(gti_points):
+        if i % 2 != 0 and i != len(gti_points) - 1:
+            length = gti_points[i + 1][0] - point[0]
+            if length < min_length:
+                gti_points.pop(i)
+                gti_points.pop(i)
+    return gti_points
+
+
+def bench_threshold(directory: str, args: argparse.Namespace) -> None:
+    """
+    Time threshold phase detection on a whole light curve.
+    """
+    times, rates, _ = synthetic_lc(args.bins, args.dt, args.blocks)
+    mean = rates.mean()
+
+    print(f"Threshold benchmark ({args.bins} bins)")
+    print(f"Loop:          {timed(lambda: loop_gtis(times, rates, mean, 0.5), 1):.4f} s")
+    print(f"Vectorised:    {timed(lambda: find_flux_gtis(times, rates, mean, 0.5), args.repeats):.4f} s")
+
+
+def bench_stream(directory: str, args: argparse.Namespace) -> None:
+    """
+    Time streaming threshold phase detection from a FITS light curve.
+    """
+    times, rates, errors = synthetic_lc(args.bins, args.dt, args.blocks)
+    table = pyfits.BinTableHDU.from_columns([pyfits.Column(name="TIME", format="D", array=times),
+                                             pyfits.Column(name="RATE", format="E", array=rates),
+                                             pyfits.Column(name="ERROR", format="E", array=errors)],
+                                            name="RATE")
+    lc_file = f"{directory}/synth.lc"
+    pyfits.HDUList([pyfits.PrimaryHDU(), table]).writeto(lc_file)
+    mean = rates.mean()
+
+    def stream():
+        return list(stream_flux_gtis(read_chunks(lc_file, times[0] - 1, times[-1], args.chunk), mean, 0.5))
+
+    print(f"Stream benchmark ({args.bins} bins, {args.chunk} bin chunks)")
+    print(f"Whole array:   {timed(lambda: find_flux_gtis(times, rates, mean, 0.5), args.repeats):.4f} s")
+    print(f"Stream:        {timed(stream, args.repeats):.4f} s")
+
+
+def bench_blocks(directory: str, args: argparse.Namespace) -> None:
+    """
+    Time change point segmentation against the threshold loop it replaces.
+    """
+    times, rates, errors = synthetic_lc(args.bins, args.dt, args.blocks)
+    mean = rates.mean()
+    found = len(change_points(rates, errors)) + 1
+
+    print(f"Blocks benchmark ({args.bins} bins, {args.blocks} blocks, {found} found)")
+    print(f"Loop:          {timed(lambda: loop_gtis(times, rates, mean, 0.5), 1):.4f} s")
+    print(f"Segmentation:  {timed(lambda: change_points(rates, errors), args.repeats):.4f} s")
+    print(f"Block GTIs:    {timed(lambda: find_block_gtis(times, rates, errors, mean, 0.5), args.repeats):.4f} s")
+
+
+BENCHMARKS = {"threshold": bench_threshold,
+              "stream": bench_stream,
+              "blocks": bench_blocks}
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="fluxResolve benchmarks.")
+    parser.add_argument("benchmark", type=str, choices=BENCHMARKS.keys(), help="Benchmark to run")
+    parser.add_argument("-n", "--bins", type=int, default=1000000, help="Number of light curve bins")
+    parser.add_argument("-t", "--dt", type=float, default=10, help="Bin size in seconds")
+    parser.add_argument("-k", "--blocks", type=int, default=50, help="Number of blocks of constant rate")
+    parser.add_argument("-r", "--repeats", type=int, default=3, help="Number of timing repeats")
+    parser.add_argument("-c", "--chunk", type=int, default=100000, help="Number of bins per chunk for the stream benchmark")
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        BENCHMARKS[args.benchmark](tmp, args)
@@ -0,0 +1,291 @@
+"""
+Benchmarks for SpectraPCA.py using synthetic spectra.
+
+Writes a synthetic PHA/RMF set to a temporary directory and times the
+requested stage of the Spectrum/SpectralPCA pipeline.
+
+Usage
+---------
+python benchmarks/bench_spectra_pca.py <Benchmark>
+
+Benchmark - Benchmark to run (loading, channel_map, perturbation, bootstrap, svd, load_spectra)
+
+Options
+---------
+-c --channels - Number of RMF channels, defaults to 60000 (Resolve)
+
+-r --repeats - Number of timing repeats, defaults to 3
+
+-n --nerrs - Number of perturbed spectra, defaults to 1000
+
+-s --spectra - Number of spectra, defaults to 50
+
+-w --workers - Number of processes for parallel stages, defaults to 4
+
+-b --bins - Number of energy bins for the SVD benchmark, defaults to 4000
+
+-k --components - Number of components for the SVD benchmark, defaults to 6
+
+---------
+
+Author - Thomas Hodd
+
+Date - 17th October 2026
+
+Version - 1.0
+"""
+import argparse
+import os
+import sys
+import tempfile
+import time
+import numpy as np
+import astropy.io.fits as pyfits
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from SpectraPCA import SVD_METHODS, ChannelMap, Spectrum, SpectralPCA, load_spectra, read_pha, read_ebounds, truncated_svd
+
+
+def write_synthetic_pair(directory: str, n_channels: int, label: str = "synth", seed: int = 0) -> tuple[str, str]:
+    """
+    Write a synthetic source/background PHA pair and a matching RMF EBOUNDS table.
+
+    :param directory: Output directory
+    :param n_channels: Number of channels
+    :param label: File name prefix
+    :param seed: Random seed for the synthetic counts
+    :return: Source PHA file name and RMF file name
+    """
+    rng = np.random.default_rng(seed)
+    channels = np.arange(n_channels, dtype=np.int32)
+    energies = np.linspace(0.1, 20, n_channels + 1)
+    model = 1E3 * energies[:-1] ** -1.5
+
+    for kind, scale in [("src", 1.0), ("bkg", 0.05)]:
+        counts = rng.poisson(model * scale).astype(np.int32)
+        table = pyfits.BinTableHDU.from_columns([pyfits.Column(name="CHANNEL", format="J", array=channels),
+                                                 pyfits.Column(name="COUNTS", format="J", array=counts)],
+                                                name="SPECTRUM")
+        table.header["EXPOSURE"] = 1E4
+        table.header["BACKSCAL"] = 1.0
+        pyfits.HDUList([pyfits.PrimaryHDU(), table]).writeto(f"{directory}/{label}_{kind}.pha", overwrite=True)
+
+    ebounds = pyfits.BinTableHDU.from_columns([pyfits.Column(name="CHANNEL", format="J", array=channels),
+                                               pyfits.Column(name="E_MIN", format="E", array=energies[:-1]),
+                                               pyfits.Column(name="E_MAX", format="E", array=energies[1:])],
+                                              name="EBOUNDS")
+    pyfits.HDUList([pyfits.PrimaryHDU(), ebounds]).writeto(f"{directory}/{label}.rmf", overwrite=True)
+
+    return f"{directory}/{label}_src.pha", f"{directory}/{label}.rmf"
+
+
+def timed(func, repeats: int) -> float:
+    """
+    Best wall time of several calls to a function.
+
+    :param func: Function to time (no arguments)
+    :param repeats: Number of calls
+    :return: Best time in seconds
+    """
+    best = np.inf
+    for _ in range(repeats):
+        t0 = time.perf_counter()
+        func()
+        best = min(best, time.perf_counter() - t0)
+    return best
+
+
+def row_loop_load(spec_file: str, rmf_file: str) -> None:
+    """
+    Previous row-by-row np.append loader, kept for comparison.
+    """
+    src = pyfits.open(spec_file)
+    channels = np.empty(0, dtype=int)
+    fluxes = np.empty(0)
+    for row in src['SPECTRUM'].data:
+        channels = np.append(channels, row[0])
+        fluxes = np.append(fluxes, row[1])
+    rmf = pyfits.open(rmf_file)
+    emins = np.empty(0, dtype=float)
+    for row in rmf['EBOUNDS'].data:
+        emins = np.append(emins, row[1])
+
+
+def bench_loading(directory: str, args: argparse.Namespace) -> None:
+    """
+    Time the FITS ingestion of a synthetic PHA/RMF pair.
+    """
+    n_channels, repeats = args.channels, args.repeats
+    spec_file, rmf_file = write_synthetic_pair(directory, n_channels)
+    edges = np.geomspace(0.5, 10, 30)
+
+    print(f"Loading benchmark ({n_channels} channels)")
+    print(f"Row loop:      {timed(lambda: row_loop_load(spec_file, rmf_file), 1):.4f} s")
+    print(f"Columnar:      {timed(lambda: (read_pha(spec_file), read_ebounds(rmf_file)), repeats):.4f} s")
+    print(f"Spectrum():    {timed(lambda: Spectrum(spec_file, rmf_file, edges, n_errs=0), repeats):.4f} s")
+
+
+def nested_loop_channel_bins(rmf_file: str, edges: np.ndarray) -> np.ndarray:
+    """
+    Previous nested loop energy-to-channel search, kept for comparison.
+    """
+    channels, emins, _ = read_ebounds(rmf_file)
+    channel_bins = np.empty(0, dtype=int)
+    for e in edges:
+        for i in range(1, len(channels) - 1):
+            if emins[i] <= e < emins[i + 1]:
+                channel_bins = np.append(channel_bins, channels[i])
+    return channel_bins
+
+
+def bench_channel_map(directory: str, args: argparse.Namespace) -> None:
+    """
+    Time the energy-to-channel mapping and per-spectrum setup with a shared ChannelMap.
+    """
+    n_channels, repeats = args.channels, args.repeats
+    spec_file, rmf_file = write_synthetic_pair(directory, n_channels)
+    edges = np.geomspace(0.5, 10, 30)
+    channel_map = ChannelMap(rmf_file, edges)
+    assert np.array_equal(channel_map.channel_bins, nested_loop_channel_bins(rmf_file, edges))
+
+    print(f"Channel map benchmark ({n_channels} channels, {len(edges)} edges)")
+    print(f"Nested loop:   {timed(lambda: nested_loop_channel_bins(rmf_file, edges), 1):.4f} s")
+    print(f"ChannelMap:    {timed(lambda: ChannelMap(rmf_file, edges), repeats):.4f} s")
+    print(f"Spectrum():    {timed(lambda: Spectrum(spec_file, rmf_file, edges, n_errs=0), repeats):.4f} s (own map)")
+    print(f"Spectrum():    {timed(lambda: Spectrum(spec_file, rmf_file, edges, n_errs=0, channel_map=channel_map), repeats):.4f} s (shared map)")
+
+
+def list_loop_perturb(fluxes: np.ndarray, exptime: float, channel_bins: np.ndarray) -> np.ndarray:
+    """
+    Previous per-channel list comprehension for one perturbed spectrum, kept for comparison.
+    """
+    spec_i = [max([c, 0]) + np.random.randn() * max([c, 0]) ** 0.5 for c in fluxes]
+    spec_i = [i / exptime for i in spec_i]
+    binned_counts = np.empty(0)
+    for bmin, bmax in zip(channel_bins[:-1], channel_bins[1:]):
+        binned_counts = np.append(binned_counts, sum(spec_i[bmin:bmax]) / len(spec_i[bmin:bmax]))
+    return binned_counts
+
+
+def bench_perturbation(directory: str, args: argparse.Namespace) -> None:
+    """
+    Time the generation of perturbed spectra for error estimation.
+    """
+    n_channels, repeats, n_errs = args.channels, args.repeats, args.nerrs
+    spec_file, rmf_file = write_synthetic_pair(directory, n_channels)
+    edges = np.geomspace(0.5, 10, 30)
+    channel_map = ChannelMap(rmf_file, edges)
+    _, fluxes, exptime, _ = read_pha(spec_file)
+
+    base = timed(lambda: Spectrum(spec_file, rmf_file, edges, n_errs=0, channel_map=channel_map), repeats)
+    per_spec = timed(lambda: list_loop_perturb(fluxes, exptime, channel_map.channel_bins), 1)
+
+    print(f"Perturbation benchmark ({n_channels} channels, n_errs={n_errs})")
+    print(f"List loop:     {per_spec * n_errs:.4f} s (extrapolated from one realisation)")
+    for perturbation in ["gaussian", "poisson"]:
+        t = timed(lambda: Spectrum(spec_file, rmf_file, edges, n_errs=n_errs, channel_map=channel_map,
+                                   perturbation=perturbation, seed=0), repeats)
+        print(f"{perturbation.capitalize() + ':':<15}{t - base:.4f} s")
+
+
+def make_spectra(directory: str, args: argparse.Namespace, n_errs: int) -> list[Spectrum]:
+    """
+    Write and load a set of synthetic spectra sharing one RMF.
+    """
+    edges = np.geomspace(0.5, 10, 30)
+    files = [write_synthetic_pair(directory, args.channels, label=f"synth{i}", seed=i) for i in range(args.spectra)]
+    channel_map = ChannelMap(files[0][1], edges)
+    return [Spectrum(spec, rmf, edges, n_errs=n_errs, channel_map=channel_map, seed=i) for i, (spec, rmf) in enumerate(files)]
+
+
+def loop_bootstrap(perturbed: np.ndarray, mean: np.ndarray) -> np.ndarray:
+    """
+    Previous serial loop of one SVD per realisation, kept for comparison.
+    """
+    random_spectra = [[[(c - m) / m for c, m in zip(spectrum, mean)] for spectrum in rand_spec] for rand_spec in perturbed]
+    perturbed_pcs = []
+    for i in range(perturbed.shape[1]):
+        u = np.linalg.svd(np.transpose([spec_set[i] for spec_set in random_spectra]))[0].T
+        if i == 0:
+            u0 = u.copy()
+        for j in range(len(u)):
+            if np.dot(u0[j], u[j]) < 0:
+                u[j] *= -1
+        perturbed_pcs.append(u)
+    return np.std(np.array(perturbed_pcs), axis=0)
+
+
+def bench_bootstrap(directory: str, args: argparse.Namespace) -> None:
+    """
+    Time the PCA error estimation with serial and pooled stacked SVDs.
+    """
+    spectra = make_spectra(directory, args, args.nerrs)
+    perturbed = np.array([s.perturbed_spectra for s in spectra])
+    mean = np.mean([s.counts for s in spectra], axis=0)
+
+    print(f"Bootstrap benchmark ({args.spectra} spectra, n_errs={args.nerrs})")
+    print(f"Loop:          {timed(lambda: loop_bootstrap(perturbed, mean), 1):.4f} s")
+    for workers in [1, args.workers]:
+        pca = SpectralPCA(spectra)
+        t_pca = timed(lambda: pca.do_pca(errors=False), args.repeats)
+        t = timed(lambda: pca.do_pca(workers=workers), args.repeats)
+        print(f"{f'Stacked ({workers}):':<15}{t - t_pca:.4f} s")
+
+
+def bench_svd(directory: str, args: argparse.Namespace) -> None:
+    """
+    Time the truncated SVD methods against the full SVD on a synthetic normalised spectra matrix.
+    """
+    rng = np.random.default_rng(0)
+    k = args.components
+    shape = np.geomspace(1, 0.1, k)[:, np.newaxis] * rng.standard_normal((k, args.spectra))
+    matrix = rng.standard_normal((args.bins, k)) @ shape + 0.01 * rng.standard_normal((args.bins, args.spectra))
+    u_full, s_full, _ = np.linalg.svd(matrix)
+
+    print(f"SVD benchmark ({args.bins} bins x {args.spectra} spectra, {k} components)")
+    print(f"{'Full SVD:':<15}{timed(lambda: np.linalg.svd(matrix), args.repeats):.4f} s")
+    for method in SVD_METHODS:
+        u, s = truncated_svd(matrix, k, method, seed=0)
+        overlap = np.abs(np.sum(u * u_full[:, :k], axis=0))
+        t = timed(lambda: truncated_svd(matrix, k, method, seed=0), args.repeats)
+        print(f"{method.capitalize() + ':':<15}{t:.4f} s | max singular value error {np.max(np.abs(s / s_full[:k] - 1)):.1e}"
+              f" | min component overlap {overlap.min():.8f}")
+
+
+def bench_load_spectra(directory: str, args: argparse.Namespace) -> None:
+    """
+    Time loading a directory of spectra serially and with load_spectra.
+    """
+    edges = np.geomspace(0.5, 10, 30)
+    files = [write_synthetic_pair(directory, args.channels, label=f"synth{i}", seed=i) for i in range(args.spectra)]
+    spec_files = [spec for spec, _ in files]
+    rmf_file = files[0][1]
+
+    print(f"Multi-file loading benchmark ({args.spectra} spectra, {args.channels} channels, n_errs={args.nerrs})")
+    print(f"{'Serial:':<15}{timed(lambda: [Spectrum(f, rmf_file, edges, n_errs=args.nerrs) for f in spec_files], 1):.4f} s")
+    for workers, processes in [(1, False), (args.workers, False), (args.workers, True)]:
+        t = timed(lambda: load_spectra(spec_files, rmf_file, edges, workers, processes, n_errs=args.nerrs), args.repeats)
+        print(f"{f'{workers} ' + ('process' if processes else 'thread') + ':':<15}{t:.4f} s")
+
+
+BENCHMARKS = {"loading": bench_loading,
+              "channel_map": bench_channel_map,
+              "perturbation": bench_perturbation,
+              "bootstrap": bench_bootstrap,
+              "svd": bench_svd,
+              "load_spectra": bench_load_spectra}
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="SpectraPCA benchmarks.")
+    parser.add_argument("benchmark", type=str, choices=BENCHMARKS.keys(), help="Benchmark to run")
+    parser.add_argument("-c", "--channels", type=int, default=60000, help="Number of RMF channels")
+    parser.add_argument("-r", "--repeats", type=int, default=3, help="Number of timing repeats")
+    parser.add_argument("-n", "--nerrs", type=int, default=1000, help="Number of perturbed spectra")
+    parser.add_argument("-s", "--spectra", type=int, default=50, help="Number of spectra")
+    parser.add_argument("-w", "--workers", type=int, default=4, help="Number of processes for parallel stages")
+    parser.add_argument("-b", "--bins", type=int, default=4000, help="Number of energy bins for the SVD benchmark")
+    parser.add_argument("-k", "--components", type=int, default=6, help="Number of components for the SVD benchmark")
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        BENCHMARKS[args.benchmark](tmp, args)
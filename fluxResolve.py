@@ -18,127 +18,382 @@ BinSize - Light curve bin size in seconds
 
 Options
 ---------
--b --build - Automatically build GTI files, then remove .txt files (Requires SAS)
+-b --build - Write GTI FITS files instead of .txt files
+
+-m --minlength - Minimum length of a phase in seconds, shorter phases are merged into their neighbours, defaults to 3000
+
+-M --method - Phase detection method, defaults to threshold
+            threshold - Phases start where the rate crosses mean +/- significance
+            blocks - Segment the light curve into blocks of constant rate at its change points, blocks with mean
+                     rates within significance of the mean are written as intermediate (Mid) GTIs
+
+-p --penalty - Chi-squared improvement required to add a change point with the blocks method, defaults to 2 ln(N)
+
+--stream - Read the light curve in chunks at its native binning without rebinning or plotting (for long, finely binned light curves)
+
+--chunk - Number of bins per chunk when streaming, defaults to 1000000
+
+--nocache - Always read and rebin the light curve, rather than using the rebinned light curve cache
+
+---------
+
+A phase starts when the rate crosses mean + significance (High) or mean - significance (Low), and lasts until
+the rate crosses the opposite threshold. Functions can be imported, `find_flux_gtis()` works on whole arrays
+and `stream_flux_gtis()` on an iterable of (time, rate) chunks. `find_block_gtis()` classifies the blocks
+found by binary segmentation with `change_points()` instead.
 
 ---------
 
 Author - Thomas Hodd
 
-Date - 2nd May 2025
+Date - 17th October 2026
 
-Version - 1.0
+Version - 1.4
 """
 import argparse
 import os
-import subprocess
+from collections.abc import Iterable, Iterator
 import numpy as np
+from astropy.io import fits
 from matplotlib import pyplot as plt
 from matplotlib import patches, ticker
 from pylag import LightCurve
+from rebinCache import default_cache, load_rebinned
+from gtiFits import GTI_DTYPE, time_keywords, write_gtis
+
+HIGH, MID, LOW = 1, 0, -1
+PHASES = {HIGH: "High", MID: "Mid", LOW: "Low"}
+METHODS = ["threshold", "blocks"]
+
+
+def flux_transitions(rates: np.ndarray, upper: float, lower: float, state: int = HIGH) -> tuple[np.ndarray, np.ndarray]:
+    """
+    Hysteresis state of each bin, and the bins where it changes.
+    The state becomes High when the rate is above upper, Low when it is below lower, and is held in between.
+    :param rates: Rate
+    :param upper: High threshold
+    :param lower: Low threshold
+    :param state: State before the first bin
+    :return: Indices of the bins where the state changes, and the state from each of those bins
+    """
+    events = np.where(rates > upper, HIGH, np.where(rates < lower, LOW, 0))
+    events = np.concatenate([[state], events])
+
+    # Carry the last event through bins between the thresholds
+    held = np.where(events != 0, np.arange(len(events)), 0)
+    states = events[np.maximum.accumulate(held)]
+
+    changes = np.flatnonzero(states[1:] != states[:-1])
+    return changes, states[changes + 1]
+
+
+def merge_short_phases(starts: np.ndarray, states: np.ndarray, stop: float,
+                       min_length: float = 3000) -> tuple[np.ndarray, np.ndarray, np.ndarray]:
+    """
+    Remove interior phases shorter than min_length, merging their neighbours in a single pass.
+    The first and last phases are cut by the region of interest, so are always kept.
+    :param starts: Phase start times
+    :param states: Phase states
+    :param stop: End of the final phase
+    :param min_length: Minimum phase length in seconds
+    :return: Merged phase starts and states, and the starts of the removed phases
+    """
+    lengths = np.diff(np.append(starts, stop))
+    keep = lengths >= min_length
+    keep[[0, -1]] = True
+    kept_starts, kept_states = starts[keep], states[keep]
+
+    # Consecutive kept phases with the same state become one phase
+    new = np.concatenate([[True], kept_states[1:] != kept_states[:-1]])
+    return kept_starts[new], kept_states[new], starts[~keep]
+
+
+def _gti_array(starts: np.ndarray, states: np.ndarray, stop: float) -> np.ndarray:
+    gtis = np.empty(len(starts), dtype=GTI_DTYPE)
+    gtis["start"] = starts
+    gtis["stop"] = np.append(starts[1:], stop)
+    gtis["phase"] = np.array([PHASES[LOW], PHASES[MID], PHASES[HIGH]])[states - LOW]
+    return gtis
+
+
+def find_flux_gtis(times: np.ndarray, rates: np.ndarray, level: float, sig: float,
+                   min_length: float = 3000) -> tuple[np.ndarray, np.ndarray]:
+    """
+    Find High/Low GTIs from where the rate crosses level +/- sig.
+    The light curve starts in the High phase unless its first bin is below level - sig.
+    :param times: Time
+    :param rates: Rate
+    :param level: Level separating High and Low phases, usually the mean rate
+    :param sig: Distance from the level required for a phase change
+    :param min_length: Minimum phase length in seconds
+    :return: Structured array of GTIs with fields start, stop and phase, and the starts of the removed phases
+    """
+    state = LOW if rates[0] < level - sig else HIGH
+    changes, states = flux_transitions(rates, level + sig, level - sig, state)
+    starts = np.concatenate([[times[0]], times[changes]])
+    states = np.concatenate([[state], states])
+    starts, states, removed = merge_short_phases(starts, states, times[-1], min_length)
+    return _gti_array(starts, states, times[-1]), removed
+
+
+def _weights(errors: np.ndarray) -> np.ndarray:
+    """
+    Inverse variance weights, bins with no error (e.g. no counts) are given the median error.
+    """
+    good = errors > 0
+    return 1 / np.where(good, errors, np.median(errors[good]) if np.any(good) else 1.) ** 2
+
+
+def change_points(rates: np.ndarray, errors: np.ndarray, penalty: float = None) -> np.ndarray:
+    """
+    Split a light curve into blocks of constant rate by binary segmentation.
+    Each block is split at the bin that most reduces the chi-squared of a constant rate, if the reduction is more
+    than the penalty. Chi-squared of any block comes from cumulative sums, so every split is one vectorised pass.
+    :param rates: Rate
+    :param errors: Rate error, bins with no error are given the median error
+    :param penalty: Chi-squared reduction required for a change point, defaults to 2 ln(N)
+    :return: Indices of the first bin of each block after the first
+    """
+    n = len(rates)
+    if penalty is None:
+        penalty = 2 * np.log(n)
+    w = _weights(errors)
+    y = rates - np.average(rates, weights=w)
+
+    # Cumulative sums of the weights and weighted moments, from which chi2 = Swyy - Swy^2 / Sw for any block
+    sw = np.concatenate([[0.], np.cumsum(w)])
+    swy = np.concatenate([[0.], np.cumsum(w * y)])
+    swyy = np.concatenate([[0.], np.cumsum(w * y * y)])
+
+    def chi2(a, b):
+        return swyy[b] - swyy[a] - (swy[b] - swy[a]) ** 2 / (sw[b] - sw[a])
+
+    changes = []
+    blocks = [(0, n)]
+    while blocks:
+        a, b = blocks.pop()
+        if b - a < 2:
+            continue
+        splits = np.arange(a + 1, b)
+        gain = chi2(a, b) - chi2(a, splits) - chi2(splits, b)
+        best = np.argmax(gain)
+        if gain[best] > penalty:
+            changes.append(splits[best])
+            blocks += [(a, splits[best]), (splits[best], b)]
+    return np.sort(np.array(changes, dtype=int))
+
 
-cwd = os.getcwd()
-
-# Input args
-parser = argparse.ArgumentParser(description="Flux-resolved GTI finder.")
-parser.add_argument("filename", type=str, help="Light curve file")
-parser.add_argument("start", type=float, help="Region of interest start in mission time")
-parser.add_argument("end", type=float, help="Region of interest end in mission time")
-parser.add_argument("significance", type=float, nargs='?', default=0.5, help="Counts from mean required for phase detection (optional)")
-parser.add_argument("binsize", type=int,   nargs='?', default=200, help="Bin size in seconds (optional)")
-parser.add_argument("-b", "--build", action='store_true', help="Automatically build GTI files, then remove .txt files (Requires SAS)")
-
-# Parse args
-args = parser.parse_args()
-filename = args.filename
-start = args.start
-end = args.end
-sig = args.significance
-binsize = args.binsize
-build = args.build
-
-# Open the light curve file
-lc:  LightCurve = LightCurve(filename).rebin(binsize)
-
-# Create an LC for the ROI
-mask = (start < lc.time) & (lc.time <= end)
-roi = LightCurve(t=lc.time[mask], r=lc.rate[mask], e=lc.error[mask])
-
-# Get arrays of time and rate
-times = roi.time
-rates = roi.rate
-
-# Determine the mean count rate
-mean = np.mean(rates)
-min_length = 3000
-
-# Define initial values for GTI identification
-prior_rate = rates[0]
-gti_points = [[times[0], "High"]]
-
-# Find low and high phases
-print("Identifying phases...")
-for rate, time in zip(rates[1:], times[1:]):
-    if rate > mean + sig >= prior_rate and gti_points[-1][1] != "High":
-        gti_points.append([time, "High"])
-    if rate < mean - sig <= prior_rate and gti_points[-1][1] != "Low":
-        gti_points.append([time, "Low"])
-
-    prior_rate = rate
-
-# Remove short phases
-for i, point in enumerate(gti_points):
-    if i % 2 != 0 and i != len(gti_points) - 1:
-        length = gti_points[i+1][0] - point[0]
-        if length < min_length:
-            gti_points.pop(i)
-            gti_points.pop(i)
-            print(f"Removed misidentified phase ({int(length)}s) @ {str(round(point[0]))[3:]}s")
-print(f"Found {len(gti_points)-1} GTIs")
-
-# Write GTI text files
-print("Writing GTIs to files...")
-for phase in ["High", "Low"]:
-    with open(f"gti_{phase}.txt", "w") as f:
-        for i, point in enumerate(gti_points[:-1]):
-            if point[1] == phase:
-                print(f"{point[1]} GTI @ {str(round(point[0]))[3:]} - {str(round(gti_points[i+1][0]))[3:]}")
-                f.write(f"{round(point[0])} {round(gti_points[i+1][0])} +\n")
-print(f"GTIs Completed")
-
-# Plot results
-fig = plt.figure(figsize=(10, 6))
-plt.scatter(lc.time, lc.rate, marker="+", s=20, color="k")
-plt.axhline(y=mean, linestyle="--", color="k")
-
-# Phase GTIs
-for i, point in enumerate(gti_points[:-1]):
-    if point[1] == "Low":
-        colour="r"
+def find_block_gtis(times: np.ndarray, rates: np.ndarray, errors: np.ndarray, level: float, sig: float,
+                    min_length: float = 3000, penalty: float = None) -> tuple[np.ndarray, np.ndarray]:
+    """
+    Find High/Mid/Low GTIs from blocks of constant rate.
+    Blocks with a mean rate above level + sig are High, below level - sig are Low, and Mid otherwise.
+    :param times: Time
+    :param rates: Rate
+    :param errors: Rate error
+    :param level: Level separating High and Low phases, usually the mean rate
+    :param sig: Distance from the level required for a High or Low phase
+    :param min_length: Minimum phase length in seconds
+    :param penalty: Chi-squared reduction required for a change point, defaults to 2 ln(N)
+    :return: Structured array of GTIs with fields start, stop and phase, and the starts of the removed phases
+    """
+    edges = np.concatenate([[0], change_points(rates, errors, penalty)])
+    w = _weights(errors)
+    block_means = np.add.reduceat(w * rates, edges) / np.add.reduceat(w, edges)
+
+    states = np.where(block_means > level + sig, HIGH, np.where(block_means < level - sig, LOW, MID))
+    starts = times[edges]
+
+    # Neighbouring blocks in the same phase are one phase
+    new = np.concatenate([[True], states[1:] != states[:-1]])
+    starts, states, removed = merge_short_phases(starts[new], states[new], times[-1], min_length)
+    return _gti_array(starts, states, times[-1]), removed
+
+
+def stream_flux_gtis(chunks: Iterable[tuple[np.ndarray, np.ndarray]], level: float, sig: float,
+                     min_length: float = 3000) -> Iterator[tuple[float, float, str]]:
+    """
+    Find High/Low GTIs from a light curve read in chunks, yielding each GTI once it is complete.
+    Gives the same GTIs as `find_flux_gtis()` on the whole light curve.
+    :param chunks: Iterable of (time, rate) arrays, in time order
+    :param level: Level separating High and Low phases, usually the mean rate
+    :param sig: Distance from the level required for a phase change
+    :param min_length: Minimum phase length in seconds
+    :return: Generator of (start, stop, phase) tuples
+    """
+    state = None
+    phase_start = phase_state = None  # Phase currently being measured
+    merged_start = merged_state = None  # GTI currently being built
+    first = True
+    stop = None
+
+    for times, rates in chunks:
+        if len(times) == 0:
+            continue
+        if state is None:
+            state = LOW if rates[0] < level - sig else HIGH
+            phase_start, phase_state = times[0], state
+            merged_start, merged_state = times[0], state
+        stop = times[-1]
+
+        changes, states = flux_transitions(rates, level + sig, level - sig, state)
+        for time, new_state in zip(times[changes], states):
+            # The phase being measured is complete, keep it unless it is short
+            if first or time - phase_start >= min_length:
+                if phase_state != merged_state:
+                    yield merged_start, phase_start, PHASES[merged_state]
+                    merged_start, merged_state = phase_start, phase_state
+            first = False
+            phase_start, phase_state = time, new_state
+        if len(states):
+            state = states[-1]
+
+    if stop is None:
+        return
+    # The final phase is cut by the end of the light curve, so is always kept
+    if phase_state != merged_state:
+        yield merged_start, phase_start, PHASES[merged_state]
+        merged_start, merged_state = phase_start, phase_state
+    yield merged_start, stop, PHASES[merged_state]
+
+
+def read_chunks(filename: str, start: float, end: float, chunk: int = 1000000) -> Iterator[tuple[np.ndarray, np.ndarray]]:
+    """
+    Read the time and rate of a light curve in chunks, without loading the whole file.
+    Bins outside the region of interest and bins with no rate are skipped.
+    :param filename: Light curve file
+    :param start: Region of interest start in mission time
+    :param end: Region of interest end in mission time
+    :param chunk: Number of bins per chunk
+    :return: Generator of (time, rate) arrays
+    """
+    with fits.open(filename, memmap=True) as hdul:
+        data = hdul["RATE"].data
+        for i in range(0, len(data), chunk):
+            times = np.asarray(data["TIME"][i:i + chunk], dtype=float)
+            rates = np.asarray(data["RATE"][i:i + chunk], dtype=float)
+            mask = (start < times) & (times <= end) & np.isfinite(rates)
+            yield times[mask], rates[mask]
+
+
+def stream_mean(filename: str, start: float, end: float, chunk: int = 1000000) -> float:
+    """
+    Mean rate in the region of interest, reading the light curve in chunks.
+    :param filename: Light curve file
+    :param start: Region of interest start in mission time
+    :param end: Region of interest end in mission time
+    :param chunk: Number of bins per chunk
+    :return: Mean rate
+    """
+    total, n = 0., 0
+    for _, rates in read_chunks(filename, start, end, chunk):
+        total += rates.sum()
+        n += len(rates)
+    return total / n
+
+
+if __name__ == "__main__":
+    cwd = os.getcwd()
+
+    # Input args
+    parser = argparse.ArgumentParser(description="Flux-resolved GTI finder.")
+    parser.add_argument("filename", type=str, help="Light curve file")
+    parser.add_argument("start", type=float, help="Region of interest start in mission time")
+    parser.add_argument("end", type=float, help="Region of interest end in mission time")
+    parser.add_argument("significance", type=float, nargs='?', default=0.5, help="Counts from mean required for phase detection (optional)")
+    parser.add_argument("binsize", type=int,   nargs='?', default=200, help="Bin size in seconds (optional)")
+    parser.add_argument("-b", "--build", action='store_true', help="Write GTI FITS files instead of .txt files")
+    parser.add_argument("-m", "--minlength", type=float, default=3000, help="Minimum phase length in seconds")
+    parser.add_argument("-M", "--method", type=str, default="threshold", choices=METHODS, help="Phase detection method")
+    parser.add_argument("-p", "--penalty", type=float, default=None, help="Chi-squared improvement required for a change point (blocks)")
+    parser.add_argument("--stream", action='store_true', help="Read the light curve in chunks without rebinning or plotting")
+    parser.add_argument("--chunk", type=int, default=1000000, help="Number of bins per chunk when streaming")
+    parser.add_argument("--nocache", action='store_true', help="Do not use the rebinned light curve cache")
+
+    # Parse args
+    args = parser.parse_args()
+    filename = args.filename
+    start = args.start
+    end = args.end
+    sig = args.significance
+    binsize = args.binsize
+    build = args.build
+    min_length = args.minlength
+    method = args.method
+    phases = ["High", "Mid", "Low"] if method == "blocks" else ["High", "Low"]
+
+    if args.stream and method == "blocks":
+        print("The blocks method needs the whole light curve and cannot be streamed!")
+        exit()
+
+    if args.stream:
+        # Two passes over the file, one for the mean and one for the phases
+        print("Identifying phases...")
+        mean = stream_mean(filename, start, end, args.chunk)
+        gti_list = list(stream_flux_gtis(read_chunks(filename, start, end, args.chunk), mean, sig, min_length))
+        gtis = np.array(gti_list, dtype=GTI_DTYPE)
+        print(f"Found {len(gtis)} GTIs")
+
+        print("Writing GTIs to files...")
+        write_gtis(gtis, build=build, header=time_keywords(filename), verbose=True)
+        print(f"GTIs Completed")
+        exit()
+
+    # Open the light curve file
+    lc:  LightCurve = load_rebinned(filename, binsize, None if args.nocache else default_cache())
+
+    # Get arrays of time and rate for the ROI
+    mask = (start < lc.time) & (lc.time <= end)
+    times = lc.time[mask]
+    rates = lc.rate[mask]
+    errors = lc.error[mask]
+
+    # Determine the mean count rate
+    mean = np.mean(rates)
+
+    # Find low and high phases
+    print("Identifying phases...")
+    if method == "blocks":
+        gtis, removed = find_block_gtis(times, rates, errors, mean, sig, min_length, args.penalty)
     else:
-        colour="g"
-    plt.fill_betweenx(y=[lc.rate.min(), lc.rate.max()], x1=point[0], x2=gti_points[i+1][0], color=colour, alpha=0.4)
-
-# Legend
-high_patch = patches.Patch(color="g", alpha=0.4, label="High Phase")
-low_patch = patches.Patch(color="r", alpha=0.4, label="Low Phase")
-plt.legend(handles=[high_patch, low_patch])
-
-# Axes labels
-ax = plt.gca()
-ax.xaxis.set_major_formatter(ticker.FuncFormatter(lambda x, _: f"{int(x):d}"[3:]))
-plt.xlabel(f"Truncated Mission Time [{str(int(min(lc.time)))[:3]}] (s)")
-plt.ylabel("Rate (counts/s)")
-plt.title(f"Flux GTIs for {filename}", fontweight="bold")
-
-# Show and save plot
-plt.savefig(f"{cwd}/gti_fluxes.png", dpi=300, bbox_inches="tight")
-plt.show()
-
-if build:
-    # Run gtibuild on both High and Low phase GTIs
-    subprocess.run("gtibuild file=gti_High.txt table=gti_High.fits", shell=True)
-    subprocess.run("gtibuild file=gti_Low.txt table=gti_Low.fits", shell=True)
-
-    # Remove .txt files
-    os.remove("gti_High.txt")
-    os.remove("gti_Low.txt")
+        gtis, removed = find_flux_gtis(times, rates, mean, sig, min_length)
+    for t in removed:
+        print(f"Removed misidentified phase @ {str(round(t))[3:]}s")
+    print(f"Found {len(gtis)} GTIs")
+
+    # Write GTI files
+    print("Writing GTIs to files...")
+    write_gtis(gtis, build=build, phases=phases, header=time_keywords(filename), verbose=True)
+    print(f"GTIs Completed")
+
+    # Plot results
+    fig = plt.figure(figsize=(10, 6))
+    plt.scatter(lc.time, lc.rate, marker="+", s=20, color="k")
+    plt.axhline(y=mean, linestyle="--", color="k")
+
+    # Phase GTIs
+    for gti in gtis:
+        if gti["phase"] == "Low":
+            colour="r"
+        elif gti["phase"] == "Mid":
+            colour="y"
+        else:
+            colour="g"
+        plt.fill_betweenx(y=[lc.rate.min(), lc.rate.max()], x1=gti["start"], x2=gti["stop"], color=colour, alpha=0.4)
+
+    # Legend
+    high_patch = patches.Patch(color="g", alpha=0.4, label="High Phase")
+    low_patch = patches.Patch(color="r", alpha=0.4, label="Low Phase")
+    mid_patch = patches.Patch(color="y", alpha=0.4, label="Mid Phase")
+    plt.legend(handles=[high_patch, mid_patch, low_patch] if method == "blocks" else [high_patch, low_patch])
+
+    # Axes labels
+    ax = plt.gca()
+    ax.xaxis.set_major_formatter(ticker.FuncFormatter(lambda x, _: f"{int(x):d}"[3:]))
+    plt.xlabel(f"Truncated Mission Time [{str(int(min(lc.time)))[:3]}] (s)")
+    plt.ylabel("Rate (counts/s)")
+    plt.title(f"Flux GTIs for {filename}", fontweight="bold")
+
+    # Show and save plot
+    plt.savefig(f"{cwd}/gti_fluxes.png", dpi=300, bbox_inches="tight")
+    plt.show()
@@ -0,0 +1,144 @@
+"""
+Writes OGIP GTI FITS files directly from arrays of intervals, in place of SAS gtibuild, or the text GTI files
+used by fluxResolve.py and phaseResolve.py.
+
+Intervals are sorted and overlapping or touching intervals merged before writing. Time keywords
+(TIMESYS, MJDREF, TIMEZERO, ...) can be copied from the light curve the GTIs were made from.
+
+Author - Thomas Hodd
+
+Date - 17th October 2026
+
+Version - 1.1
+"""
+import numpy as np
+from astropy.io import fits
+
+GTI_DTYPE = [("start", float), ("stop", float), ("phase", "U4")]
+TIME_KEYWORDS = ["TELESCOP", "INSTRUME", "OBS_ID", "TIMESYS", "TIMEREF", "TIMEUNIT", "MJDREF", "MJDREFI", "MJDREFF",
+                 "TIMEZERO", "CLOCKAPP", "TASSIGN"]
+
+
+def merge_intervals(starts: np.ndarray, stops: np.ndarray) -> tuple[np.ndarray, np.ndarray]:
+    """
+    Sort intervals and merge any that overlap or touch.
+    :param starts: Interval start times
+    :param stops: Interval stop times
+    :return: Merged start and stop times
+    """
+    starts = np.asarray(starts, dtype=float)
+    stops = np.asarray(stops, dtype=float)
+    if len(starts) == 0:
+        return starts, stops
+    order = np.argsort(starts, kind="stable")
+    starts, stops = starts[order], stops[order]
+
+    # An interval starts a new group if it begins after every earlier interval has ended
+    ends = np.maximum.accumulate(stops)
+    new = np.concatenate([[True], starts[1:] > ends[:-1]])
+    groups = np.flatnonzero(new)
+    return starts[groups], np.maximum.reduceat(stops, groups)
+
+
+def time_keywords(filename: str, hdu: str | int = 1) -> dict:
+    """
+    Time keywords of a light curve or event file, for copying to GTI files made from it.
+    :param filename: FITS file
+    :param hdu: Extension to read the keywords from
+    :return: Dictionary of keywords present in the extension
+    """
+    header = fits.getheader(filename, hdu)
+    return {key: header[key] for key in TIME_KEYWORDS if key in header}
+
+
+def gti_hdu(starts: np.ndarray, stops: np.ndarray, extname: str = "STDGTI", header: dict = None,
+            merge: bool = True) -> fits.BinTableHDU:
+    """
+    OGIP GTI table extension.
+    :param starts: Interval start times
+    :param stops: Interval stop times
+    :param extname: Extension name, SAS uses STDGTI and HEASoft GTI
+    :param header: Extra header keywords, e.g. from `time_keywords()`
+    :param merge: If True sort and merge overlapping intervals
+    :return: GTI table HDU
+    """
+    if merge:
+        starts, stops = merge_intervals(starts, stops)
+    table = fits.BinTableHDU.from_columns([fits.Column(name="START", format="D", unit="s", array=starts),
+                                           fits.Column(name="STOP", format="D", unit="s", array=stops)],
+                                          name=extname)
+    table.header["HDUCLASS"] = ("OGIP", "Format conforms to OGIP standard")
+    table.header["HDUCLAS1"] = ("GTI", "Table contains Good Time Intervals")
+    table.header["HDUCLAS2"] = ("STANDARD", "Good Time Interval table")
+    for key, value in (header or {}).items():
+        table.header[key] = value
+    table.header.setdefault("TIMEUNIT", "s")
+    if len(starts):
+        table.header["TSTART"] = (starts[0], "Start of first interval")
+        table.header["TSTOP"] = (stops[-1], "End of last interval")
+        table.header["ONTIME"] = (float(np.sum(stops - starts)), "Sum of interval lengths")
+    return table
+
+
+def write_gti(filename: str, starts: np.ndarray, stops: np.ndarray, extname: str = "STDGTI", header: dict = None,
+              merge: bool = True) -> None:
+    """
+    Write a GTI FITS file.
+    :param filename: Output file
+    :param starts: Interval start times
+    :param stops: Interval stop times
+    :param extname: Extension name
+    :param header: Extra header keywords, e.g. from `time_keywords()`
+    :param merge: If True sort and merge overlapping intervals
+    :return: None
+    """
+    fits.HDUList([fits.PrimaryHDU(), gti_hdu(starts, stops, extname, header, merge)]).writeto(filename, overwrite=True)
+
+
+def write_phase_gtis(gtis: np.ndarray, prefix: str = "gti", phases: list[str] = None, header: dict = None,
+                     extname: str = "STDGTI") -> list[str]:
+    """
+    Write a GTI FITS file for each phase of a structured array of GTIs.
+    :param gtis: Structured array with fields start, stop and phase
+    :param prefix: Output file prefix, files are <prefix>_<phase>.fits
+    :param phases: Phases to write, defaults to every phase in gtis
+    :param header: Extra header keywords, e.g. from `time_keywords()`
+    :param extname: Extension name
+    :return: List of written files
+    """
+    if phases is None:
+        phases = list(dict.fromkeys(gtis["phase"]))
+    files = []
+    for phase in phases:
+        phase_gtis = gtis[gtis["phase"] == phase]
+        write_gti(f"{prefix}_{phase}.fits", phase_gtis["start"], phase_gtis["stop"], extname, header)
+        files.append(f"{prefix}_{phase}.fits")
+    return files
+
+
+def write_gtis(gtis: np.ndarray, prefix: str = "gti", build: bool = False, phases: list[str] = ("High", "Low"),
+               header: dict = None, verbose: bool = False) -> list[str]:
+    """
+    Write the GTIs of each phase to a text file of "start stop +" lines, or to a GTI FITS file.
+    :param gtis: Structured array with fields start, stop and phase
+    :param prefix: Output file prefix, files are <prefix>_<phase>.txt
+    :param build: If True write <prefix>_<phase>.fits instead
+    :param phases: Phases to write
+    :param header: Extra FITS header keywords, e.g. from `time_keywords()`
+    :param verbose: If True print each GTI
+    :return: List of written files
+    """
+    files = []
+    for phase in phases:
+        phase_gtis = gtis[gtis["phase"] == phase]
+        if verbose:
+            for gti in phase_gtis:
+                print(f"{phase} GTI @ {str(round(gti['start']))[3:]} - {str(round(gti['stop']))[3:]}")
+        if not build:
+            np.savetxt(f"{prefix}_{phase}.txt", np.round(np.column_stack([phase_gtis["start"], phase_gtis["stop"]])),
+                       fmt="%d %d +")
+            files.append(f"{prefix}_{phase}.txt")
+
+    if build:
+        files = write_phase_gtis(gtis, prefix, list(phases), header)
+    return files
@@ -0,0 +1,123 @@
+"""
+Generalised Lomb-Scargle periodogram for seeding sinusoid fits to light curves.
+
+The periodogram is the fractional reduction in chi-squared of a floating-mean sinusoid at each frequency
+(Zechmeister & Kurster 2009), evaluated for blocks of frequencies at once and optionally across a process pool.
+Frequencies are in uHz, matching phaseResolve.py.
+
+Author - Thomas Hodd
+
+Date - 17th October 2026
+
+Version - 1.0
+"""
+from concurrent.futures import ProcessPoolExecutor
+import numpy as np
+
+BLOCK = 2 ** 22  # Maximum number of frequencies x time bins evaluated at once
+
+
+def frequency_grid(t: np.ndarray, fmin: float = None, fmax: float = None, oversample: float = 5) -> np.ndarray:
+    """
+    Frequency grid spanning one cycle per baseline to the Nyquist frequency by default.
+
+    :param t: Time
+    :param fmin: Minimum frequency (uHz)
+    :param fmax: Maximum frequency (uHz)
+    :param oversample: Number of grid points per independent frequency
+    :return: Array of frequencies (uHz)
+    """
+    baseline = t[-1] - t[0]
+    if fmin is None:
+        fmin = 1E6 / baseline
+    if fmax is None:
+        fmax = 1E6 / (2 * np.median(np.diff(t)))
+    n_freqs = max(2, int(np.ceil(oversample * baseline * (fmax - fmin) * 1E-6)))
+    return np.linspace(fmin, fmax, n_freqs)
+
+
+def _power_block(t: np.ndarray, y: np.ndarray, w: np.ndarray, freqs: np.ndarray) -> np.ndarray:
+    """
+    Periodogram power for a block of frequencies.
+
+    :param t: Time, relative to the first bin
+    :param y: Rate
+    :param w: Normalised weights, 1 / dy^2 summing to 1
+    :param freqs: Frequencies (uHz)
+    :return: Power at each frequency
+    """
+    arg = np.outer(2 * np.pi * 1E-6 * freqs, t)
+    cos = np.cos(arg)
+    sin = np.sin(arg, out=arg)
+    wy = w * y
+
+    mean = wy.sum()
+    yy = wy @ y - mean ** 2
+    c = cos @ w
+    s = sin @ w
+    yc = cos @ wy - mean * c
+    ys = sin @ wy - mean * s
+    cc = (cos * cos) @ w - c ** 2
+    cs = (cos * sin) @ w - c * s
+    ss = 1 - cc - c ** 2 - s ** 2
+    d = cc * ss - cs ** 2
+
+    return (ss * yc ** 2 + cc * ys ** 2 - 2 * cs * yc * ys) / (yy * d)
+
+
+def periodogram(t: np.ndarray, y: np.ndarray, dy: np.ndarray, freqs: np.ndarray, workers: int = 1) -> np.ndarray:
+    """
+    Generalised Lomb-Scargle periodogram.
+    A power of 1 means a sinusoid at that frequency removes all of the variance.
+
+    :param t: Time
+    :param y: Rate
+    :param dy: Rate error
+    :param freqs: Frequencies (uHz)
+    :param workers: Number of processes to spread the frequency blocks across
+    :return: Power at each frequency
+    """
+    t = np.asarray(t, dtype=float) - t[0]
+    w = 1 / np.asarray(dy, dtype=float) ** 2
+    w /= w.sum()
+
+    block = max(1, BLOCK // len(t))
+    blocks = [freqs[i:i + block] for i in range(0, len(freqs), block)]
+    if workers > 1 and len(blocks) > 1:
+        with ProcessPoolExecutor(max_workers=workers) as pool:
+            powers = list(pool.map(_power_block, [t] * len(blocks), [y] * len(blocks), [w] * len(blocks), blocks))
+    else:
+        powers = [_power_block(t, y, w, b) for b in blocks]
+    return np.concatenate(powers)
+
+
+def find_peaks(freqs: np.ndarray, power: np.ndarray, n_peaks: int = 3) -> np.ndarray:
+    """
+    Frequencies of the highest local maxima of a periodogram.
+
+    :param freqs: Frequencies (uHz)
+    :param power: Power at each frequency
+    :param n_peaks: Number of peaks to return
+    :return: Peak frequencies, highest first
+    """
+    peaks = np.flatnonzero((power[1:-1] > power[:-2]) & (power[1:-1] >= power[2:])) + 1
+    if len(peaks) == 0:
+        peaks = np.array([np.argmax(power)])
+    return freqs[peaks[np.argsort(power[peaks])[::-1][:n_peaks]]]
+
+
+def sinusoid_guess(t: np.ndarray, y: np.ndarray, dy: np.ndarray, freq: float) -> np.ndarray:
+    """
+    Weighted least-squares sinusoid at a fixed frequency, as a starting point for a full fit.
+    Parameters follow phaseResolve.py: lvl + a * sin(2 pi f 1E-6 t + 2 pi p).
+
+    :param t: Time
+    :param y: Rate
+    :param dy: Rate error
+    :param freq: Frequency (uHz)
+    :return: Zero level, amplitude, frequency and phase
+    """
+    arg = 2 * np.pi * freq * 1E-6 * np.asarray(t, dtype=float)
+    design = np.column_stack([np.ones_like(arg), np.cos(arg), np.sin(arg)]) / dy[:, np.newaxis]
+    (lvl, a_cos, a_sin), *_ = np.linalg.lstsq(design, y / dy, rcond=None)
+    return np.array([lvl, np.hypot(a_cos, a_sin), freq, (np.arctan2(a_cos, a_sin) / (2 * np.pi)) % 1])
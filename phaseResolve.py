@@ -6,13 +6,13 @@ Usage
 ---------
 python phaseResolve.py <FileName> <Start> <End> <frequency> <phase> <BinSize>
 
-FileName: - Light curve file
+FileName: - Light curve file (or a glob pattern of light curves with --batch)
 
 Start - Region of interest start in mission time
 
 End - Region of interest end in mission time
 
-Frequency - Frequency of interest
+Frequency - Frequency of interest in uHz (optional, searched for with a periodogram if not given)
 
 Phase - Light curve phase
 
@@ -22,50 +22,53 @@ BinSize - Light curve bin size in seconds (optional)
 
 Options
 ---------
--b --build - Automatically build GTI files, then remove .txt files (Requires SAS)
+-b --build - Write GTI FITS files instead of .txt files
+
+-r --refine - Refine GTI boundaries by interpolating the model crossings between bins
+
+-s --search - Search for the frequency with a Lomb-Scargle periodogram, even if one is given
+
+-c --candidates - Number of periodogram peaks to start fits from, defaults to 3
+
+--fmin --fmax - Periodogram frequency range in uHz, defaults to one cycle per ROI up to Nyquist
+
+-w --workers - Number of processes, defaults to 1
+
+--nphase - Number of phase starting points spread over one cycle, defaults to 1 (the given phase)
+
+--nfreq --dfreq - Number of frequency starting points spread over frequency +/- dfreq uHz, defaults to 1
+
+-B --batch - Fit every light curve matching FileName without plotting, writing <name>_gti_*.txt and a summary
+
+-o --outdir - Output directory for batch mode, defaults to the current directory
+
+--nocache - Always read and rebin the light curve, rather than using the rebinned light curve cache
+
+---------
+
+Functions can be imported, `phase_resolve()` runs the fit and writes the GTIs for one light curve.
 
 ---------
 
 Author - Thomas Hodd
 
-Date - 13th May 2025
+Date - 17th October 2026
 
-Version - 1.0
+Version - 1.6
 """
 import argparse
+import glob
 import os
-import subprocess
+from concurrent.futures import ProcessPoolExecutor
 import numpy as np
-from scipy.optimize import minimize
+from scipy.optimize import minimize, OptimizeResult
 from matplotlib import pyplot as plt
 from matplotlib import patches, ticker
 from pylag import LightCurve
-
-cwd = os.getcwd()
-
-# Input args
-parser = argparse.ArgumentParser(description="Phase-resolved GTI finder.")
-parser.add_argument("filename", type=str, help="Light curve file")
-parser.add_argument("start", type=float, help="Region of interest start in mission time")
-parser.add_argument("end", type=float, help="Region of interest end in mission time")
-parser.add_argument("frequency", type=float, help="Frequency of interest")
-parser.add_argument("phase", type=float, nargs='?', default=0.5, help="Phase")
-parser.add_argument("amplitude", type=float, nargs='?', default=1.0, help="Sinusoid amplitude (optional)")
-parser.add_argument("binsize", type=int, nargs='?', default=200, help="Bin size in seconds (optional)")
-parser.add_argument("-b", "--build", action='store_true', help="Automatically build GTI files, then remove .txt files (Requires SAS)")
-
-# Parse args
-args = parser.parse_args()
-filename = args.filename
-start = args.start
-end = args.end
-freq = args.frequency
-phase = args.phase
-amp = args.amplitude
-binsize = args.binsize
-build = args.build
-
-chis = []
+from resultCache import ResultCache
+from rebinCache import default_cache, load_rebinned
+from periodogram import frequency_grid, periodogram, find_peaks, sinusoid_guess
+from gtiFits import GTI_DTYPE, time_keywords, write_gtis
 
 
 def sin_model(lvl, a, f, p, t):
@@ -74,149 +77,403 @@ def sin_model(lvl, a, f, p, t):
     return a * np.sin(2 * np.pi * f * 1E-6 * t + p * 2 * np.pi) + lvl
 
 
-def chi_squared(lvl: float, a: float, f: float, p: float, t: np.ndarray, y: np.ndarray, dy: np.ndarray) -> float:
+class SinusoidFitter:
     """
-    Calculate chi-squared for our model of y position as a function of time.
-    :param lvl: zero level of sinusoid
-    :param a: amplitude
-    :param f: frequency
-    :param p: phase
+    Chi-squared of the sinusoid model and its analytic gradient, for use with `minimize(..., jac=True)`.
+    Work arrays are allocated once, and the chi-squared of each evaluation is kept in a ring buffer.
+
+    Parameters
+    ==========
+    t: np.ndarray
+        Time
+    y: np.ndarray
+        Rate
+    dy: np.ndarray
+        Rate error
+    history: int
+        Number of chi-squared evaluations to keep
+    """
+
+    def __init__(self, t: np.ndarray, y: np.ndarray, dy: np.ndarray, history: int = 10000) -> None:
+        self.t = np.asarray(t, dtype=float)
+        self.y = np.asarray(y, dtype=float)
+        self.w = 1 / np.asarray(dy, dtype=float)
+        self.__arg = np.empty_like(self.t)
+        self.__sin = np.empty_like(self.t)
+        self.__cos = np.empty_like(self.t)
+        self.__resid = np.empty_like(self.t)
+        self.__grad = np.empty(4)
+        self.__history = np.empty(history)
+        self.__n_evals = 0
+
+    def __call__(self, theta: np.ndarray) -> tuple[float, np.ndarray]:
+        """
+        Calculate chi-squared and its gradient, recording chi-squared in the history.
+        :param theta: Zero level, amplitude, frequency (uHz) and phase
+        :return: Chi-squared and its gradient with respect to theta
+        """
+        lvl, a, f, p = theta
+        chi2 = self.__residuals(lvl, a, f, p)
+
+        # d(chi2)/d(theta) = -2 sum(w * r * d(model)/d(theta)), r are the weighted residuals
+        wr = self.__resid
+        wr *= self.w
+        wr_cos = self.__arg
+        np.multiply(wr, self.__cos, out=wr_cos)
+        self.__grad[0] = -2 * wr.sum()
+        self.__grad[1] = -2 * (wr @ self.__sin)
+        self.__grad[2] = -2 * a * 2 * np.pi * 1E-6 * (wr_cos @ self.t)
+        self.__grad[3] = -2 * a * 2 * np.pi * wr_cos.sum()
+
+        self.__history[self.__n_evals % len(self.__history)] = chi2
+        self.__n_evals += 1
+        return chi2, self.__grad.copy()
+
+    def __residuals(self, lvl: float, a: float, f: float, p: float) -> float:
+        """
+        Fill the work arrays with the model phase, sin, cos and weighted residuals.
+        :return: Chi-squared
+        """
+        np.multiply(self.t, 2 * np.pi * f * 1E-6, out=self.__arg)
+        self.__arg += p * 2 * np.pi
+        np.sin(self.__arg, out=self.__sin)
+        np.cos(self.__arg, out=self.__cos)
+        np.multiply(self.__sin, a, out=self.__resid)
+        self.__resid += lvl
+        np.subtract(self.y, self.__resid, out=self.__resid)
+        self.__resid *= self.w
+        return float(self.__resid @ self.__resid)
+
+    def chi_squared(self, theta: np.ndarray) -> float:
+        """
+        Calculate chi-squared without recording it in the history.
+        :param theta: Zero level, amplitude, frequency (uHz) and phase
+        :return: Chi-squared
+        """
+        return self.__residuals(*theta)
+
+    @property
+    def history(self) -> np.ndarray:
+        """
+        Recorded chi-squared values, oldest first.
+        """
+        n = len(self.__history)
+        if self.__n_evals <= n:
+            return self.__history[:self.__n_evals].copy()
+        return np.roll(self.__history, -(self.__n_evals % n))
+
+
+def find_gtis(t: np.ndarray, model: np.ndarray, level: float, refine: bool = False) -> np.ndarray:
+    """
+    Find High/Low GTIs from where the model crosses a level.
+    Bins exactly on the level keep the previous phase.
     :param t: Time
-    :param y: y position
-    :param dy: y error
-    :return: Chi-squared
-    """
-    y_fit = sin_model(lvl, a, f, p, t)
-    chis.append(np.sum(((y - y_fit) / dy) ** 2, -1))
-    return np.sum(((y - y_fit) / dy) ** 2, -1)
-
-
-# Open the light curve file
-lc:  LightCurve = LightCurve(filename).rebin(binsize)
-
-# Create an LC for the ROI
-mask = (start < lc.time) & (lc.time <= end)
-roi = LightCurve(t=lc.time[mask], r=lc.rate[mask], e=lc.error[mask])
-
-# Get arrays of time and rate
-times = roi.time
-rates = roi.rate
-errors = roi.error
-
-# Determine the mean count rate
-mean = np.mean(rates)
-level = mean
-min_length = 3000
-
-# Lambda function that calculates the sum of squares error
-chi = lambda theta: chi_squared(theta[0], theta[1], theta[2], theta[3], t=times, y=rates, dy=errors)
-
-# Initial guesses for params
-theta_guess = np.array([level, amp, freq, phase])
-bounds = [(level, level), (1., 3.), (10, 100), (0., 1.)]
-
-# Do MLE
-options = {'xtol': 1e-4, 'ftol': 1e-4, 'maxiter': 1E+6}
-mle_estimate = minimize(chi, theta_guess, tol=1e-12, method="BFGS")
-print(mle_estimate.values())
-print(f"\nMLE Estimates:\nlevel = {round(mle_estimate.x[0], 3)}\namplitude = {round(mle_estimate.x[1], 4)}"
-      f"\nfrequency = {round(mle_estimate.x[2], 3)}\nphase = {round(mle_estimate.x[3], 4)}")
-
-# The inverse of the Hessian matrix is an estimate of the covariance matrix
-cov_matrix = mle_estimate.hess_inv
-
-# The standard errors are found from the sqrt of the diagonal elements of the covariance matrix
-standard_errors = np.sqrt(np.diag(cov_matrix))
-
-print(standard_errors)
-
-plt.plot(chis)
-plt.ylabel(r"$\chi^2$")
-plt.xlabel(r"Iteration")
-plt.yscale("log")
-
-params = mle_estimate.x
-
-# Define initial values for GTI identification
-if sin_model(*params, times[0]) > mean:
-    gti_points = [[times[0], "High"]]
-elif sin_model(*params, times[0]) < mean:
-    gti_points = [[times[0], "Low"]]
-else:
-    print("Initial point is neither high nor low!")
-    exit()
-
-# Find low and high phases
-print("Identifying phases...")
-for time in times[1:-1]:
-    if sin_model(*params, time) > mean and gti_points[-1][1] != "High":
-        gti_points.append([time, "High"])
-    if  sin_model(*params, time) < mean and gti_points[-1][1] != "Low":
-        gti_points.append([time, "Low"])
-
-if sin_model(*params, times[-1]) > mean:
-    gti_points.append([times[-1], "High"])
-if  sin_model(*params, times[-1]) < mean:
-    gti_points.append([times[-1], "Low"])
-
-# Write GTI text files
-print("Writing GTIs to files...")
-for p in ["High", "Low"]:
-    with open(f"gti_{p}.txt", "w") as f:
-        for i, point in enumerate(gti_points[:-1]):
-            if point[1] == p:
-                print(f"{point[1]} GTI @ {str(round(point[0]))[3:]} - {str(round(gti_points[i+1][0]))[3:]}")
-                f.write(f"{round(point[0])} {round(gti_points[i+1][0])} +\n")
-print(f"GTIs Completed")
-
-# Plot results
-fig = plt.figure(figsize=(10, 6))
-plt.scatter(lc.time, lc.rate, marker="+", s=20, color="k")
-plt.plot(lc.time, sin_model(*params, lc.time), color="b")
-plt.axhline(y=mean, linestyle="--", color="k")
-
-# Phase GTIs
-for i, point in enumerate(gti_points[:-1]):
-    if point[1] == "Low":
-        colour="r"
+    :param model: Model evaluated at each time
+    :param level: Level separating High and Low phases
+    :param refine: If True, interpolate crossing times between bins rather than using the first bin of each phase
+    :return: Structured array of GTIs with fields start, stop and phase
+    """
+    diff = np.broadcast_to(model, t.shape) - level
+    state = np.sign(diff)
+
+    # Carry the last High/Low state through bins on the level
+    held = np.where(state != 0, np.arange(len(state)), 0)
+    state = state[np.maximum.accumulate(held)]
+
+    # Phase changes, the final bin only closes the last GTI
+    changes = np.flatnonzero(state[1:-1] != state[:-2]) + 1
+    bounds = t[changes]
+    if refine:
+        d0, d1 = diff[changes - 1], diff[changes]
+        bounds = t[changes - 1] + (t[changes] - t[changes - 1]) * d0 / (d0 - d1)
+
+    gtis = np.empty(len(changes) + 1, dtype=GTI_DTYPE)
+    gtis["start"] = np.concatenate([[t[0]], bounds])
+    gtis["stop"] = np.concatenate([bounds, [t[-1]]])
+    gtis["phase"] = np.where(state[np.concatenate([[0], changes])] > 0, "High", "Low")
+    return gtis
+
+
+def load_roi(filename: str, start: float, end: float, binsize: int,
+             cache: ResultCache = None) -> tuple[LightCurve, np.ndarray, np.ndarray, np.ndarray]:
+    """
+    Load and rebin a light curve, and cut out the region of interest.
+    :param filename: Light curve file
+    :param start: Region of interest start in mission time
+    :param end: Region of interest end in mission time
+    :param binsize: Bin size in seconds
+    :param cache: Cache of rebinned light curves
+    :return: Full light curve, and the ROI times, rates and errors
+    """
+    lc: LightCurve = load_rebinned(filename, binsize, cache)
+    mask = (start < lc.time) & (lc.time <= end)
+    return lc, lc.time[mask], lc.rate[mask], lc.error[mask]
+
+
+def start_grid(theta: np.ndarray, n_phase: int = 1, n_freq: int = 1, dfreq: float = 0.) -> list[np.ndarray]:
+    """
+    Grid of starting points around an initial guess.
+    :param theta: Zero level, amplitude, frequency (uHz) and phase
+    :param n_phase: Number of phases spread over one cycle, 1 keeps the given phase
+    :param n_freq: Number of frequencies spread over frequency +/- dfreq
+    :param dfreq: Half-width of the frequency grid (uHz)
+    :return: List of starting points
+    """
+    phases = [theta[3]] if n_phase <= 1 else (theta[3] + np.arange(n_phase) / n_phase) % 1
+    freqs = [theta[2]] if n_freq <= 1 else np.linspace(theta[2] - dfreq, theta[2] + dfreq, n_freq)
+    return [np.array([theta[0], theta[1], f, p]) for f in freqs for p in phases]
+
+
+def _fit_start(times: np.ndarray, rates: np.ndarray, errors: np.ndarray, theta: np.ndarray) -> OptimizeResult:
+    fitter = SinusoidFitter(times, rates, errors)
+    result = minimize(fitter, theta, jac=True, tol=1e-12, method="BFGS")
+    result.history = fitter.history
+    return result
+
+
+def fit_sinusoid(times: np.ndarray, rates: np.ndarray, errors: np.ndarray, theta_guesses: list[np.ndarray],
+                 workers: int = 1) -> OptimizeResult:
+    """
+    Fit the sinusoid model from several starting points, keeping the lowest chi-squared.
+    :param times: Time
+    :param rates: Rate
+    :param errors: Rate error
+    :param theta_guesses: Starting points of zero level, amplitude, frequency (uHz) and phase
+    :param workers: Number of processes to spread the starting points across
+    :return: Best fit, with the chi-squared history of its fit in `history`
+    """
+    n = len(theta_guesses)
+    if workers > 1 and n > 1:
+        with ProcessPoolExecutor(max_workers=workers) as pool:
+            results = list(pool.map(_fit_start, [times] * n, [rates] * n, [errors] * n, theta_guesses))
+    else:
+        results = [_fit_start(times, rates, errors, theta) for theta in theta_guesses]
+    best = min(results, key=lambda r: r.fun)
+    best.x[3] %= 1
+    return best
+
+
+def phase_resolve(filename: str, start: float, end: float, freq: float = None, phase: float = 0.5, amp: float = 1.0,
+                  binsize: int = 200, refine: bool = False, search: bool = False, n_candidates: int = 3,
+                  fmin: float = None, fmax: float = None, n_phase: int = 1, n_freq: int = 1, dfreq: float = 0.,
+                  workers: int = 1, prefix: str = "gti", build: bool = False, cache: ResultCache = None) -> dict:
+    """
+    Fit a sinusoid to the ROI of a light curve and write its High/Low phase GTIs.
+    :param filename: Light curve file
+    :param start: Region of interest start in mission time
+    :param end: Region of interest end in mission time
+    :param freq: Frequency guess (uHz), searched for with a periodogram if None
+    :param phase: Phase guess
+    :param amp: Amplitude guess
+    :param binsize: Bin size in seconds
+    :param refine: If True interpolate GTI boundaries between bins
+    :param search: If True search for the frequency even if one is given
+    :param n_candidates: Number of periodogram peaks to start fits from
+    :param fmin: Minimum periodogram frequency (uHz)
+    :param fmax: Maximum periodogram frequency (uHz)
+    :param n_phase: Number of phase starting points per frequency guess
+    :param n_freq: Number of frequency starting points per frequency guess
+    :param dfreq: Half-width of the frequency starting points (uHz)
+    :param workers: Number of processes for the periodogram and starting points
+    :param prefix: GTI output file prefix
+    :param build: If True write the GTIs to FITS files rather than text files
+    :param cache: Cache of rebinned light curves
+    :return: Dictionary of the light curve, ROI, fit, GTIs and (if searched) periodogram
+    """
+    lc, times, rates, errors = load_roi(filename, start, end, binsize, cache)
+    mean = np.mean(rates)
+    result = {"filename": filename, "lc": lc, "times": times, "rates": rates, "errors": errors, "mean": mean}
+
+    # Initial guesses for params
+    if search or freq is None:
+        # Seed fits from the highest periodogram peaks
+        freqs = frequency_grid(times, fmin, fmax)
+        power = periodogram(times, rates, errors, freqs, workers)
+        candidates = find_peaks(freqs, power, n_candidates)
+        seeds = [sinusoid_guess(times, rates, errors, f) for f in candidates]
+        result.update({"freqs": freqs, "power": power, "candidates": candidates})
+    else:
+        seeds = [np.array([mean, amp, freq, phase])]
+    theta_guesses = [theta for seed in seeds for theta in start_grid(seed, n_phase, n_freq, dfreq)]
+
+    # Do MLE, keeping the best fit
+    fit = fit_sinusoid(times, rates, errors, theta_guesses, workers)
+    params = fit.x
+
+    # The inverse of the Hessian matrix is an estimate of the covariance matrix
+    standard_errors = np.sqrt(np.diag(fit.hess_inv))
+
+    # Find low and high phases
+    if sin_model(*params, times[0]) == mean:
+        raise ValueError("Initial point is neither high nor low!")
+    gtis = find_gtis(times, sin_model(*params, times), mean, refine)
+    files = write_gtis(gtis, prefix, build, header=time_keywords(filename) if build else None)
+
+    # Calculate chi-squared and chi-squared per degree of freedom
+    chi2 = SinusoidFitter(times, rates, errors).chi_squared(params)
+    result.update({"fit": fit, "params": params, "standard_errors": standard_errors, "n_starts": len(theta_guesses),
+                   "chi2": chi2, "chi2dof": chi2 / (times.size - len(params)), "gtis": gtis, "files": files})
+    return result
+
+
+SUMMARY_COLUMNS = ["file", "level", "amplitude", "frequency", "phase", "level_err", "amplitude_err", "frequency_err",
+                   "phase_err", "chi2", "chi2dof", "n_high", "n_low"]
+
+
+def _batch_row(kwargs: dict) -> list:
+    """
+    Phase resolve one light curve in batch mode and return its summary row.
+    """
+    try:
+        r = phase_resolve(**kwargs)
+    except Exception as e:
+        print(f"Failed {kwargs['filename']}: {e}")
+        return [kwargs["filename"]] + [np.nan] * (len(SUMMARY_COLUMNS) - 1)
+    n_high = np.count_nonzero(r["gtis"]["phase"] == "High")
+    return [r["filename"], *r["params"], *r["standard_errors"], r["chi2"], r["chi2dof"], n_high, len(r["gtis"]) - n_high]
+
+
+def phase_resolve_batch(filenames: list[str], outdir: str = ".", workers: int = 1, **kwargs) -> list[list]:
+    """
+    Phase resolve many light curves across a process pool, without plotting.
+    GTIs are written to <outdir>/<name>_gti_*.txt and a summary table to <outdir>/phase_resolve_summary.txt.
+    :param filenames: Light curve files
+    :param outdir: Output directory
+    :param workers: Number of processes, each fits one light curve at a time
+    :param kwargs: Arguments passed to `phase_resolve()`
+    :return: Summary table rows, in the same order as filenames
+    """
+    os.makedirs(outdir, exist_ok=True)
+    jobs = [dict(kwargs, filename=f, prefix=f"{outdir}/{os.path.splitext(os.path.basename(f))[0]}_gti", workers=1)
+            for f in filenames]
+    if workers > 1:
+        with ProcessPoolExecutor(max_workers=workers) as pool:
+            rows = list(pool.map(_batch_row, jobs))
     else:
-        colour="g"
-    plt.fill_betweenx(y=[lc.rate.min(), lc.rate.max()], x1=point[0], x2=gti_points[i+1][0], color=colour, alpha=0.4)
-
-plt.fill_between(x = lc.time,
-                 y1 = sin_model(params[0], params[1] - standard_errors[1], params[2] - standard_errors[2], params[3] - standard_errors[3] - 1, lc.time),
-                 y2 = sin_model(params[0], params[1] + standard_errors[1], params[2] + standard_errors[2], params[3] + standard_errors[3] - 1, lc.time),
-                 color="b", alpha=0.5)
-
-# Legend
-high_patch = patches.Patch(color="g", alpha=0.4, label="High Phase")
-low_patch = patches.Patch(color="r", alpha=0.4, label="Low Phase")
-plt.legend(handles=[high_patch, low_patch])
-
-# Axes labels
-ax = plt.gca()
-ax.xaxis.set_major_formatter(ticker.FuncFormatter(lambda x, _: f"{int(x):d}"[3:]))
-plt.xlabel(f"Truncated Mission Time [{str(int(min(lc.time)))[:3]}] (s)")
-plt.ylabel("Rate (counts/s)")
-plt.title(f"Phase GTIs for {filename}", fontweight="bold")
-
-# Calculate chi-squared and chi-squared per degree of freedom
-chi2 = chi_squared(*params, t=times, y=rates, dy=errors)
-chi2dof = chi2 / (lc.time.size - len(theta_guess))
-
-print(f"chi^2 = {round(chi2, 3)}\nchi^2/dof = {round(chi2dof, 3)}")
-
-plt.text(times[0], lc.rate.min() + 0.4, r"$\chi^2 = $" + f"{round(chi2, 3)}\n" + r"$\chi^2_{dof} = $" + f"{round(chi2dof, 3)}")
-
-# Show and save plot
-plt.savefig(f"{cwd}/gti_phases.png", dpi=300, bbox_inches="tight")
-plt.show()
-
-if build:
-    # Run gtibuild on both High and Low phase GTIs
-    subprocess.run("gtibuild file=gti_High.txt table=gti_High.fits", shell=True)
-    subprocess.run("gtibuild file=gti_Low.txt table=gti_Low.fits", shell=True)
-
-    # Remove .txt files
-    os.remove("gti_High.txt")
-    os.remove("gti_Low.txt")
+        rows = [_batch_row(job) for job in jobs]
+
+    with open(f"{outdir}/phase_resolve_summary.txt", "w") as f:
+        f.write("# " + " ".join(SUMMARY_COLUMNS) + "\n")
+        for row in rows:
+            f.write(f"{row[0]} " + " ".join(f"{v:.8g}" for v in row[1:]) + "\n")
+    return rows
+
+
+if __name__ == "__main__":
+    cwd = os.getcwd()
+
+    # Input args
+    parser = argparse.ArgumentParser(description="Phase-resolved GTI finder.")
+    parser.add_argument("filename", type=str, help="Light curve file (or glob pattern with --batch)")
+    parser.add_argument("start", type=float, help="Region of interest start in mission time")
+    parser.add_argument("end", type=float, help="Region of interest end in mission time")
+    parser.add_argument("frequency", type=float, nargs='?', default=None, help="Frequency of interest in uHz (optional)")
+    parser.add_argument("phase", type=float, nargs='?', default=0.5, help="Phase")
+    parser.add_argument("amplitude", type=float, nargs='?', default=1.0, help="Sinusoid amplitude (optional)")
+    parser.add_argument("binsize", type=int, nargs='?', default=200, help="Bin size in seconds (optional)")
+    parser.add_argument("-b", "--build", action='store_true', help="Write GTI FITS files instead of .txt files")
+    parser.add_argument("-r", "--refine", action='store_true', help="Refine GTI boundaries by interpolating model crossings")
+    parser.add_argument("-s", "--search", action='store_true', help="Search for the frequency with a periodogram")
+    parser.add_argument("-c", "--candidates", type=int, default=3, help="Number of periodogram peaks to start fits from")
+    parser.add_argument("--fmin", type=float, default=None, help="Minimum periodogram frequency in uHz")
+    parser.add_argument("--fmax", type=float, default=None, help="Maximum periodogram frequency in uHz")
+    parser.add_argument("-w", "--workers", type=int, default=1, help="Number of processes")
+    parser.add_argument("--nphase", type=int, default=1, help="Number of phase starting points")
+    parser.add_argument("--nfreq", type=int, default=1, help="Number of frequency starting points")
+    parser.add_argument("--dfreq", type=float, default=0., help="Half-width of the frequency starting points in uHz")
+    parser.add_argument("-B", "--batch", action='store_true', help="Fit all light curves matching FileName without plotting")
+    parser.add_argument("-o", "--outdir", type=str, default=cwd, help="Output directory for batch mode")
+    parser.add_argument("--nocache", action='store_true', help="Do not use the rebinned light curve cache")
+
+    # Parse args
+    args = parser.parse_args()
+    filename = args.filename
+    binsize = args.binsize
+    build = args.build
+    fit_args = {"start": args.start, "end": args.end, "freq": args.frequency, "phase": args.phase, "amp": args.amplitude,
+                "binsize": binsize, "refine": args.refine, "search": args.search, "n_candidates": args.candidates,
+                "fmin": args.fmin, "fmax": args.fmax, "n_phase": args.nphase, "n_freq": args.nfreq, "dfreq": args.dfreq,
+                "build": build, "cache": None if args.nocache else default_cache()}
+
+    if args.batch:
+        filenames = sorted(glob.glob(filename))
+        print(f"Phase resolving {len(filenames)} light curves...")
+        phase_resolve_batch(filenames, args.outdir, args.workers, **fit_args)
+        print(f"Summary written to {args.outdir}/phase_resolve_summary.txt")
+        exit()
+
+    print("Fitting and identifying phases...")
+    try:
+        result = phase_resolve(filename, workers=args.workers, **fit_args)
+    except ValueError as e:
+        print(e)
+        exit()
+    lc = result["lc"]
+    times = result["times"]
+    mean = result["mean"]
+    params = result["params"]
+    standard_errors = result["standard_errors"]
+    gtis = result["gtis"]
+    chi2 = result["chi2"]
+    chi2dof = result["chi2dof"]
+
+    if "candidates" in result:
+        print(f"Candidate frequencies: {', '.join(str(round(f, 3)) for f in result['candidates'])}")
+    print(f"\nMLE Estimates ({result['n_starts']} starts):\nlevel = {round(params[0], 3)}\namplitude = {round(params[1], 4)}"
+          f"\nfrequency = {round(params[2], 3)}\nphase = {round(params[3], 4)}")
+    print(standard_errors)
+    for p in ["High", "Low"]:
+        print(f"{np.count_nonzero(gtis['phase'] == p)} {p} GTIs")
+    print(f"GTIs Completed")
+
+    plt.plot(result["fit"].history)
+    plt.ylabel(r"$\chi^2$")
+    plt.xlabel(r"Iteration")
+    plt.yscale("log")
+
+    if "candidates" in result:
+        plt.figure(figsize=(8, 4))
+        plt.plot(result["freqs"], result["power"], color="k", lw=1)
+        for f in result["candidates"]:
+            plt.axvline(x=f, linestyle="--", color="b", alpha=0.5)
+        plt.xlabel(r"Frequency ($\mu$Hz)")
+        plt.ylabel("Lomb-Scargle Power")
+
+    # Plot results
+    fig = plt.figure(figsize=(10, 6))
+    plt.scatter(lc.time, lc.rate, marker="+", s=20, color="k")
+    plt.plot(lc.time, sin_model(*params, lc.time), color="b")
+    plt.axhline(y=mean, linestyle="--", color="k")
+
+    # Phase GTIs
+    for gti in gtis:
+        if gti["phase"] == "Low":
+            colour="r"
+        else:
+            colour="g"
+        plt.fill_betweenx(y=[lc.rate.min(), lc.rate.max()], x1=gti["start"], x2=gti["stop"], color=colour, alpha=0.4)
+
+    plt.fill_between(x = lc.time,
+                     y1 = sin_model(params[0], params[1] - standard_errors[1], params[2] - standard_errors[2], params[3] - standard_errors[3] - 1, lc.time),
+                     y2 = sin_model(params[0], params[1] + standard_errors[1], params[2] + standard_errors[2], params[3] + standard_errors[3] - 1, lc.time),
+                     color="b", alpha=0.5)
+
+    # Legend
+    high_patch = patches.Patch(color="g", alpha=0.4, label="High Phase")
+    low_patch = patches.Patch(color="r", alpha=0.4, label="Low Phase")
+    plt.legend(handles=[high_patch, low_patch])
+
+    # Axes labels
+    ax = plt.gca()
+    ax.xaxis.set_major_formatter(ticker.FuncFormatter(lambda x, _: f"{int(x):d}"[3:]))
+    plt.xlabel(f"Truncated Mission Time [{str(int(min(lc.time)))[:3]}] (s)")
+    plt.ylabel("Rate (counts/s)")
+    plt.title(f"Phase GTIs for {filename}", fontweight="bold")
+
+    print(f"chi^2 = {round(chi2, 3)}\nchi^2/dof = {round(chi2dof, 3)}")
+
+    plt.text(times[0], lc.rate.min() + 0.4, r"$\chi^2 = $" + f"{round(chi2, 3)}\n" + r"$\chi^2_{dof} = $" + f"{round(chi2dof, 3)}")
+
+    # Show and save plot
+    plt.savefig(f"{cwd}/gti_phases.png", dpi=300, bbox_inches="tight")
+    plt.show()
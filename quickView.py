@@ -23,22 +23,34 @@ Options
 
 -e --energy - Specify the energy range of XMM light curves, defaults to 0.3-10keV
 
--a --all - Plot all light curves in directory
+-a --all - Plot all light curves in directory, loading them concurrently and plotting each as it loads
+
+-w --workers - Number of threads used to load light curves with --all, defaults to 8
+
+--nocache - Always read and rebin the light curve, rather than using the rebinned light curve cache
+
+-l --lod - Draw light curves as per-pixel min/max envelopes that are recomputed on zoom,
+           used automatically for light curves with more than 200000 bins
 
 ---------
 
 Author - Thomas Hodd
 
-Date - 21st August 2025
+Date - 17th October 2026
 
-Version - 1.2
+Version - 1.5
 """
 import argparse
 import os
+import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
 import numpy as np
+from astropy.io import fits
 from matplotlib import pyplot as plt
 from matplotlib import ticker
 from pylag import LightCurve
+from resultCache import ResultCache
+from rebinCache import default_cache, load_rebinned
 
 cwd = os.getcwd()
 COLOURS = ["dodgerblue", "orangered", "forestgreen", "deeppink", "darkturquoise", "orange",
@@ -53,6 +65,182 @@ SIZE = {1 : (10, 6),
         3 : (18, 7),
         4 : (12, 12),
         5 : (12, 12)}
+REDRAW_INTERVAL = 0.5  # Minimum seconds between redraws while light curves are loading
+LOD_BINS = 200000  # Light curves with more bins than this are drawn as min/max envelopes
+
+
+def minmax_decimate(t: np.ndarray, y: np.ndarray, t0: float, t1: float,
+                    n_pixels: int) -> tuple[np.ndarray, np.ndarray, np.ndarray]:
+    """
+    Minimum and maximum of a light curve in each pixel of a time range.
+    :param t: Time, sorted
+    :param y: Rate
+    :param t0: Start of the time range
+    :param t1: End of the time range
+    :param n_pixels: Number of pixels across the time range
+    :return: Mean time, minimum rate and maximum rate of each pixel containing at least one bin
+    """
+    lo, hi = np.searchsorted(t, [t0, t1])
+    t, y = t[lo:hi], y[lo:hi]
+    if len(t) == 0:
+        return t, y, y
+
+    # First bin of each non-empty pixel
+    edges = np.searchsorted(t, np.linspace(t0, t1, n_pixels + 1)[1:-1])
+    starts = np.unique(np.concatenate([[0], edges[edges < len(t)]]))
+    counts = np.diff(np.append(starts, len(t)))
+    return np.add.reduceat(t, starts) / counts, np.minimum.reduceat(y, starts), np.maximum.reduceat(y, starts)
+
+
+class LODPlot:
+    """
+    Light curve drawn at the level of detail of its axes.
+    When more bins are in view than there are pixels, each pixel column is drawn as a vertical line from the
+    minimum to the maximum rate in it, otherwise every bin is drawn as a marker. Recomputed when the x limits change.
+
+    Parameters
+    ==========
+    axis: plt.Axes
+        Axes to plot on
+    time: np.ndarray
+        Time
+    rate: np.ndarray
+        Rate
+    colour: str
+        Plot colour
+
+    Attributes
+    ==========
+    time: np.ndarray
+        Full resolution time
+    rate: np.ndarray
+        Full resolution rate
+    points: Line2D
+        Markers for every bin, shown when zoomed in
+    envelope: Line2D
+        Min/max envelope, shown when zoomed out
+    """
+
+    def __init__(self, axis: plt.Axes, time: np.ndarray, rate: np.ndarray, colour: str = None) -> None:
+        self.axis = axis
+        self.time = time
+        self.rate = rate
+        self.points, = axis.plot([], [], linestyle="none", marker="+", markersize=np.sqrt(20), color=colour)
+        self.envelope, = axis.plot([], [], linewidth=1, color=self.points.get_color())
+        axis.update_datalim(np.column_stack([time[[0, -1]], [rate.min(), rate.max()]]))
+        axis.autoscale_view(scalex=False)
+        axis.callbacks.connect("xlim_changed", self.update)
+        self.update(axis)
+
+        # Callbacks are weakly referenced, so the plot is kept alive by its own artist
+        self.points.lod_plot = self
+
+    def update(self, axis: plt.Axes) -> None:
+        """
+        Redraw for the current x limits of the axes.
+        :param axis: Axes whose limits changed
+        :return: None
+        """
+        t0, t1 = sorted(axis.get_xlim())
+        n_pixels = max(1, int(axis.bbox.width))
+        lo, hi = np.searchsorted(self.time, [t0, t1])
+
+        if hi - lo <= 2 * n_pixels:
+            self.points.set_data(self.time[lo:hi], self.rate[lo:hi])
+            self.envelope.set_data([], [])
+        else:
+            x, y_min, y_max = minmax_decimate(self.time, self.rate, t0, t1, n_pixels)
+            self.points.set_data([], [])
+            self.envelope.set_data(np.repeat(x, 2), np.column_stack([y_min, y_max]).ravel())
+
+
+def plot_lc(axis: plt.Axes, l: LightCurve, colour: str = None, lod: bool = False):
+    """
+    Plot a light curve as markers, or at the level of detail of the axes if it is long or lod is set.
+    :param axis: Axes to plot on
+    :param l: Light curve
+    :param colour: Plot colour
+    :param lod: If True always plot at the level of detail of the axes
+    :return: Plotted artist
+    """
+    if lod or len(l.time) > LOD_BINS:
+        return LODPlot(axis, l.time, l.rate, colour).points
+    return axis.scatter(l.time, l.rate, marker="+", s=20, color=colour)
+
+
+def lc_span(path: str) -> tuple[float, float] | None:
+    """
+    Time span of a light curve from its header, without loading the data.
+    :param path: File name
+    :return: First and last time as stored in the TIME column, or None if the file is not a light curve
+    """
+    try:
+        with fits.open(path, memmap=True) as hdul:
+            if "RATE" not in hdul:
+                return None
+            header = hdul["RATE"].header
+            if "TSTART" in header and "TSTOP" in header:
+                # TIME is stored relative to TIMEZERO
+                zero = header.get("TIMEZERO", 0.)
+                return header["TSTART"] - zero, header["TSTOP"] - zero
+            time = hdul["RATE"].data["TIME"]
+            return float(time[0]), float(time[-1])
+    except (OSError, KeyError, IndexError, TypeError):
+        return None
+
+
+def build_windows(spans: list[tuple[float, float]]) -> tuple[list[list[float]], list[int]]:
+    """
+    Group time spans into plot windows, a span inside an earlier window is plotted in that window.
+    :param spans: Time spans, sorted by start time
+    :return: Windows and the window of each span
+    """
+    windows = [list(spans[0])]
+    window_map = [0]
+    for start, stop in spans[1:]:
+        for i, w in enumerate(windows):
+            if start >= w[0] and stop <= w[1]:
+                window_map.append(i)
+                break
+            if i == len(windows) - 1:
+                windows.append([start, stop])
+                window_map.append(i+1)
+                break
+    return windows, window_map
+
+
+def load_lc(path: str, binsize: int, cache: ResultCache = None) -> LightCurve:
+    """
+    Load and rebin a light curve, keeping its file name.
+    :param path: File name
+    :param binsize: Bin size in seconds
+    :param cache: Cache of rebinned light curves
+    :return: Light curve
+    """
+    lc = load_rebinned(path, binsize, cache)
+    lc.filename = os.path.basename(path)
+    return lc
+
+
+def set_axes(axis: plt.Axes, start: float, stop: float, title: str) -> None:
+    """
+    Set up the time axes and title of a plot window.
+    :param axis: Axes of the window
+    :param start: First time in the window
+    :param stop: Last time in the window
+    :param title: Window title
+    :return: None
+    """
+    axis.xaxis.set_major_formatter(ticker.FuncFormatter(lambda x, _: f"{int(x):d}"[3:]))
+    axis.set_xlim(start - 5000, stop + 5000)
+    axis.set_ylabel("Rate (counts/s)")
+    axis.set_xlabel(f"Truncated Mission Time [{str(int(start))[:3]}] (s)")
+
+    ax2 = axis.twiny()
+    ax2.set_xlim([0 - 5, (stop - start) * 1E-3 + 5])
+    ax2.set_xlabel("Time (ks)")
+
+    axis.set_title(title, fontweight="bold")
 
 # Input args
 parser = argparse.ArgumentParser(description="Quickly view light curves.")
@@ -65,6 +253,9 @@ parser.add_argument("-t", "--stdev", action="store_true", help="Show standard de
 parser.add_argument("-d", "--xmmdata", action="store_true", help="Load XMM light curves")
 parser.add_argument("-e", "--energy", nargs="+", default=["0.3", "10"], help="Specify energy range of XMM light curves")
 parser.add_argument("-a", "--all", action="store_true", help="Plot all light curves in directory")
+parser.add_argument("-w", "--workers", type=int, default=8, help="Number of threads used to load light curves with --all")
+parser.add_argument("--nocache", action="store_true", help="Do not use the rebinned light curve cache")
+parser.add_argument("-l", "--lod", action="store_true", help="Draw light curves as min/max envelopes recomputed on zoom")
 
 # Parse args
 args = parser.parse_args()
@@ -77,69 +268,106 @@ std_stats = args.stdev
 xmm_data = args.xmmdata
 energy = args.energy
 all_lc = args.all
+workers = args.workers
+cache = None if args.nocache else default_cache()
+lod = args.lod
 
 energy = [int(float(i) * 1000) for i in energy]
 
 if xmm_data:
     # Load XMM data
-    all_lcs = [LightCurve(f"{filename}_lc_raw_{energy[0]}-{energy[1]}.fits").rebin(binsize),
-               LightCurve(f"{filename}_bg_raw_{energy[0]}-{energy[1]}.fits").rebin(binsize),
-               LightCurve(f"{filename}_lccor_{energy[0]}-{energy[1]}.fits").rebin(binsize)]
+    all_lcs = [load_rebinned(f"{filename}_lc_raw_{energy[0]}-{energy[1]}.fits", binsize, cache),
+               load_rebinned(f"{filename}_bg_raw_{energy[0]}-{energy[1]}.fits", binsize, cache),
+               load_rebinned(f"{filename}_lccor_{energy[0]}-{energy[1]}.fits", binsize, cache)]
     windows = [[all_lcs[0].time[0], all_lcs[0].time[-1]]]
     window_map = [0, 0, 0]
     if extra:
         print("Extra light curves ignored - not compatible with XMM data!")
 
+elif all_lc:
+    # Read headers first, skipping anything that is not a light curve, so windows are known before loading
+    with ThreadPoolExecutor(max_workers=workers) as pool:
+        paths = sorted(f"{cwd}/{f}" for f in os.listdir(cwd) if os.path.isfile(f"{cwd}/{f}"))
+        spans = dict(zip(paths, pool.map(lc_span, paths)))
+    lc_files = sorted((p for p in paths if spans[p] is not None), key=lambda p: spans[p][0])
+    if not lc_files:
+        print(f"No light curves found in {cwd}")
+        exit()
+    windows, window_map = build_windows([spans[p] for p in lc_files])
+
 else:
-    if all_lc:
-        all_lcs = []
-        for f in os.listdir(cwd):
-            all_lcs.append(LightCurve(f"{cwd}/{f}").rebin(binsize))
-        COLOURS = [None] * len(all_lcs)
-    else:
-        # Open the light curve file
-        lc:  LightCurve = LightCurve(filename).rebin(binsize)
-        lc.filename = filename
-
-        # Add additional light curves
-        extra_lcs = []
-        if extra:
-            for l in extra:
-                extra_lcs.append(LightCurve(l).rebin(binsize))
-
-        for l, name in zip(extra_lcs, extra):
-            l.filename = name
-
-        # Determine number of subplots
-        all_lcs = extra_lcs.copy()
-        all_lcs.append(lc)
+    # Open the light curve file
+    lc:  LightCurve = load_rebinned(filename, binsize, cache)
+    lc.filename = filename
+
+    # Add additional light curves
+    extra_lcs = []
+    if extra:
+        for l in extra:
+            extra_lcs.append(load_rebinned(l, binsize, cache))
+
+    for l, name in zip(extra_lcs, extra):
+        l.filename = name
+
+    # Determine number of subplots
+    all_lcs = extra_lcs.copy()
+    all_lcs.append(lc)
 
     all_lcs.sort(key=lambda x: x.time[0])
-    windows = [[all_lcs[0].time[0], all_lcs[0].time[-1]]]
-    window_map = [0]
-    for l in all_lcs[1:]:
-        for i, w in enumerate(windows):
-            if l.time[0] >= w[0] and l.time[-1] <= w[1]:
-                window_map.append(i)
-                break
-            if i == len(windows) - 1:
-                windows.append([l.time[0], l.time[-1]])
-                window_map.append(i+1)
-                break
+    windows, window_map = build_windows([(l.time[0], l.time[-1]) for l in all_lcs])
 
 # Create Figure
-fig, ax = plt.subplots(*LAYOUT[len(windows)], figsize=SIZE[len(windows)], label=f"QuickView - {filename}")
+fig, ax = plt.subplots(*LAYOUT.get(len(windows), (len(windows), 1)), figsize=SIZE.get(len(windows), (12, 2.5 * len(windows))),
+                       label=f"QuickView - {filename}")
 
 # Ensure the Axes is subscriptable
 if len(windows) == 1:
     ax = [ax, None]
 
+if all_lc and not xmm_data:
+    # Plot each light curve as soon as it has loaded
+    for i, w in enumerate(windows):
+        set_axes(ax[i], w[0], w[1], os.path.basename(lc_files[window_map.index(i)]))
+    plt.ion()
+    plt.show()
+    print(f"Loading {len(lc_files)} light curves...")
+    last_draw = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=workers) as pool:
+        futures = {pool.submit(load_lc, p, binsize, cache): i for i, p in enumerate(lc_files)}
+        for future in as_completed(futures):
+            l = future.result()
+            i = futures[future]
+            plot = window_map[i]
+            colour = f"C{i % 10}"
+            plot_lc(ax[plot], l, colour, lod)
+            if mean_stats:
+                mean = np.mean(l.rate)
+                median = np.median(l.rate)
+                ax[plot].axhline(y=mean, linestyle="--", color=colour, label=f"Mean ({round(mean, 2)})")
+                ax[plot].axhline(y=median, linestyle=":", color=colour, label=f"Median ({round(median, 2)})")
+            if std_stats:
+                ax[plot].text(l.time[0] - 5000, -1.3 * i - 3, f"Standard Deviation: {round(np.std(l.rate), 3)}", color=colour)
+            if time.perf_counter() - last_draw > REDRAW_INTERVAL:
+                fig.canvas.draw_idle()
+                plt.pause(0.001)
+                last_draw = time.perf_counter()
+    if mean_stats:
+        for i in range(len(windows)):
+            ax[i].legend()
+    plt.ioff()
+
+    plt.tight_layout()
+    if save:
+        plt.savefig(f"{cwd}/quick_view.png", dpi=300, bbox_inches="tight")
+    plt.show()
+    exit()
+
 # Plot light curves
 plot_set = [False] * len(windows)
 plot_list = []
 for i, l in enumerate(all_lcs):
     plot = window_map[i]
-    plot_list.append(ax[plot].scatter(l.time, l.rate, marker="+", s=20, color=COLOURS[i]))
+    plot_list.append(plot_lc(ax[plot], l, COLOURS[i], lod))
     if mean_stats:
         mean = np.mean(l.rate)
         median = np.median(l.rate)
@@ -152,18 +380,9 @@ for i, l in enumerate(all_lcs):
 
     # Axes
     if not plot_set[plot]:
-        ax[plot].xaxis.set_major_formatter(ticker.FuncFormatter(lambda x, _: f"{int(x):d}"[3:]))
-        ax[plot].set_xlim(l.time[0] - 5000, l.time[-1] + 5000)
-        ax[plot].set_ylabel("Rate (counts/s)")
-        ax[plot].set_xlabel(f"Truncated Mission Time [{str(int(min(l.time)))[:3]}] (s)")
-
-        ax2 = ax[plot].twiny()
-        ax2.set_xlim([0 - 5, (l.time[-1] - l.time[0]) * 1E-3 + 5])
-        ax2.set_xlabel("Time (ks)")
+        set_axes(ax[plot], l.time[0], l.time[-1], f"{l.filename}")
         plot_set[plot] = True
 
-        ax[plot].set_title(f"{l.filename}", fontweight="bold")
-
     if xmm_data:
         ax[plot].set_title(f"{filename}_lccor_raw_{energy[0]}-{energy[1]}.fits", fontweight="bold")
 
@@ -0,0 +1,48 @@
+"""
+Loads rebinned light curves through an on-disk cache, so repeat runs skip FITS decoding and rebinning.
+
+Entries are keyed on the light curve's path, size and mtime and the bin size, so they are invalidated
+when the light curve changes, and are removed least recently used first (see resultCache.py).
+
+Author - Thomas Hodd
+
+Date - 17th October 2026
+
+Version - 1.0
+"""
+from pylag import LightCurve
+from resultCache import CACHE_DIR, ResultCache
+
+LC_CACHE_DIR = f"{CACHE_DIR}/lightcurves"
+LC_CACHE_BYTES = 2 ** 28
+
+
+def default_cache() -> ResultCache:
+    """
+    Shared light curve cache, kept apart from other results so they do not evict each other.
+
+    :return: Light curve cache
+    """
+    return ResultCache(LC_CACHE_DIR, LC_CACHE_BYTES)
+
+
+def load_rebinned(filename: str, binsize: float, cache: ResultCache = None) -> LightCurve:
+    """
+    Load a light curve rebinned to binsize, from the cache if it has been rebinned before.
+
+    :param filename: Light curve file
+    :param binsize: Bin size in seconds
+    :param cache: Cache of rebinned light curves, None to always read the file
+    :return: Rebinned light curve
+    """
+    if cache is None:
+        return LightCurve(filename).rebin(binsize)
+
+    key = cache.key("LightCurve", cache.file_key(filename), binsize)
+    cached = cache.load(key)
+    if cached is not None:
+        return LightCurve(t=cached["time"], r=cached["rate"], e=cached["error"])
+
+    lc = LightCurve(filename).rebin(binsize)
+    cache.save(key, time=lc.time, rate=lc.rate, error=lc.error)
+    return lc
@@ -0,0 +1,167 @@
+"""
+Persistent, size-bounded cache of NumPy results.
+Entries are .npz files named by a hash of their inputs, and the least recently used entries are removed once
+the cache exceeds its size limit.
+
+Build a key with `ResultCache.key()` from anything that affects the result. Files are identified with
+`ResultCache.file_key()` (path, size and mtime, or a content hash), and arrays are hashed by content.
+
+Author - Thomas Hodd
+
+Date - 17th October 2026
+
+Version - 1.0
+"""
+import hashlib
+import json
+import os
+import tempfile
+import numpy as np
+
+CACHE_DIR = os.environ.get("XRAY_TOOLS_CACHE", os.path.expanduser("~/.cache/xray-astronomy-tools"))
+
+
+class ResultCache:
+    """
+    Content-addressed on-disk cache with least recently used eviction.
+
+    Parameters
+    ==========
+    directory: str
+        Cache directory, created if it does not exist
+    max_bytes: int
+        Maximum total size of the cache in bytes
+    hash_files: bool
+        If True files are identified by a hash of their contents rather than their size and mtime
+
+    Attributes
+    ==========
+    directory: str
+        Cache directory
+    max_bytes: int
+        Maximum total size of the cache in bytes
+    hash_files: bool
+        If True files are identified by a hash of their contents
+    """
+
+    def __init__(self, directory: str = CACHE_DIR, max_bytes: int = 2 ** 30, hash_files: bool = False) -> None:
+        self.directory = directory
+        self.max_bytes = max_bytes
+        self.hash_files = hash_files
+        os.makedirs(directory, exist_ok=True)
+
+    def __str__(self):
+        return f"ResultCache at {self.directory} ({len(self.__entries())} entries, {self.size() / 2 ** 20:.1f} MB)"
+
+    def __entries(self) -> list[str]:
+        return [f"{self.directory}/{f}" for f in os.listdir(self.directory) if f.endswith(".npz")]
+
+    def __path(self, key: str) -> str:
+        return f"{self.directory}/{key}.npz"
+
+    def file_key(self, path: str) -> str:
+        """
+        Identifies a file by its path, size and mtime, or by its contents if `hash_files` is set.
+
+        :param path: File name
+        :return: File identifier
+        """
+        if self.hash_files:
+            digest = hashlib.sha1()
+            with open(path, "rb") as f:
+                for chunk in iter(lambda: f.read(2 ** 20), b""):
+                    digest.update(chunk)
+            return digest.hexdigest()
+        stat = os.stat(path)
+        return f"{os.path.abspath(path)}:{stat.st_size}:{stat.st_mtime_ns}"
+
+    @staticmethod
+    def key(*parts) -> str:
+        """
+        Hashes the inputs of a result into a cache key.
+        Arrays are hashed by content, everything else by its JSON representation.
+
+        :param parts: Inputs of the result
+        :return: Cache key
+        """
+        digest = hashlib.sha1()
+        for part in parts:
+            if isinstance(part, np.ndarray):
+                array = np.ascontiguousarray(part)
+                digest.update(f"{array.dtype}{array.shape}".encode())
+                digest.update(memoryview(array).cast("B"))
+            else:
+                digest.update(json.dumps(part, default=str).encode())
+            digest.update(b"|")
+        return digest.hexdigest()
+
+    def load(self, key: str) -> dict[str, np.ndarray] | None:
+        """
+        Loads a cached result, marking it as recently used.
+
+        :param key: Cache key
+        :return: Dictionary of arrays, or None if the result is not cached
+        """
+        path = self.__path(key)
+        try:
+            with np.load(path, allow_pickle=False) as f:
+                result = {name: f[name] for name in f.files}
+            os.utime(path)
+        except (OSError, ValueError):
+            return None
+        return result
+
+    def save(self, key: str, **arrays: np.ndarray) -> None:
+        """
+        Saves a result, then evicts the least recently used entries if the cache is too large.
+
+        :param key: Cache key
+        :param arrays: Arrays to save
+        :return: None
+        """
+        fd, tmp = tempfile.mkstemp(dir=self.directory, suffix=".tmp")
+        with os.fdopen(fd, "wb") as f:
+            np.savez(f, **arrays)
+        os.replace(tmp, self.__path(key))
+        self.evict()
+
+    def size(self) -> int:
+        """
+        Total size of the cache entries.
+
+        :return: Size in bytes
+        """
+        return sum(os.path.getsize(f) for f in self.__entries())
+
+    def evict(self) -> None:
+        """
+        Removes the least recently used entries until the cache is within `max_bytes`.
+
+        :return: None
+        """
+        entries = []
+        for f in self.__entries():
+            try:
+                entries.append((os.stat(f), f))
+            except FileNotFoundError:
+                pass
+        entries.sort(key=lambda x: x[0].st_mtime_ns)
+
+        total = sum(stat.st_size for stat, _ in entries)
+        for stat, f in entries:
+            if total <= self.max_bytes:
+                break
+            try:
+                os.remove(f)
+            except FileNotFoundError:
+                pass
+            total -= stat.st_size
+
+    def clear(self) -> None:
+        """
+        Removes all cache entries.
+
+        :return: None
+        """
+        for f in self.__entries():
+            os.remove(f)
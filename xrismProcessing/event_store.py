@@ -0,0 +1,102 @@
+"""
+Keeps one uncompressed copy of each cleaned event file and links it into analysis directories, in place of
+copying the .evt.gz into each one.
+
+The uncompressed file is written once, next to the .evt.gz in event_cl/, and is only rewritten if the .evt.gz
+is newer. xselect and the HEASoft tools then read it without decompressing it again, and Python readers open
+it with memmap so column reads do not copy the file into memory.
+
+Usage
+---------
+python event_store.py <EventFile> <Directory>
+
+EventFile - Cleaned event file, e.g. xtend/event_cl/xa<obsid>xtd_p0<mode>00010_cl.evt.gz
+
+Directory - Directory to link the uncompressed event file into, e.g. analysis
+
+Prints the name of the linked event file, for use in shell scripts:
+event_file=$(python ../../event_store.py xtend/event_cl/${event_file} analysis)
+
+Author - Thomas Hodd
+
+Date - 17th October 2026
+
+Version - 1.0
+"""
+import argparse
+import gzip
+import os
+import shutil
+import threading
+from astropy.io import fits
+
+
+def uncompressed_path(filename: str) -> str:
+    """
+    Path of the uncompressed copy of an event file.
+    :param filename: Event file, gzipped or not
+    :return: filename without its .gz extension
+    """
+    return filename[:-3] if filename.endswith(".gz") else filename
+
+
+def decompress(filename: str) -> str:
+    """
+    Decompress an event file once, reusing the uncompressed copy while it is newer than the .gz.
+    The copy is written to a temporary file and renamed, so concurrent callers never see a partial file.
+    :param filename: Event file, files that are not gzipped are returned unchanged
+    :return: Uncompressed event file
+    """
+    out = uncompressed_path(filename)
+    if out == filename:
+        return filename
+    if os.path.exists(out) and os.path.getmtime(out) >= os.path.getmtime(filename):
+        return out
+
+    tmp = f"{out}.{os.getpid()}.{threading.get_ident()}.tmp"
+    with gzip.open(filename, "rb") as f_in, open(tmp, "wb") as f_out:
+        shutil.copyfileobj(f_in, f_out, 2 ** 24)
+    os.replace(tmp, out)
+    return out
+
+
+def link_event(filename: str, directory: str) -> str:
+    """
+    Link the uncompressed copy of an event file into a directory, replacing any earlier link or copy.
+    :param filename: Event file
+    :param directory: Directory to link into
+    :return: Path of the link
+    """
+    source = os.path.abspath(decompress(filename))
+    os.makedirs(directory, exist_ok=True)
+    link = os.path.join(directory, os.path.basename(source))
+    if os.path.abspath(link) == source:
+        return link
+
+    target = os.path.relpath(source, directory)
+    if os.path.islink(link) and os.readlink(link) == target:
+        return link
+    if os.path.lexists(link):
+        os.remove(link)
+    os.symlink(target, link)
+    return link
+
+
+def open_events(filename: str) -> fits.HDUList:
+    """
+    Open an event file with memmap, through its uncompressed copy if it is gzipped.
+    :param filename: Event file
+    :return: HDU list, columns are views of the file on disk
+    """
+    return fits.open(decompress(filename), memmap=True)
+
+
+if __name__ == "__main__":
+    # Input args
+    parser = argparse.ArgumentParser(description="Link the uncompressed copy of an event file into a directory.")
+    parser.add_argument("filename", type=str, help="Cleaned event file")
+    parser.add_argument("directory", type=str, help="Directory to link the event file into")
+
+    # Parse args
+    args = parser.parse_args()
+    print(os.path.basename(link_event(args.filename, args.directory)))
@@ -4,13 +4,15 @@
 #
 # Will process all observations listed in obs.txt, this should be in CSV format with columns:
 # obs_name, 3/obs_id, 311/obs_mode
+# Requires event_store.py in the same directory as bash script
+#
 # HEASoft must be initialised or XSelect commands will fail.
 #
 # Author: Thomas Hodd
 #
-# Date: 8th May 2026
+# Date: 17th October 2026
 #
-# Version: 1.2
+# Version: 1.3
 
 # Terminal colour codes
 set -e
@@ -60,12 +62,11 @@ for i in "${!obs[@]}"; do
     spec="${label}_rsl.pha"
     obsid=${obsid##*/}
 
-    # Copy event file to analysis directory
+    # Link uncompressed event file into analysis directory
     echo -e "${BLUE}Extracting image from $label ($obsid) ...${ENDC}"
     event_file="xa${obsid}rsl_p0px${obsmode}_cl.evt.gz"
     cd "$obsid"
-    mkdir -p analysis
-    cp resolve/event_cl/${event_file} analysis/${event_file}
+    event_file=$(python ../../event_store.py resolve/event_cl/${event_file} analysis)
     cd analysis
 
     # Extract spectrum
@@ -8,9 +8,9 @@
 #
 # Author: Thomas Hodd
 #
-# Date: 12th May 2026
+# Date: 17th October 2026
 #
-# Version: 1.0
+# Version: 1.1
 
 # Terminal colour codes
 set -e
@@ -48,7 +48,7 @@ for i in "${!obs[@]}"; do
     obsid=${obsid##*/}
 
     # Create RMF
-    event_file="xa${obsid}rsl_p0px${obsmode}_cl.evt.gz"
+    event_file="xa${obsid}rsl_p0px${obsmode}_cl.evt"
     cd $obsid/analysis
     punlearn rslmkrmf
     rslmkrmf infile=${event_file} outfileroot=${label}_rsl regmode=DET whichrmf=L resolist=0 regionfile=None pixlist=0-11,13-26,28-35
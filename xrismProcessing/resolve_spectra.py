@@ -0,0 +1,298 @@
+"""
+Extracts Resolve spectra from a cleaned event file without xselect, for the whole array and optionally for every
+pixel and several grade selections from one read of the events.
+
+Events are masked by time (GTIs and an optional time range), then counted into a (pixel, grade, channel) cube
+with a single bincount over PI. Each spectrum is a sum over part of the cube, so per-pixel spectra and extra grade
+sets cost no further passes over the events. Spectra are written as OGIP PHA files.
+
+Usage
+---------
+python resolve_spectra.py <EventFile> <Prefix>
+
+EventFile - Cleaned Resolve event file, gzipped files are read through their uncompressed copy (see event_store.py)
+
+Prefix - Spectrum file prefix, usually the observation label
+
+Options
+---------
+-g --grades - Grade (ITYPE) selections in xselect range syntax, defaults to 0:1 (Hp and Mp)
+
+-p --pixels - Pixel selection for the array spectrum, defaults to 0:11,13:26,28:35 (excludes the calibration pixel)
+
+-a --allpixels - Also write a spectrum for each of the 36 pixels
+
+-t --times - Start and end time to extract between, in the event file's time system
+
+--gti - GTI FITS file to extract within, as well as the event file's GTIs
+
+-o --outdir - Output directory, defaults to cwd
+
+---------
+
+The array spectrum is written as <Prefix>_rsl.pha, matching resolve_process.sh. With several grade selections,
+each selection after the first adds _g<Grades> to the name, e.g. <Prefix>_rsl_g0.pha for -g 0:1 0, and per-pixel
+spectra add _p<Pixel>, e.g. <Prefix>_rsl_p07.pha.
+
+Author - Thomas Hodd
+
+Date - 17th October 2026
+
+Version - 1.0
+"""
+import argparse
+import os
+import numpy as np
+from astropy.io import fits
+from event_store import open_events
+
+N_PIXELS = 36
+DEFAULT_GRADES = "0:1"
+DEFAULT_PIXELS = "0:11,13:26,28:35"
+HEADER_KEYWORDS = ["TELESCOP", "INSTRUME", "FILTER", "OBJECT", "OBS_ID", "DATAMODE", "DATE-OBS", "DATE-END",
+                   "TIMESYS", "TIMEREF", "TIMEUNIT", "MJDREFI", "MJDREFF", "MJDREF", "TIMEZERO", "RA_OBJ", "DEC_OBJ",
+                   "RA_NOM", "DEC_NOM", "EQUINOX", "RADECSYS"]
+
+
+def parse_ranges(text: str) -> np.ndarray:
+    """
+    Parse an xselect style list of inclusive ranges, e.g. 0:11,13:26,28:35.
+    :param text: Comma separated values or low:high ranges
+    :return: Sorted array of every value in the ranges
+    """
+    values = []
+    for part in text.split(","):
+        low, _, high = part.strip().partition(":")
+        values.append(np.arange(int(low), int(high or low) + 1))
+    return np.unique(np.concatenate(values))
+
+
+def merge_gtis(gtis: np.ndarray) -> np.ndarray:
+    """
+    Sort GTIs and merge any that overlap or touch.
+    :param gtis: Array of (start, stop) rows
+    :return: Sorted, non-overlapping array of (start, stop) rows
+    """
+    if len(gtis) == 0:
+        return gtis.reshape(0, 2)
+    gtis = gtis[np.argsort(gtis[:, 0], kind="stable")]
+    ends = np.maximum.accumulate(gtis[:, 1])
+    groups = np.flatnonzero(np.concatenate([[True], gtis[1:, 0] > ends[:-1]]))
+    return np.column_stack([gtis[groups, 0], np.maximum.reduceat(gtis[:, 1], groups)])
+
+
+def in_gtis(times: np.ndarray, gtis: np.ndarray) -> np.ndarray:
+    """
+    Mask of times inside any GTI, inclusive at both ends.
+    :param times: Times
+    :param gtis: Sorted, non-overlapping array of (start, stop) rows
+    :return: Boolean mask
+    """
+    k = np.searchsorted(gtis[:, 0], times, side="right") - 1
+    return (k >= 0) & (times <= gtis[np.maximum(k, 0), 1])
+
+
+def intersect_gtis(a: np.ndarray, b: np.ndarray) -> np.ndarray:
+    """
+    Intervals covered by both of two sets of GTIs.
+    :param a: Sorted, non-overlapping array of (start, stop) rows
+    :param b: Sorted, non-overlapping array of (start, stop) rows
+    :return: Sorted, non-overlapping array of (start, stop) rows
+    """
+    edges = np.unique(np.concatenate([a.ravel(), b.ravel()]))
+    mid = (edges[:-1] + edges[1:]) / 2
+    keep = in_gtis(mid, a) & in_gtis(mid, b)
+    return merge_gtis(np.column_stack([edges[:-1][keep], edges[1:][keep]]))
+
+
+def read_gtis(filename: str) -> np.ndarray:
+    """
+    Read the first GTI table of a FITS file.
+    :param filename: GTI or event file
+    :return: Sorted, non-overlapping array of (start, stop) rows
+    """
+    with fits.open(filename) as hdul:
+        for hdu in hdul[1:]:
+            if hdu.columns is not None and {"START", "STOP"} <= set(hdu.columns.names):
+                return merge_gtis(np.column_stack([hdu.data["START"], hdu.data["STOP"]]).astype(float))
+    raise ValueError(f"No GTI table in {filename}")
+
+
+def read_events(filename: str, grade_col: str = "ITYPE") -> tuple[dict, np.ndarray, fits.Header]:
+    """
+    Read the columns needed for spectra, and the GTIs, from an event file opened with memmap.
+    :param filename: Event file
+    :param grade_col: Event grade column
+    :return: Dictionary of TIME, PI, PIXEL and grade columns, array of (start, stop) GTIs and the EVENTS header
+    """
+    with open_events(filename) as hdul:
+        events = hdul["EVENTS"]
+        columns = {name: events.data[name] for name in ["TIME", "PI", "PIXEL", grade_col]}
+        header = events.header.copy()
+        gti_hdu = next((hdu for hdu in hdul[1:] if hdu.name in ["GTI", "STDGTI"]), None)
+        if gti_hdu is not None:
+            gtis = np.column_stack([gti_hdu.data["START"], gti_hdu.data["STOP"]]).astype(float)
+        else:
+            gtis = np.array([[header["TSTART"], header["TSTOP"]]])
+    return columns, merge_gtis(gtis), header
+
+
+def channel_range(header: fits.Header, column: str = "PI") -> tuple[int, int]:
+    """
+    First and last channel of a column, from its TLMIN/TLMAX keywords.
+    :param header: EVENTS header
+    :param column: Channel column
+    :return: Inclusive (first, last) channel, defaults to the Resolve range 0-59999
+    """
+    n = next(i for i in range(1, header["TFIELDS"] + 1) if header[f"TTYPE{i}"] == column)
+    return int(header.get(f"TLMIN{n}", 0)), int(header.get(f"TLMAX{n}", 59999))
+
+
+def count_cube(pi: np.ndarray, pixel: np.ndarray, grade: np.ndarray, mask: np.ndarray, channels: tuple[int, int],
+               n_grades: int) -> np.ndarray:
+    """
+    Counts of the masked events in every pixel, grade and channel, from one bincount.
+    :param pi: Event PI channels
+    :param pixel: Event pixels
+    :param grade: Event grades
+    :param mask: Events to count
+    :param channels: Inclusive (first, last) channel
+    :param n_grades: Number of grades to count, events with higher grades are dropped
+    :return: Counts, shape (pixels, grades, channels)
+    """
+    n_chan = channels[1] - channels[0] + 1
+    pi = np.asarray(pi, dtype=np.int64) - channels[0]
+    pixel = np.asarray(pixel, dtype=np.int64)
+    grade = np.asarray(grade, dtype=np.int64)
+    mask = mask & (pi >= 0) & (pi < n_chan) & (pixel >= 0) & (pixel < N_PIXELS) & (grade >= 0) & (grade < n_grades)
+
+    index = (pixel[mask] * n_grades + grade[mask]) * n_chan + pi[mask]
+    return np.bincount(index, minlength=N_PIXELS * n_grades * n_chan).reshape(N_PIXELS, n_grades, n_chan)
+
+
+def pha_hdu(counts: np.ndarray, exposure: float, header: dict, first_channel: int = 0) -> fits.BinTableHDU:
+    """
+    OGIP type I PHA spectrum extension.
+    :param counts: Counts in each channel
+    :param exposure: Exposure in seconds
+    :param header: Extra header keywords, e.g. from the EVENTS header
+    :param first_channel: Number of the first channel
+    :return: SPECTRUM table HDU
+    """
+    channels = np.arange(first_channel, first_channel + len(counts), dtype=np.int32)
+    table = fits.BinTableHDU.from_columns([fits.Column(name="CHANNEL", format="J", array=channels),
+                                           fits.Column(name="COUNTS", format="J", unit="count",
+                                                       array=counts.astype(np.int32))], name="SPECTRUM")
+    for key, value in header.items():
+        table.header[key] = value
+    table.header["HDUCLASS"] = ("OGIP", "Format conforms to OGIP standard")
+    table.header["HDUCLAS1"] = ("SPECTRUM", "PHA dataset")
+    table.header["HDUCLAS2"] = ("TOTAL", "Gross PHA spectrum")
+    table.header["HDUCLAS3"] = ("COUNT", "PHA data stored as counts")
+    table.header["HDUVERS"] = ("1.2.1", "Version of format")
+    table.header["EXPOSURE"] = (exposure, "Exposure time in seconds")
+    table.header["AREASCAL"] = (1.0, "Area scaling factor")
+    table.header["BACKSCAL"] = (1.0, "Background scaling factor")
+    table.header["CORRSCAL"] = (0.0, "Correction scaling factor")
+    for key in ["BACKFILE", "CORRFILE", "RESPFILE", "ANCRFILE"]:
+        table.header[key] = "none"
+    table.header["CHANTYPE"] = ("PI", "Channels assigned by detector electronics")
+    table.header["DETCHANS"] = (len(counts), "Total number of detector channels")
+    table.header["TLMIN1"] = first_channel
+    table.header["TLMAX1"] = first_channel + len(counts) - 1
+    table.header["POISSERR"] = (True, "Poissonian errors to be assumed")
+    table.header["SYS_ERR"] = (0, "No systematic error")
+    table.header["GROUPING"] = (0, "No grouping of the data")
+    table.header["QUALITY"] = (0, "No data quality information")
+    return table
+
+
+def write_pha(filename: str, counts: np.ndarray, exposure: float, header: dict, gtis: np.ndarray,
+              first_channel: int = 0) -> None:
+    """
+    Write an OGIP PHA file with the GTIs the spectrum was extracted in.
+    :param filename: Output file
+    :param counts: Counts in each channel
+    :param exposure: Exposure in seconds
+    :param header: Extra header keywords, e.g. from the EVENTS header
+    :param gtis: Array of (start, stop) GTIs
+    :param first_channel: Number of the first channel
+    :return: None
+    """
+    gti = fits.BinTableHDU.from_columns([fits.Column(name="START", format="D", unit="s", array=gtis[:, 0]),
+                                         fits.Column(name="STOP", format="D", unit="s", array=gtis[:, 1])], name="GTI")
+    gti.header["HDUCLASS"] = ("OGIP", "Format conforms to OGIP standard")
+    gti.header["HDUCLAS1"] = ("GTI", "Table contains Good Time Intervals")
+    gti.header["HDUCLAS2"] = ("STANDARD", "Good Time Interval table")
+    fits.HDUList([fits.PrimaryHDU(), pha_hdu(counts, exposure, header, first_channel), gti]).writeto(filename,
+                                                                                                    overwrite=True)
+
+
+def extract_spectra(event_file: str, prefix: str, grade_sets: list[str] = (DEFAULT_GRADES,),
+                    pixels: str = DEFAULT_PIXELS, all_pixels: bool = False, times: tuple[float, float] = None,
+                    gti_file: str = None, outdir: str = ".", grade_col: str = "ITYPE") -> list[str]:
+    """
+    Extract the array spectrum, and optionally every pixel's spectrum, for each grade selection.
+    :param event_file: Cleaned Resolve event file
+    :param prefix: Spectrum file prefix
+    :param grade_sets: Grade selections in xselect range syntax, the first gives the unsuffixed spectra
+    :param pixels: Pixel selection of the array spectrum in xselect range syntax
+    :param all_pixels: If True also write a spectrum for each pixel
+    :param times: Start and end time to extract between, None for all times
+    :param gti_file: GTI FITS file to extract within, None for the event file's GTIs only
+    :param outdir: Output directory
+    :param grade_col: Event grade column
+    :return: List of written files
+    """
+    columns, gtis, events_header = read_events(event_file, grade_col)
+    if times is not None:
+        gtis = intersect_gtis(gtis, np.array([times], dtype=float))
+    if gti_file is not None:
+        gtis = intersect_gtis(gtis, read_gtis(gti_file))
+    exposure = float(np.sum(gtis[:, 1] - gtis[:, 0]))
+    if exposure <= 0:
+        raise ValueError(f"No exposure left in {event_file} after time filtering")
+
+    grades = [parse_ranges(g) for g in grade_sets]
+    pixel_sel = parse_ranges(pixels)
+    channels = channel_range(events_header)
+    cube = count_cube(columns["PI"], columns["PIXEL"], columns[grade_col], in_gtis(columns["TIME"], gtis), channels,
+                      max(g.max() for g in grades) + 1)
+
+    header = {key: events_header[key] for key in HEADER_KEYWORDS if key in events_header}
+    header.update({"TSTART": gtis[0, 0], "TSTOP": gtis[-1, 1], "ONTIME": exposure})
+    os.makedirs(outdir, exist_ok=True)
+    files = []
+    for i, (grade_set, grade) in enumerate(zip(grade_sets, grades)):
+        suffix = "" if i == 0 else f"_g{grade_set.replace(':', '').replace(',', '')}"
+        header["GRADES"] = (grade_set, f"{grade_col} selection")
+        by_pixel = cube[:, grade].sum(axis=1)
+
+        header["PIXELS"] = (pixels, "PIXEL selection")
+        files.append(f"{outdir}/{prefix}_rsl{suffix}.pha")
+        write_pha(files[-1], by_pixel[pixel_sel].sum(axis=0), exposure, header, gtis, channels[0])
+        if all_pixels:
+            for p in range(N_PIXELS):
+                header["PIXELS"] = (str(p), "PIXEL selection")
+                files.append(f"{outdir}/{prefix}_rsl{suffix}_p{p:02d}.pha")
+                write_pha(files[-1], by_pixel[p], exposure, header, gtis, channels[0])
+    return files
+
+
+if __name__ == "__main__":
+    # Input args
+    parser = argparse.ArgumentParser(description="Extract Resolve spectra from one read of an event file.")
+    parser.add_argument("event_file", type=str, help="Cleaned Resolve event file")
+    parser.add_argument("prefix", type=str, help="Spectrum file prefix")
+    parser.add_argument("-g", "--grades", nargs="+", default=[DEFAULT_GRADES], help="Grade selections")
+    parser.add_argument("-p", "--pixels", type=str, default=DEFAULT_PIXELS, help="Pixel selection of the array spectrum")
+    parser.add_argument("-a", "--allpixels", action="store_true", help="Also write a spectrum for each pixel")
+    parser.add_argument("-t", "--times", type=float, nargs=2, default=None, help="Start and end time")
+    parser.add_argument("--gti", type=str, default=None, help="GTI FITS file to extract within")
+    parser.add_argument("-o", "--outdir", type=str, default=".", help="Output directory")
+
+    # Parse args
+    args = parser.parse_args()
+    for file in extract_spectra(args.event_file, args.prefix, args.grades, args.pixels, args.allpixels, args.times,
+                                args.gti, args.outdir):
+        print(f"Written spectrum: {file}")
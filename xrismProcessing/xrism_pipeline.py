@@ -0,0 +1,677 @@
+"""
+Runs the xrismProcessing steps for many observations concurrently, as a graph of tasks over worker pools.
+
+Each observation's downloads, xselect extractions, lcmath, xtdrmf and rslmkrmf runs are tasks that start as
+soon as the tasks they depend on have finished, so one observation can be extracting while another is still
+downloading. Each stage has its own concurrency limit (downloads are I/O bound, RMF generation CPU bound), and
+every task runs in its own working directory, <label>/<obsid>/work/<task>, with its products moved into
+analysis/ when it succeeds. A failed task only stops the tasks that depend on it. Event files are decompressed
+once and linked into analysis/ (see event_store.py) rather than copied.
+
+A manifest records the checksums of each task's inputs and products and its parameters (PHA cut, bin size,
+grade and pixel selections, ...). On reruns, tasks whose inputs, parameters and products are unchanged are
+skipped, like make, so adding an observation or energy band to a campaign only runs the new tasks.
+
+Usage
+---------
+python xrism_pipeline.py
+
+Reads obs.txt (Xtend) and obs_r.txt (Resolve) in the same formats as the shell scripts, if they exist.
+
+Options
+---------
+--xtend - Xtend observation list, defaults to obs.txt
+
+--resolve - Resolve observation list, defaults to obs_r.txt
+
+--energy - Energy band file for narrow-band Xtend light curves (see xtend_lightcurves.py), e.g. engs.txt
+
+--mirror - Local directory laid out like the HEASARC FTP tree to fetch data from instead of HEASARC
+
+--limit - Concurrency limit of a stage as stage=N, e.g. --limit download=2 rmf=8
+
+--dry-run - Print the commands each task would run without running them
+
+--native - Extract Resolve spectra with resolve_spectra.py rather than xselect
+
+--force - Rerun every task, even if its products are up to date
+
+--manifest - Manifest file, defaults to xrism_manifest.json
+
+---------
+
+HEASoft must be initialised for the xselect, lcmath, xtdrmf and rslmkrmf tasks.
+Requires get_regions_xrism.py, xtend_lightcurves.py, resolve_spectra.py and event_store.py in the same directory as this script.
+Region files are made interactively with get_regions_xrism.py, one observation at a time, unless
+<label>_src.reg and <label>_bkg.reg already exist in analysis/.
+
+Author - Thomas Hodd
+
+Date - 17th October 2026
+
+Version - 1.3
+"""
+import argparse
+import hashlib
+import json
+import os
+import shutil
+import subprocess
+import sys
+import threading
+import urllib.parse
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
+from typing import Callable
+from event_store import link_event
+from xtend_lightcurves import EV_TO_PI
+
+HEASARC = "https://heasarc.gsfc.nasa.gov/FTP"
+SCRIPT_DIR = os.path.dirname(os.path.abspath(__file__))
+MANIFEST = "xrism_manifest.json"
+STAGE_LIMITS = {"download": 4, "regions": 1, "extract": 4, "lcmath": 4, "rmf": os.cpu_count() or 1}
+
+# Terminal colour codes
+ENDC = "\033[0m"
+ERRR = "\033[91m"
+GREN = "\033[92m"
+WARN = "\033[93m"
+BLUE = "\033[94m"
+
+
+class HeasarcMirror:
+    """
+    Fetches files and directories from the HEASARC FTP area with wget.
+
+    Parameters
+    ==========
+    url: str
+        Root URL of the FTP area
+    dry_run: bool
+        If True print the wget commands without running them
+    """
+
+    def __init__(self, url: str = HEASARC, dry_run: bool = False) -> None:
+        self.url = url
+        self.dry_run = dry_run
+
+    def fetch(self, path: str, dest: str) -> None:
+        """
+        Fetch a file, or a directory if path ends in /, into dest.
+
+        :param path: Path relative to the FTP root
+        :param dest: Local directory
+        :return: None
+        """
+        os.makedirs(dest, exist_ok=True)
+        url = urllib.parse.urljoin(self.url + "/", path)
+        recursive = ["-r", "-np", "-nd", "-R", "index.html*"] if path.endswith("/") else []
+        run_command(["wget", "-nv", "-N", *recursive, "-erobots=off", "--wait=1", "-P", dest, url], dest,
+                    dry_run=self.dry_run)
+
+
+class LocalMirror:
+    """
+    Stand-in for the HEASARC FTP area that copies from a local directory with the same layout, for testing.
+
+    Parameters
+    ==========
+    root: str
+        Local directory corresponding to the FTP root
+    dry_run: bool
+        If True print the copies without making them
+    """
+
+    def __init__(self, root: str, dry_run: bool = False) -> None:
+        self.root = os.path.abspath(root)
+        self.dry_run = dry_run
+
+    def fetch(self, path: str, dest: str) -> None:
+        """
+        Copy a file, or a directory's files if path ends in /, into dest.
+
+        :param path: Path relative to the mirror root
+        :param dest: Local directory
+        :return: None
+        """
+        source = os.path.join(self.root, path)
+        if self.dry_run:
+            print(f"cp {source} {dest}")
+            return
+        os.makedirs(dest, exist_ok=True)
+        if path.endswith("/"):
+            for f in os.listdir(source):
+                if os.path.isfile(os.path.join(source, f)):
+                    shutil.copy2(os.path.join(source, f), dest)
+        else:
+            shutil.copy2(source, dest)
+
+
+class Task:
+    """
+    One step of the pipeline.
+
+    Parameters
+    ==========
+    name: str
+        Unique task name
+    stage: str
+        Stage, which sets the worker pool the task runs in
+    action: Callable[[str], None]
+        Function run with the task's working directory
+    workdir: str
+        Working directory, created before the task runs
+    deps: list[Task]
+        Tasks that must succeed first
+    products: list[tuple[str, str]]
+        Files (relative to workdir) moved to their destination paths once the action succeeds
+    inputs: list[str]
+        Files the products are built from
+    params: dict
+        Parameters the products are built with, must be JSON serialisable
+    outputs: list[str]
+        Files or directories the action writes in place rather than in workdir
+
+    Attributes
+    ==========
+    status: str
+        pending, done, current (up to date, not rerun), failed or skipped
+    """
+
+    def __init__(self, name: str, stage: str, action: Callable[[str], None], workdir: str,
+                 deps: list["Task"] = (), products: list[tuple[str, str]] = (), inputs: list[str] = (),
+                 params: dict = None, outputs: list[str] = ()) -> None:
+        self.name = name
+        self.stage = stage
+        self.action = action
+        self.workdir = workdir
+        self.deps = list(deps)
+        self.products = list(products)
+        self.inputs = list(inputs)
+        self.params = params or {}
+        self.outputs = list(outputs)
+        self.status = "pending"
+
+    @property
+    def targets(self) -> list[str]:
+        """
+        Every file or directory the task makes.
+        """
+        return [dest for _, dest in self.products] + self.outputs
+
+    def __repr__(self):
+        return f"Task({self.name}, {self.stage}, {self.status})"
+
+    def execute(self, dry_run: bool = False) -> None:
+        """
+        Run the action in the working directory, then move the products into place.
+
+        :param dry_run: If True do not move products
+        :return: None
+        """
+        os.makedirs(self.workdir, exist_ok=True)
+        self.action(self.workdir)
+        if dry_run:
+            return
+        for product, dest in self.products:
+            os.makedirs(os.path.dirname(dest), exist_ok=True)
+            shutil.move(os.path.join(self.workdir, product), dest)
+
+
+class Manifest:
+    """
+    Record of the inputs, parameters and products of each task, kept as JSON between runs.
+
+    Checksums are SHA-256, cached against each file's size and modification time so unchanged event files are
+    only hashed once. Directories are checksummed from the names and checksums of the files inside them.
+
+    Parameters
+    ==========
+    filename: str
+        Manifest file, created on the first save
+
+    Attributes
+    ==========
+    tasks: dict
+        Inputs, params and products of each task, keyed on task name
+    checksums: dict
+        Cached [size, mtime_ns, checksum] of each file, keyed on absolute path
+    """
+
+    def __init__(self, filename: str = MANIFEST) -> None:
+        self.filename = filename
+        self.lock = threading.Lock()
+        self.tasks = {}
+        self.checksums = {}
+        if os.path.exists(filename):
+            with open(filename, "r") as f:
+                stored = json.load(f)
+            self.tasks = stored.get("tasks", {})
+            self.checksums = stored.get("checksums", {})
+
+    def checksum(self, path: str) -> str | None:
+        """
+        Checksum of a file or directory.
+
+        :param path: File or directory
+        :return: Hex digest, None if path does not exist
+        """
+        path = os.path.abspath(path)
+        if os.path.isdir(path):
+            digest = hashlib.sha256()
+            for root, dirs, files in sorted(os.walk(path)):
+                dirs.sort()
+                for f in sorted(files):
+                    digest.update(f"{os.path.relpath(os.path.join(root, f), path)}:"
+                                  f"{self.checksum(os.path.join(root, f))}\n".encode())
+            return digest.hexdigest()
+        if not os.path.isfile(path):
+            return None
+
+        stat = os.stat(path)
+        with self.lock:
+            cached = self.checksums.get(path)
+        if cached is not None and cached[:2] == [stat.st_size, stat.st_mtime_ns]:
+            return cached[2]
+
+        digest = hashlib.sha256()
+        with open(path, "rb") as f:
+            for block in iter(lambda: f.read(2 ** 20), b""):
+                digest.update(block)
+        with self.lock:
+            self.checksums[path] = [stat.st_size, stat.st_mtime_ns, digest.hexdigest()]
+        return digest.hexdigest()
+
+    def entry(self, task: Task) -> dict:
+        """
+        Current inputs, params and products of a task, in the form stored in the manifest.
+
+        :param task: Task
+        :return: Manifest entry
+        """
+        return {"inputs": {os.path.abspath(p): self.checksum(p) for p in task.inputs},
+                "params": json.loads(json.dumps(task.params)),
+                "products": {os.path.abspath(p): self.checksum(p) for p in task.targets}}
+
+    def up_to_date(self, task: Task) -> bool:
+        """
+        Check whether a task's products exist and were built from its current inputs and params.
+
+        :param task: Task
+        :return: True if the task does not need to run
+        """
+        with self.lock:
+            stored = self.tasks.get(task.name)
+        if stored is None or not task.targets:
+            return False
+        current = self.entry(task)
+        return None not in current["products"].values() and current == stored
+
+    def record(self, task: Task) -> None:
+        """
+        Record a task's inputs, params and products after it has run.
+
+        :param task: Task
+        :return: None
+        """
+        entry = self.entry(task)
+        with self.lock:
+            self.tasks[task.name] = entry
+
+    def save(self) -> None:
+        """
+        Write the manifest, replacing the previous file in one step so an interrupted run cannot corrupt it.
+
+        :return: None
+        """
+        with self.lock:
+            stored = {"tasks": self.tasks, "checksums": self.checksums}
+            with open(f"{self.filename}.tmp", "w") as f:
+                json.dump(stored, f, indent=1)
+            os.replace(f"{self.filename}.tmp", self.filename)
+
+
+class Pipeline:
+    """
+    Graph of tasks run over one worker pool per stage.
+
+    Parameters
+    ==========
+    limits: dict[str, int]
+        Concurrency limit of each stage, stages not listed use STAGE_LIMITS or 1
+    dry_run: bool
+        If True task actions only print their commands
+    manifest: Manifest
+        Manifest used to skip up to date tasks, None to run every task
+    force: bool
+        If True run every task but still record it in the manifest
+
+    Attributes
+    ==========
+    tasks: list[Task]
+        Tasks in the order they were added
+    """
+
+    def __init__(self, limits: dict[str, int] = None, dry_run: bool = False, manifest: Manifest = None,
+                 force: bool = False) -> None:
+        self.limits = dict(STAGE_LIMITS, **(limits or {}))
+        self.dry_run = dry_run
+        self.manifest = manifest
+        self.force = force
+        self.tasks = []
+
+    def add(self, name: str, stage: str, action: Callable[[str], None], workdir: str,
+            deps: list[Task] = (), products: list[tuple[str, str]] = (), inputs: list[str] = (),
+            params: dict = None, outputs: list[str] = ()) -> Task:
+        """
+        Add a task to the pipeline, see Task for the parameters.
+
+        :return: The new task, for use as a dependency
+        """
+        task = Task(name, stage, action, workdir, [d for d in deps if d is not None], products, inputs, params,
+                    outputs)
+        self.tasks.append(task)
+        return task
+
+    def __build(self, task: Task) -> bool:
+        """
+        Run a task unless the manifest shows it is up to date.
+
+        :return: True if the task ran
+        """
+        if self.manifest is not None and not self.force and self.manifest.up_to_date(task):
+            return False
+        task.execute(self.dry_run)
+        if self.manifest is not None and not self.dry_run:
+            self.manifest.record(task)
+        return True
+
+    def __skip_dependents(self, failed: Task, dependents: dict) -> None:
+        for task in dependents[failed.name]:
+            if task.status == "pending":
+                task.status = "skipped"
+                print(f"{WARN}Skipped {task.name}, {failed.name} did not finish{ENDC}")
+                self.__skip_dependents(task, dependents)
+
+    def run(self) -> dict[str, str]:
+        """
+        Run every task once its dependencies have succeeded.
+
+        :return: Status of each task
+        """
+        dependents = {task.name: [] for task in self.tasks}
+        waiting = {}
+        for task in self.tasks:
+            waiting[task.name] = len(task.deps)
+            for dep in task.deps:
+                dependents[dep.name].append(task)
+
+        pools = {stage: ThreadPoolExecutor(max_workers=self.limits.get(stage, 1), thread_name_prefix=stage)
+                 for stage in {task.stage for task in self.tasks}}
+        ready = [task for task in self.tasks if waiting[task.name] == 0]
+        running = {}
+        try:
+            while ready or running:
+                for task in ready:
+                    running[pools[task.stage].submit(self.__build, task)] = task
+                ready = []
+
+                done, _ = wait(running, return_when=FIRST_COMPLETED)
+                for future in done:
+                    task = running.pop(future)
+                    if future.exception() is not None:
+                        task.status = "failed"
+                        print(f"{ERRR}Failed {task.name}: {future.exception()}{ENDC}")
+                        self.__skip_dependents(task, dependents)
+                        continue
+                    if future.result():
+                        task.status = "done"
+                        print(f"{GREN}Finished {task.name}{ENDC}")
+                        if self.manifest is not None and not self.dry_run:
+                            self.manifest.save()
+                    else:
+                        task.status = "current"
+                        print(f"{BLUE}Up to date {task.name}{ENDC}")
+                    for dependent in dependents[task.name]:
+                        waiting[dependent.name] -= 1
+                        if waiting[dependent.name] == 0 and dependent.status == "pending":
+                            ready.append(dependent)
+        finally:
+            for pool in pools.values():
+                pool.shutdown()
+        return {task.name: task.status for task in self.tasks}
+
+
+def run_command(args: list[str], cwd: str, stdin: str = None, dry_run: bool = False, interactive: bool = False) -> None:
+    """
+    Run a command, logging its output to command.log in its working directory.
+
+    HEASoft parameter files are written to the working directory, so concurrent runs of the same tool do not
+    overwrite each other's parameters.
+
+    :param args: Command and arguments
+    :param cwd: Working directory
+    :param stdin: Text passed to the command's standard input, e.g. an xselect script
+    :param dry_run: If True print the command instead
+    :param interactive: If True leave the command attached to the terminal
+    :return: None
+    """
+    if dry_run:
+        print(f"[{cwd}] {' '.join(args)}" + (f" <<\n{stdin}" if stdin else ""))
+        return
+    env = dict(os.environ)
+    if "PFILES" in env:
+        env["PFILES"] = f"{cwd};{env['PFILES'].split(';')[-1]}"
+    if interactive:
+        subprocess.run(args, cwd=cwd, env=env, check=True)
+        return
+    with open(os.path.join(cwd, "command.log"), "a") as log:
+        subprocess.run(args, cwd=cwd, env=env, input=stdin, text=True, stdout=log, stderr=subprocess.STDOUT, check=True)
+
+
+def read_observations(filename: str) -> list[list[str]]:
+    """
+    Read an observation list in the CSV format used by the shell scripts.
+
+    :param filename: obs.txt or obs_r.txt
+    :return: List of rows
+    """
+    rows = []
+    with open(filename, "r") as f:
+        for line in f:
+            row = [v for v in line.replace(",", " ").split()]
+            if row:
+                rows.append(row)
+    return rows
+
+
+def pha(energy: str) -> int:
+    """
+    Xtend PI channel of an energy in eV, as used by `filter pha_cut` in the shell scripts.
+    """
+    return round(float(energy) * EV_TO_PI)
+
+
+def add_xtend(pipeline: Pipeline, mirror, label: str, obsid_path: str, obsmode: str, enmin: str, enmax: str,
+              energy_file: str = None) -> None:
+    """
+    Add the tasks of xtend_process.sh, xtend_spectra_process.sh and (optionally) xtend_energy_process.sh
+    for one observation.
+
+    :param pipeline: Pipeline to add to
+    :param mirror: HeasarcMirror or LocalMirror
+    :param label: Observation label
+    :param obsid_path: Observation ID with its x/ prefix, as in the archive path
+    :param obsmode: Observation mode
+    :param enmin: Light curve minimum energy in eV
+    :param enmax: Light curve maximum energy in eV
+    :param energy_file: Energy band file for narrow-band light curves, None to skip them
+    :return: None
+    """
+    dry_run = pipeline.dry_run
+    obsid = obsid_path.split("/")[-1]
+    root = os.path.abspath(os.path.join(label, obsid))
+    analysis = os.path.join(root, "analysis")
+    work = os.path.join(root, "work")
+    event_file = f"xa{obsid}xtd_p0{obsmode}00010_cl.evt"
+    src_reg = os.path.join(analysis, f"{label}_src.reg")
+    bkg_reg = os.path.join(analysis, f"{label}_bkg.reg")
+    session = f"clear all proceed=yes\nread events {event_file} {analysis}\nset image det\n"
+
+    def download(workdir):
+        mirror.fetch(f"xrism/data/obs/{obsid_path}/xtend/event_cl/", os.path.join(root, "xtend", "event_cl"))
+        mirror.fetch(f"xrism/postlaunch/gainreports/{obsid_path}_resolve_energy_scale_report.pdf",
+                     os.path.abspath(label))
+        if not dry_run:
+            link_event(os.path.join(root, "xtend", "event_cl", f"{event_file}.gz"), analysis)
+
+    def image(workdir):
+        script = f"xtend_batch_process\n{session}filter pha_cut {pha(enmin)} {pha(enmin)}\nextr image\n" \
+                 f"save image {label}.img clobberit=true\nexit save_session=no\n"
+        run_command(["xselect"], workdir, script, dry_run)
+
+    def regions(workdir):
+        if os.path.exists(src_reg) and os.path.exists(bkg_reg):
+            return
+        run_command([sys.executable, os.path.join(SCRIPT_DIR, "get_regions_xrism.py"), f"{analysis}/{label}.img", label],
+                    workdir, dry_run=dry_run, interactive=True)
+        if not dry_run:
+            for reg in [src_reg, bkg_reg]:
+                shutil.move(os.path.join(workdir, os.path.basename(reg)), reg)
+
+    lc_root = f"{label}_tbin10_en{enmin}_{enmax}"
+
+    def curves(workdir):
+        script = f"xtend_batch_process\n{session}filter pha_cut {pha(enmin)} {pha(enmax)}\nset binsize 10\n" \
+                 f"filter region {src_reg}\nextr curve\nsave curve {lc_root}_src.lc\nclear region\n" \
+                 f"filter region {bkg_reg}\nextr curve\nsave curve {lc_root}_bkg.lc\nexit save_session=no\n"
+        run_command(["xselect"], workdir, script, dry_run)
+
+    def lcmath(workdir):
+        run_command(["lcmath", f"infile={analysis}/{lc_root}_src.lc", f"bgfile={analysis}/{lc_root}_bkg.lc",
+                     f"outfile={lc_root}_lccor.lc", "multi=1", "multb=1"], workdir, dry_run=dry_run)
+
+    def spectra(workdir):
+        script = f"xtend_batch_process\n{session}filter region {src_reg}\nextr spec\nsave spec {label}_src.pha\n" \
+                 f"clear region\nfilter region {bkg_reg}\nextr spec\nsave spec {label}_bkg.pha\nexit save_session=no\n"
+        run_command(["xselect"], workdir, script, dry_run)
+
+    def rmf(workdir):
+        run_command(["punlearn", "xtdrmf"], workdir, dry_run=dry_run)
+        run_command(["xtdrmf", f"{analysis}/{label}_src.pha", f"{label}.rmf"], workdir, dry_run=dry_run)
+
+    def energy_curves(workdir):
+        run_command([sys.executable, os.path.join(SCRIPT_DIR, "xtend_lightcurves.py"), f"{analysis}/{event_file}",
+                     src_reg, bkg_reg, os.path.abspath(energy_file), label, "--binsize", "10", "--outdir",
+                     os.path.join(analysis, "energy_lcs")], workdir, dry_run=dry_run)
+
+    event = f"{analysis}/{event_file}"
+    lcs = [f"{analysis}/{lc_root}_{k}.lc" for k in ["src", "bkg"]]
+    specs = [f"{analysis}/{label}_{k}.pha" for k in ["src", "bkg"]]
+    t_download = pipeline.add(f"{label}:download", "download", download, f"{work}/download",
+                              params={"obsid": obsid_path, "mode": obsmode}, outputs=[event])
+    t_image = pipeline.add(f"{label}:image", "extract", image, f"{work}/image", [t_download],
+                           [(f"{label}.img", f"{analysis}/{label}.img")], [event], {"pha_cut": [pha(enmin)] * 2})
+    t_regions = pipeline.add(f"{label}:regions", "regions", regions, f"{work}/regions", [t_image])
+    t_curves = pipeline.add(f"{label}:curves", "extract", curves, f"{work}/curves", [t_regions],
+                            [(os.path.basename(lc), lc) for lc in lcs], [event, src_reg, bkg_reg],
+                            {"pha_cut": [pha(enmin), pha(enmax)], "binsize": 10})
+    pipeline.add(f"{label}:lcmath", "lcmath", lcmath, f"{work}/lcmath", [t_curves],
+                 [(f"{lc_root}_lccor.lc", f"{analysis}/{lc_root}_lccor.lc")], lcs, {"multi": 1, "multb": 1})
+    t_spectra = pipeline.add(f"{label}:spectra", "extract", spectra, f"{work}/spectra", [t_regions],
+                             [(os.path.basename(spec), spec) for spec in specs], [event, src_reg, bkg_reg])
+    pipeline.add(f"{label}:rmf", "rmf", rmf, f"{work}/rmf", [t_spectra], [(f"{label}.rmf", f"{analysis}/{label}.rmf")],
+                 specs[:1])
+    if energy_file is not None:
+        pipeline.add(f"{label}:energy_curves", "extract", energy_curves, f"{work}/energy_curves", [t_regions],
+                     inputs=[event, src_reg, bkg_reg, energy_file], params={"binsize": 10},
+                     outputs=[f"{analysis}/energy_lcs"])
+
+
+def add_resolve(pipeline: Pipeline, mirror, label: str, obsid_path: str, obsmode: str, native: bool = False) -> None:
+    """
+    Add the tasks of resolve_process.sh and resolve_rmf_process.sh for one observation.
+
+    :param pipeline: Pipeline to add to
+    :param mirror: HeasarcMirror or LocalMirror
+    :param label: Observation label
+    :param obsid_path: Observation ID with its x/ prefix, as in the archive path
+    :param obsmode: Observation mode
+    :param native: If True extract the spectrum with resolve_spectra.py rather than xselect
+    :return: None
+    """
+    dry_run = pipeline.dry_run
+    obsid = obsid_path.split("/")[-1]
+    root = os.path.abspath(os.path.join(label, obsid))
+    analysis = os.path.join(root, "analysis")
+    work = os.path.join(root, "work")
+    event_file = f"xa{obsid}rsl_p0px{obsmode}_cl.evt"
+    spec = f"{label}_rsl.pha"
+
+    def download(workdir):
+        mirror.fetch(f"xrism/data/obs/{obsid_path}/resolve/event_cl/", os.path.join(root, "resolve", "event_cl"))
+        mirror.fetch(f"xrism/postlaunch/gainreports/{obsid_path}_resolve_energy_scale_report.pdf",
+                     os.path.abspath(label))
+        if not dry_run:
+            link_event(os.path.join(root, "resolve", "event_cl", f"{event_file}.gz"), analysis)
+
+    def spectrum(workdir):
+        if native:
+            run_command([sys.executable, os.path.join(SCRIPT_DIR, "resolve_spectra.py"), f"{analysis}/{event_file}",
+                         label, "--grades", "0:1", "--pixels", "0:11,13:26,28:35"], workdir, dry_run=dry_run)
+            return
+        script = f"resolve_batch_process\nclear all proceed=yes\nread events {event_file} {analysis}\n" \
+                 f"filter GRADE \"0:1\"\nfilter column \"PIXEL=0:11,13:26,28:35\"\nextr spec\nsave spec {spec}\n" \
+                 f"exit save_session=no\n"
+        run_command(["xselect"], workdir, script, dry_run)
+
+    def rmf(workdir):
+        run_command(["punlearn", "rslmkrmf"], workdir, dry_run=dry_run)
+        run_command(["rslmkrmf", f"infile={analysis}/{event_file}", f"outfileroot={label}_rsl", "regmode=DET",
+                     "whichrmf=L", "resolist=0", "regionfile=None", "pixlist=0-11,13-26,28-35"], workdir, dry_run=dry_run)
+
+    event = f"{analysis}/{event_file}"
+    t_download = pipeline.add(f"{label}:rsl_download", "download", download, f"{work}/rsl_download",
+                              params={"obsid": obsid_path, "mode": obsmode}, outputs=[event])
+    pipeline.add(f"{label}:rsl_spectrum", "extract", spectrum, f"{work}/rsl_spectrum", [t_download],
+                 [(spec, f"{analysis}/{spec}")], [event], {"grade": "0:1", "pixel": "0:11,13:26,28:35", "native": native})
+    pipeline.add(f"{label}:rsl_rmf", "rmf", rmf, f"{work}/rsl_rmf", [t_download],
+                 [(f"{label}_rsl.rmf", f"{analysis}/{label}_rsl.rmf")], [event],
+                 {"whichrmf": "L", "pixlist": "0-11,13-26,28-35"})
+
+
+if __name__ == "__main__":
+    # Input args
+    parser = argparse.ArgumentParser(description="Concurrent XRISM processing pipeline.")
+    parser.add_argument("--xtend", type=str, default="obs.txt", help="Xtend observation list")
+    parser.add_argument("--resolve", type=str, default="obs_r.txt", help="Resolve observation list")
+    parser.add_argument("--energy", type=str, default=None, help="Energy band file for narrow-band Xtend light curves")
+    parser.add_argument("--mirror", type=str, default=None, help="Local directory to use in place of HEASARC")
+    parser.add_argument("--limit", nargs="+", default=[], help="Stage concurrency limits as stage=N")
+    parser.add_argument("--dry-run", action="store_true", help="Print commands without running them")
+    parser.add_argument("--native", action="store_true", help="Extract Resolve spectra without xselect")
+    parser.add_argument("--force", action="store_true", help="Rerun every task, even if up to date")
+    parser.add_argument("--manifest", type=str, default=MANIFEST, help="Manifest file")
+
+    # Parse args
+    args = parser.parse_args()
+    limits = {stage: int(n) for stage, n in (limit.split("=") for limit in args.limit)}
+    mirror = LocalMirror(args.mirror, args.dry_run) if args.mirror else HeasarcMirror(dry_run=args.dry_run)
+    pipeline = Pipeline(limits, args.dry_run, Manifest(args.manifest), args.force)
+
+    if os.path.exists(args.xtend):
+        for label, obsid, obsmode, enmin, enmax in read_observations(args.xtend):
+            print(f"{GREN}Added Xtend Obs.ID {obsid}, mode {obsmode} with label: {label}{ENDC}")
+            add_xtend(pipeline, mirror, label, obsid, obsmode, enmin, enmax, args.energy)
+    if os.path.exists(args.resolve):
+        for label, obsid, obsmode in read_observations(args.resolve):
+            print(f"{GREN}Added Resolve Obs.ID {obsid}, mode {obsmode} with label: {label}{ENDC}")
+            add_resolve(pipeline, mirror, label, obsid, obsmode, args.native)
+
+    print(f"{BLUE}Running {len(pipeline.tasks)} tasks...{ENDC}")
+    statuses = pipeline.run()
+    failed = [name for name, status in statuses.items() if status not in ["done", "current"]]
+    current = sum(status == "current" for status in statuses.values())
+    print(f"{GREN}{len(statuses) - len(failed) - current} tasks finished, {current} up to date{ENDC}")
+    if failed:
+        print(f"{ERRR}{len(failed)} tasks did not finish: {', '.join(failed)}{ENDC}")
+        sys.exit(1)
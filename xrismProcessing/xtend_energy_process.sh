@@ -9,13 +9,14 @@
 #
 # Extracted light curves will have 10s bins.
 #
-# HEASoft must be initialised or XSelect commands will fail.
+# Requires xtend_lightcurves.py in the same directory as bash script, which extracts every band from one
+# read of the event file.
 #
 # Author: Thomas Hodd
 #
-# Date: 7th May 2026
+# Date: 17th October 2026
 #
-# Version: 1.1
+# Version: 1.3
 
 # Terminal colour codes
 set -e
@@ -71,32 +72,8 @@ for i in "${!obs[@]}"; do
     srcfile="${label}_src.reg"
     bkgfile="${label}_bkg.reg"
 
-    # Extract Light Curves
-    for ((j=0; j<${#emins[@]}; j++)); do
-        src_lc="energy_lcs/${label}_tbin10_en${emins[j]}_${emaxs[j]}_src.lc"
-        bkg_lc="energy_lcs/${label}_tbin10_en${emins[j]}_${emaxs[j]}_bkg.lc"
-        cor_lc="energy_lcs/${label}_tbin10_en${emins[j]}_${emaxs[j]}_lccor.lc"
-        xselect << EOF
-xtend_batch_process
-clear all proceed=yes
-read events xa${obsid}xtd_p0${obsmode}00010_cl.evt.gz .
-set image det
-filter pha_cut ${phamins[j]} ${phamaxs[j]}
-set binsize 10
-filter region ${srcfile}
-extr curve
-save curve ${src_lc}
-clear region
-filter region ${bkgfile}
-extr curve
-save curve ${bkg_lc}
-exit save_session=no
-EOF
-
-        # Create Background-Subtracted Light Curve
-        lcmath infile=${src_lc} bgfile=${bkg_lc} outfile=${cor_lc} multi=1 multb=1
-        echo -e "${BLUE}Created ${src_lc}${ENDC}"
-    done
+    # Extract src, bkg and background-subtracted light curves for every band in one pass
+    python ../../../xtend_lightcurves.py xa${obsid}xtd_p0${obsmode}00010_cl.evt ${srcfile} ${bkgfile} ../../../engs.txt ${label} --binsize 10 --outdir energy_lcs
     echo -e "${GREN}Extracted light curves for ${label}${ENDC}"
     cd ../../../
 done
@@ -0,0 +1,322 @@
+"""
+Extracts Xtend source, background and background-subtracted light curves in many energy bands from one
+read of a cleaned event file, in place of an xselect session and lcmath run per band.
+
+Events are masked by the source and background regions once, then binned into every band and time bin
+together. Light curves are written as <Prefix>_tbin<BinSize>_en<EMin>_<EMax>_{src,bkg,lccor}.lc, as
+xtend_energy_process.sh did.
+
+Usage
+---------
+python xtend_lightcurves.py <EventFile> <SrcRegion> <BkgRegion> <EnergyFile> <Prefix>
+
+EventFile - Cleaned event file, gzipped files are read through their uncompressed copy (see event_store.py)
+
+SrcRegion - Source region file (ds9 format, DET coordinates)
+
+BkgRegion - Background region file (ds9 format, DET coordinates)
+
+EnergyFile - File of lower, upper energies in eV, one band per line (engs.txt)
+
+Prefix - Light curve file prefix, usually the observation label
+
+Options
+---------
+-b --binsize - Light curve bin size in seconds, defaults to 10
+
+-o --outdir - Output directory, defaults to energy_lcs
+
+-x --xcol -y --ycol - Event columns the regions are in, defaults to DETX and DETY
+
+-f --fracexp - Minimum fractional exposure of a bin, defaults to 0 (any bin overlapping a GTI)
+
+-c --phacol - Event channel column the bands are cut on, defaults to the gain corrected PI
+
+---------
+
+PI channels are found from energies as round(E * 0.1667), inclusive at both ends, matching xselect's
+`filter pha_cut`, which cuts on PI for Xtend. Regions must be in physical (or image) coordinates of the
+--xcol/--ycol columns, sky coordinate regions are rejected.
+Rates are corrected for the fractional exposure of each bin, and the corrected light curve is src - bkg
+without area scaling (lcmath multi=1 multb=1).
+
+Author - Thomas Hodd
+
+Date - 17th October 2026
+
+Version - 1.2
+"""
+import argparse
+import os
+import re
+import numpy as np
+from astropy.io import fits
+from matplotlib.path import Path
+from event_store import open_events
+
+EV_TO_PI = 0.1667
+REGION_SYSTEMS = ["physical", "image"]
+OTHER_SYSTEMS = ["fk4", "fk5", "icrs", "galactic", "ecliptic", "j2000", "b1950", "linear", "amplifier", "detector", "wcs"]
+TIME_KEYWORDS = ["TELESCOP", "INSTRUME", "OBS_ID", "OBJECT", "DATAMODE", "TIMESYS", "TIMEREF", "TIMEUNIT",
+                 "MJDREFI", "MJDREFF", "MJDREF", "TIMEZERO", "DATE-OBS", "DATE-END"]
+
+
+def read_bands(filename: str) -> np.ndarray:
+    """
+    Read energy bands from a file of lower, upper energies in eV.
+    :param filename: Energy band file
+    :return: Array of (min, max) energies in eV
+    """
+    bands = []
+    with open(filename, "r") as f:
+        for line in f:
+            line = line.replace(",", " ").split()
+            if line:
+                bands.append([float(line[0]), float(line[1])])
+    return np.array(bands).reshape(-1, 2)
+
+
+def read_region(filename: str) -> list[tuple[str, str, list[float]]]:
+    """
+    Read the shapes of a ds9 region file, checking they are in physical or image coordinates.
+    Shapes are in physical coordinates unless a coordinate system line (e.g. image, fk5) comes before them.
+    :param filename: Region file
+    :return: List of (sign, shape, arguments) for each circle, annulus, ellipse, box and polygon
+    """
+    shapes = []
+    system = "physical"
+    with open(filename, "r") as f:
+        for line in f:
+            for part in line.split("#")[0].split(";"):
+                part = part.strip()
+                if part.lower() in REGION_SYSTEMS + OTHER_SYSTEMS or re.fullmatch(r"wcs[a-z]", part.lower()):
+                    system = part.lower()
+                    continue
+                match = re.match(r"([+-]?)\s*(circle|annulus|ellipse|box|polygon)\s*\(([^)]*)\)", part)
+                if match is None:
+                    continue
+                sign, shape, args = match.groups()
+                if system not in REGION_SYSTEMS:
+                    raise ValueError(f"{filename} uses {system} coordinates, regions must be in physical or image "
+                                     f"coordinates of the event columns")
+                try:
+                    p = [float(a) for a in re.split(r"[,\s]+", args.strip()) if a]
+                except ValueError:
+                    raise ValueError(f"Cannot read {shape}({args}) in {filename}, region coordinates must be pixels "
+                                     f"without units") from None
+                shapes.append((sign, shape, p))
+    return shapes
+
+
+def region_mask(filename: str, x: np.ndarray, y: np.ndarray) -> np.ndarray:
+    """
+    Mask of the events inside a ds9 region file.
+    Supports circle, annulus, ellipse, box and polygon shapes, shapes starting with - are excluded.
+    :param filename: Region file, in physical or image coordinates of x and y
+    :param x: Event x coordinates
+    :param y: Event y coordinates
+    :return: True for events in any included shape and no excluded shape
+    """
+    include = np.zeros(len(x), dtype=bool)
+    exclude = np.zeros(len(x), dtype=bool)
+    any_include = False
+
+    for sign, shape, p in read_region(filename):
+        dx, dy = x - p[0], y - p[1]
+        if shape == "circle":
+            inside = dx ** 2 + dy ** 2 <= p[2] ** 2
+        elif shape == "annulus":
+            r2 = dx ** 2 + dy ** 2
+            inside = (r2 >= p[2] ** 2) & (r2 <= p[-1] ** 2)
+        elif shape in ["ellipse", "box"]:
+            angle = np.radians(p[4]) if len(p) > 4 else 0.
+            u = dx * np.cos(angle) + dy * np.sin(angle)
+            v = -dx * np.sin(angle) + dy * np.cos(angle)
+            if shape == "ellipse":
+                inside = (u / p[2]) ** 2 + (v / p[3]) ** 2 <= 1
+            else:
+                inside = (np.abs(u) <= p[2] / 2) & (np.abs(v) <= p[3] / 2)
+        else:
+            inside = Path(np.reshape(p, (-1, 2))).contains_points(np.column_stack([x, y]))
+
+        if sign == "-":
+            exclude |= inside
+        else:
+            include |= inside
+            any_include = True
+
+    if not any_include:
+        raise ValueError(f"No included shapes found in {filename}")
+    return include & ~exclude
+
+
+def read_events(filename: str, xcol: str = "DETX", ycol: str = "DETY",
+                chancol: str = "PI") -> tuple[dict, np.ndarray, fits.Header]:
+    """
+    Read the columns needed for light curves, and the GTIs, from an event file opened with memmap.
+    :param filename: Event file
+    :param xcol: Region x coordinate column
+    :param ycol: Region y coordinate column
+    :param chancol: Channel column
+    :return: Dictionary of TIME, channel, x and y columns, array of (start, stop) GTIs and the EVENTS header
+    """
+    with open_events(filename) as hdul:
+        events = hdul["EVENTS"]
+        columns = {name: np.asarray(events.data[name]) for name in ["TIME", chancol, xcol, ycol]}
+        header = events.header.copy()
+        gti_hdu = next((hdu for hdu in hdul[1:] if hdu.name in ["GTI", "STDGTI"]), None)
+        if gti_hdu is not None:
+            gtis = np.column_stack([gti_hdu.data["START"], gti_hdu.data["STOP"]]).astype(float)
+        else:
+            gtis = np.array([[header["TSTART"], header["TSTOP"]]])
+    return columns, gtis[np.argsort(gtis[:, 0])], header
+
+
+def fractional_exposure(edges: np.ndarray, gtis: np.ndarray) -> np.ndarray:
+    """
+    Fraction of each time bin covered by the GTIs.
+    :param edges: Time bin edges
+    :param gtis: Sorted, non-overlapping array of (start, stop) GTIs
+    :return: Fractional exposure of each bin
+    """
+    lengths = gtis[:, 1] - gtis[:, 0]
+    before = np.concatenate([[0.], np.cumsum(lengths)])
+
+    # Total GTI time before each edge
+    k = np.searchsorted(gtis[:, 0], edges, side="right") - 1
+    covered = np.where(k >= 0, before[np.maximum(k, 0)] + np.clip(edges - gtis[np.maximum(k, 0), 0], 0, lengths[np.maximum(k, 0)]), 0.)
+    return np.diff(covered) / np.diff(edges)
+
+
+def band_counts(channel: np.ndarray, t_idx: np.ndarray, chan_bands: np.ndarray, n_bins: int) -> np.ndarray:
+    """
+    Counts of events in every band and time bin in one pass.
+    Events are counted into the segments between all band limits with one bincount, then each band is a
+    difference of cumulative segment counts, so overlapping bands are allowed.
+    :param channel: Event channels
+    :param t_idx: Event time bin indices
+    :param chan_bands: Array of inclusive (min, max) channels
+    :param n_bins: Number of time bins
+    :return: Counts, shape (bands, time bins)
+    """
+    limits = np.unique(np.concatenate([chan_bands[:, 0], chan_bands[:, 1] + 1]))
+    segment = np.searchsorted(limits, channel, side="right") - 1
+    keep = (segment >= 0) & (segment < len(limits) - 1)
+    counts = np.bincount(segment[keep] * n_bins + t_idx[keep], minlength=(len(limits) - 1) * n_bins)
+    cumulative = np.vstack([np.zeros(n_bins, dtype=int), np.cumsum(counts.reshape(-1, n_bins), axis=0)])
+
+    lo = np.searchsorted(limits, chan_bands[:, 0])
+    hi = np.searchsorted(limits, chan_bands[:, 1] + 1)
+    return cumulative[hi] - cumulative[lo]
+
+
+def lc_hdu(times: np.ndarray, rates: np.ndarray, errors: np.ndarray, fracexp: np.ndarray, binsize: float,
+           header: fits.Header, chan_band: np.ndarray, chancol: str = "PI") -> fits.BinTableHDU:
+    """
+    OGIP light curve RATE extension.
+    :param times: Bin centre times
+    :param rates: Rates
+    :param errors: Rate errors
+    :param fracexp: Fractional exposure of each bin
+    :param binsize: Bin size in seconds
+    :param header: Event file header to copy time keywords from
+    :param chan_band: Inclusive channel range
+    :param chancol: Channel column the band was cut on
+    :return: Light curve table HDU
+    """
+    table = fits.BinTableHDU.from_columns([fits.Column(name="TIME", format="D", unit="s", array=times),
+                                           fits.Column(name="RATE", format="E", unit="count/s", array=rates),
+                                           fits.Column(name="ERROR", format="E", unit="count/s", array=errors),
+                                           fits.Column(name="FRACEXP", format="E", array=fracexp)],
+                                          name="RATE")
+    for key in TIME_KEYWORDS:
+        if key in header:
+            table.header[key] = header[key]
+    table.header["HDUCLASS"] = "OGIP"
+    table.header["HDUCLAS1"] = "LIGHTCURVE"
+    table.header["HDUCLAS2"] = "RATE"
+    table.header["TIMEDEL"] = (binsize, "Bin size in seconds")
+    table.header["TSTART"] = times[0] - binsize / 2 + header.get("TIMEZERO", 0.) if len(times) else header.get("TSTART")
+    table.header["TSTOP"] = times[-1] + binsize / 2 + header.get("TIMEZERO", 0.) if len(times) else header.get("TSTOP")
+    table.header["CHANTYPE"] = (chancol, "Channel column of the energy band")
+    table.header["CHANMIN"] = (int(chan_band[0]), f"Lowest {chancol} channel")
+    table.header["CHANMAX"] = (int(chan_band[1]), f"Highest {chancol} channel")
+    return table
+
+
+def extract_lightcurves(event_file: str, src_region: str, bkg_region: str, bands: np.ndarray, prefix: str,
+                        binsize: float = 10, outdir: str = "energy_lcs", xcol: str = "DETX", ycol: str = "DETY",
+                        min_fracexp: float = 0., chancol: str = "PI") -> list[str]:
+    """
+    Extract src, bkg and background-subtracted light curves in every energy band from one read of an event file.
+    :param event_file: Cleaned event file
+    :param src_region: Source region file
+    :param bkg_region: Background region file
+    :param bands: Array of (min, max) energies in eV
+    :param prefix: Light curve file prefix
+    :param binsize: Bin size in seconds
+    :param outdir: Output directory
+    :param xcol: Region x coordinate column
+    :param ycol: Region y coordinate column
+    :param min_fracexp: Minimum fractional exposure of a bin
+    :param chancol: Channel column the bands are cut on
+    :return: List of written files
+    """
+    events, gtis, header = read_events(event_file, xcol, ycol, chancol)
+    chan_bands = np.round(bands * EV_TO_PI).astype(int)
+
+    # Time bins from the start of the first GTI
+    t0 = gtis[0, 0]
+    n_bins = max(1, int(np.ceil((gtis[-1, 1] - t0) / binsize)))
+    edges = t0 + binsize * np.arange(n_bins + 1)
+    fracexp = fractional_exposure(edges, gtis)
+    good = fracexp > min_fracexp
+    t_idx = np.clip(((events["TIME"] - t0) // binsize).astype(int), 0, n_bins - 1)
+
+    # Region masks applied once, counts for every band and time bin at once
+    counts = {}
+    for name, region in [("src", src_region), ("bkg", bkg_region)]:
+        mask = region_mask(region, events[xcol], events[ycol])
+        counts[name] = band_counts(events[chancol][mask], t_idx[mask], chan_bands, n_bins)[:, good]
+
+    times = (edges[:-1] + binsize / 2)[good]
+    exposure = binsize * fracexp[good]
+    os.makedirs(outdir, exist_ok=True)
+
+    files = []
+    for (emin, emax), chan_band, src, bkg in zip(bands, chan_bands, counts["src"], counts["bkg"]):
+        src_rate, src_err = src / exposure, np.sqrt(src) / exposure
+        bkg_rate, bkg_err = bkg / exposure, np.sqrt(bkg) / exposure
+        for kind, rate, err in [("src", src_rate, src_err), ("bkg", bkg_rate, bkg_err),
+                                ("lccor", src_rate - bkg_rate, np.hypot(src_err, bkg_err))]:
+            out_file = f"{outdir}/{prefix}_tbin{binsize:g}_en{emin:g}_{emax:g}_{kind}.lc"
+            hdu = lc_hdu(times, rate, err, fracexp[good], binsize, header, chan_band, chancol)
+            fits.HDUList([fits.PrimaryHDU(), hdu]).writeto(out_file, overwrite=True)
+            files.append(out_file)
+    return files
+
+
+if __name__ == "__main__":
+    # Input args
+    parser = argparse.ArgumentParser(description="Multi-band Xtend light curve extraction.")
+    parser.add_argument("event_file", type=str, help="Cleaned event file")
+    parser.add_argument("src_region", type=str, help="Source region file")
+    parser.add_argument("bkg_region", type=str, help="Background region file")
+    parser.add_argument("energy_file", type=str, help="File of lower, upper energies in eV")
+    parser.add_argument("prefix", type=str, help="Light curve file prefix")
+    parser.add_argument("-b", "--binsize", type=float, default=10, help="Bin size in seconds")
+    parser.add_argument("-o", "--outdir", type=str, default="energy_lcs", help="Output directory")
+    parser.add_argument("-x", "--xcol", type=str, default="DETX", help="Region x coordinate column")
+    parser.add_argument("-y", "--ycol", type=str, default="DETY", help="Region y coordinate column")
+    parser.add_argument("-f", "--fracexp", type=float, default=0., help="Minimum fractional exposure of a bin")
+    parser.add_argument("-c", "--phacol", type=str, default="PI", help="Channel column the bands are cut on")
+
+    # Parse args
+    args = parser.parse_args()
+    bands = read_bands(args.energy_file)
+    for emin, emax in bands:
+        print(f"Energy range {emin:g}-{emax:g} ({round(emin * EV_TO_PI)}-{round(emax * EV_TO_PI)} {args.phacol})")
+
+    files = extract_lightcurves(args.event_file, args.src_region, args.bkg_region, bands, args.prefix,
+                                args.binsize, args.outdir, args.xcol, args.ycol, args.fracexp, args.phacol)
+    print(f"Written {len(files)} light curves to {args.outdir}")
@@ -6,7 +6,7 @@
 # obs_name, 3/obs_id, 311/obs_mode, min_energy, max_energy
 # (Energies in eV)
 #
-# Requires get_regions_xrism.py in the same directory as bash script
+# Requires get_regions_xrism.py and event_store.py in the same directory as bash script
 # User must select background region when prompted, and verify the source has been correctly identified.
 #
 # Extracted light curves will have 10s bins.
@@ -15,9 +15,9 @@
 #
 # Author: Thomas Hodd
 #
-# Date: 7th May 2026
+# Date: 17th October 2026
 #
-# Version: 1.1
+# Version: 1.2
 
 # Terminal colour codes
 set -e
@@ -81,19 +81,18 @@ for i in "${!obs[@]}"; do
     # Get obsid proper (Not including the x/ part used in the wget URL)
     obsid=${obsid##*/}
 
-    # Copy event file to analysis directory
+    # Link uncompressed event file into analysis directory
     echo -e "${BLUE}Extracting image from $label ($obsid) ...${ENDC}"
     event_file="xa${obsid}xtd_p0${obsmode}00010_cl.evt.gz"
     cd "$obsid"
-    mkdir -p analysis
-    cp xtend/event_cl/${event_file} analysis/${event_file}
+    event_file=$(python ../../event_store.py xtend/event_cl/${event_file} analysis)
     cd analysis
 
     # Extract image to identify src/bkg regions
     xselect << EOF
 xtend_batch_process
 clear all proceed=yes
-read events xa${obsid}xtd_p0${obsmode}00010_cl.evt.gz .
+read events ${event_file} .
 set image det
 filter pha_cut ${phamins[i]} ${phamins[i]}
 extr image
@@ -117,7 +116,7 @@ EOF
     xselect << EOF
 xtend_batch_process
 clear all proceed=yes
-read events xa${obsid}xtd_p0${obsmode}00010_cl.evt.gz .
+read events ${event_file} .
 set image det
 filter pha_cut ${phamins[i]} ${phamaxs[i]}
 set binsize 10
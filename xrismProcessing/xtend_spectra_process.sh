@@ -12,9 +12,9 @@
 #
 # Author: Thomas Hodd
 #
-# Date: 7th May 2026
+# Date: 17th October 2026
 #
-# Version: 1.1
+# Version: 1.2
 
 # Terminal colour codes
 set -e
@@ -61,7 +61,7 @@ for i in "${!obs[@]}"; do
 
     # Extract image to identify src/bkg regions
     echo -e "${BLUE}Reading image from $label ($obsid) ...${ENDC}"
-    event_file="xa${obsid}xtd_p0${obsmode}00010_cl.evt.gz"
+    event_file="xa${obsid}xtd_p0${obsmode}00010_cl.evt"
 
     srcfile="${label}_src.reg"
     bkgfile="${label}_bkg.reg"
@@ -73,7 +73,7 @@ for i in "${!obs[@]}"; do
     xselect << EOF
 xtend_batch_process
 clear all proceed=yes
-read events xa${obsid}xtd_p0${obsmode}00010_cl.evt.gz .
+read events ${event_file} .
 set image det
 filter region ${srcfile}
 extr spec